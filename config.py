@@ -19,9 +19,33 @@ LOGS_DIR.mkdir(exist_ok=True)
 MQTT_BROKER = os.getenv("MQTT_BROKER", "broker.hivemq.com")
 MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_TOPIC = os.getenv("MQTT_TOPIC", "iot/tilapia/data")
+LIVE_TOPIC = os.getenv("LIVE_TOPIC", "iot/tilapia/live")  # Gateway -> dashboard processed readings
+# Private broker credentials (the default public broker lets anyone publish on any topic)
+MQTT_USERNAME = os.getenv("MQTT_USERNAME", "")
+MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "")
+MQTT_TLS = os.getenv("MQTT_TLS", "false").lower() == "true"
+LIVE_SECRET = os.getenv("LIVE_SECRET", "")  # HMAC key signing LIVE_TOPIC payloads (same on gateway + dashboards)
+LIVE_MAX_AGE_SEC = int(os.getenv("LIVE_MAX_AGE_SEC", "30"))  # older live readings are not shown as live
 
 # ==================== Database Configuration ====================
 DATABASE_PATH = BASE_DIR / os.getenv("DATABASE_PATH", "database/iot_data.db")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")  # sqlite | duckdb
+
+# Recent-window ring buffers shared by gateway and dashboards (use /dev/shm/... to keep them in RAM)
+RECENT_WINDOW_DIR = BASE_DIR / os.getenv("RECENT_WINDOW_DIR", "database/recent")
+RECENT_WINDOW_SIZE = int(os.getenv("RECENT_WINDOW_SIZE", "512"))  # readings per device
+
+# ==================== Gateway Health ====================
+GATEWAY_ID = os.getenv("GATEWAY_ID", "gateway")  # one heartbeat row per gateway process
+HEARTBEAT_INTERVAL_SEC = int(os.getenv("HEARTBEAT_INTERVAL_SEC", "10"))
+# Dashboards report a gateway OFFLINE after this many missed beats
+HEARTBEAT_MISSED_BEATS = int(os.getenv("HEARTBEAT_MISSED_BEATS", "3"))
+
+# ==================== Maintenance Configuration ====================
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))  # 0 = keep all data
+MAINTENANCE_INTERVAL_SEC = int(os.getenv("MAINTENANCE_INTERVAL_SEC", "300"))
+MAINTENANCE_DELETE_BATCH = int(os.getenv("MAINTENANCE_DELETE_BATCH", "500"))
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "256"))
 
 # ==================== Email Configuration ====================
 EMAIL_SENDER = os.getenv("EMAIL_SENDER", "")
@@ -62,8 +86,16 @@ LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 DASHBOARD_PORT = int(os.getenv("DASHBOARD_PORT", "8501"))
 DASHBOARD_REFRESH_SEC = int(os.getenv("DASHBOARD_REFRESH_SEC", "5"))
 DASHBOARD_MAX_RECORDS = int(os.getenv("DASHBOARD_MAX_RECORDS", "500"))
+REPORT_CACHE_DIR = BASE_DIR / os.getenv("REPORT_CACHE_DIR", "database/reports")  # generated PDF reports
+REPORT_CACHE_KEEP = int(os.getenv("REPORT_CACHE_KEEP", "20"))  # newest reports kept on disk
+REPORT_REBUILD_SEC = int(os.getenv("REPORT_REBUILD_SEC", "300"))  # min seconds between rebuilds of the current period
 
 # ==================== Model Configuration ====================
+# Model set the gateway loads (models/ or e.g. a slim set from train/slim.py: models/slim)
+MODEL_SET_DIR = BASE_DIR / os.getenv("MODEL_SET_DIR", "models")
+# xgboost (pickled models) | onnx (model_*.onnx from train/onnx_export.py, onnxruntime CPU)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "xgboost")
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))  # per booster / onnxruntime session
 MODEL_PATHS = {
     "temperature": MODELS_DIR / "temp_model.pkl",
     "ph": MODELS_DIR / "ph_model.pkl",
@@ -79,6 +111,10 @@ def get_config_summary():
         "mqtt_port": MQTT_PORT,
         "mqtt_topic": MQTT_TOPIC,
         "database": str(DATABASE_PATH),
+        "storage_backend": STORAGE_BACKEND,
+        "model_set": str(MODEL_SET_DIR),
+        "inference_backend": INFERENCE_BACKEND,
+        "gateway_id": GATEWAY_ID,
         "log_level": LOG_LEVEL,
         "dashboard_port": DASHBOARD_PORT
     }
@@ -1,15 +1,14 @@
 # dashboard/app.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import time, io, os, json
-from datetime import datetime, timedelta
-from paho.mqtt import client as mqtt_client
+import os, io, gzip, shutil
+from datetime import datetime
 from fpdf import FPDF
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from downsample import xy, status_changes
+from charts import gauge, line_chart, risk_timeline
 
 # ----------------- CONFIG -----------------
 ALERT_INTERVAL_MIN = 10  # Minutes between repeated alerts
@@ -21,6 +20,7 @@ MQTT_PORT = 1883
 MQTT_TOPIC = "iot/tilapia/data"
 
 SIM_PUBLISH_INTERVAL = 5
+TREND_REFRESH_SEC = 30  # Trend chart refresh (gauges use the sidebar interval)
 
 
 # ----------------- EMAIL ALERT -----------------
@@ -68,6 +68,28 @@ def safe_read_csv(path):
         return pd.DataFrame()
 
 
+@st.cache_data(max_entries=2)
+def _read_log_cached(path, mtime):
+    return safe_read_csv(path)
+
+
+def read_log():
+    """data_log.csv, re-parsed only when the file changed"""
+    try:
+        mtime = os.path.getmtime(DATA_FILE)
+    except OSError:
+        return pd.DataFrame()
+    return _read_log_cached(DATA_FILE, mtime)
+
+
+def log_gzip_bytes():
+    """data_log.csv gzip-compressed in chunks; the file is closed before returning"""
+    buffer = io.BytesIO()
+    with open(DATA_FILE, "rb") as src, gzip.GzipFile(fileobj=buffer, mode="wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return buffer.getvalue()
+
+
 def get_latest(df):
     if df.empty:
         return {}
@@ -150,7 +172,7 @@ if st.sidebar.button("Test Send Email"):
 
 
 # -------- LOAD DATA --------
-df = safe_read_csv(DATA_FILE)
+df = read_log()
 
 if df.empty and nav != "Devices":
     st.warning("No data yet — start gateway or run simulator!")
@@ -165,61 +187,31 @@ if nav == "Realtime":
     if df.empty:
         st.info("No real-time data yet. Go to Devices to start simulator.")
     else:
-        latest = get_latest(df)
-
-        # ---- TOP GAUGE CARDS ----
-        c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
-
-        # Temperature
-        fig_t = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest.get("temp", 0),
-            title={"text":"Temperature (°C)"},
-            gauge={"axis":{"range":[0,40]}, "bar":{"color":"#2196F3"}}
-        ))
-        c1.plotly_chart(fig_t, use_container_width=True)
-
-        # pH
-        fig_ph = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest.get("ph", 0),
-            title={"text":"pH"},
-            gauge={"axis":{"range":[0,14]}, "bar":{"color":"#9C27B0"}}
-        ))
-        c2.plotly_chart(fig_ph, use_container_width=True)
-
-        # DO
-        fig_do = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest.get("do", 0),
-            title={"text":"DO (mg/L)"},
-            gauge={"axis":{"range":[0,10]}, "bar":{"color":"#009688"}}
-        ))
-        c3.plotly_chart(fig_do, use_container_width=True)
-
-        # Turbidity
-        fig_tu = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest.get("turbidity", 0),
-            title={"text":"Turbidity (NTU)"},
-            gauge={"axis":{"range":[0,100]}, "bar":{"color":"#795548"}}
-        ))
-        c4.plotly_chart(fig_tu, use_container_width=True)
-
-        # STATUS CARD
-        status_color = {
-            "Safe":"#4CAF50",
-            "Warning":"#FFC107",
-            "Danger":"#F44336"
-        }.get(latest.get("status","N/A"), "gray")
-
-        c5.markdown(
-            f"<div style='background:{status_color};padding:20px;border-radius:10px;text-align:center;color:white'>"
-            f"<h3>Status</h3><h2>{latest.get('status','N/A')}</h2></div>",
-            unsafe_allow_html=True
-        )
-
-        # ---------- EMAIL ALERT (ONLY WHEN DANGER) ----------
+        # Live panels rerun on their own timers; the rest of the page does not
+        @st.fragment(run_every=refresh)
+        def live_panel():
+            latest = get_latest(read_log())
+
+            # ---- TOP GAUGE CARDS ----
+            c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
+
+            for column, col in zip((c1, c2, c3, c4), ("temp", "ph", "do", "turbidity")):
+                column.plotly_chart(gauge(col, latest.get(col, 0)), use_container_width=True)
+
+            # STATUS CARD
+            status_color = {
+                "Safe":"#4CAF50",
+                "Warning":"#FFC107",
+                "Danger":"#F44336"
+            }.get(latest.get("status","N/A"), "gray")
+
+            c5.markdown(
+                f"<div style='background:{status_color};padding:20px;border-radius:10px;text-align:center;color:white'>"
+                f"<h3>Status</h3><h2>{latest.get('status','N/A')}</h2></div>",
+                unsafe_allow_html=True
+            )
+
+            # ---------- EMAIL ALERT (ONLY WHEN DANGER) ----------
 #         if latest.get("status") == "Danger":
 #             if email_sender and email_receiver and email_pass:
 #                 send_email_alert(
@@ -239,45 +231,45 @@ if nav == "Realtime":
 #                 )
 #                 st.error("⚠️ Email alert sent!")
 
-        # ---------- EMAIL ALERT (ANTI-SPAM, 2 LẦN GỬI) ----------
-        
-        # Initialize session state for email tracking
-        if 'last_alert_time' not in st.session_state:
-            st.session_state.last_alert_time = None
-        if 'last_status' not in st.session_state:
-            st.session_state.last_status = "Safe"
-
-        current_time = datetime.now()
-        danger_now = latest.get("status") == "Danger"
-        should_send = False
-
-        # CASE 1: Danger mới xuất hiện → gửi lần 1
-        if danger_now and st.session_state.last_status != "Danger":
-            should_send = True
-
-        # CASE 2: Danger kéo dài → gửi lại lần 2 sau X phút
-        elif danger_now and st.session_state.last_alert_time is not None:
-            elapsed_min = (current_time - st.session_state.last_alert_time).total_seconds() / 60
-            if elapsed_min >= ALERT_INTERVAL_MIN:
+            # ---------- EMAIL ALERT (ANTI-SPAM, 2 LẦN GỬI) ----------
+            
+            # Initialize session state for email tracking
+            if 'last_alert_time' not in st.session_state:
+                st.session_state.last_alert_time = None
+            if 'last_status' not in st.session_state:
+                st.session_state.last_status = "Safe"
+
+            current_time = datetime.now()
+            danger_now = latest.get("status") == "Danger"
+            should_send = False
+
+            # CASE 1: Danger mới xuất hiện → gửi lần 1
+            if danger_now and st.session_state.last_status != "Danger":
                 should_send = True
 
-        # SEND EMAIL IF NEEDED
-
-        if danger_now and should_send:
-            if email_sender and email_receiver and email_pass:
-                print(f"\n{'='*60}")
-                print(f"[EMAIL ALERT] Attempting to send email...")
-                print(f"Time: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"Status: {latest.get('status')}")
-                print(f"Previous Status: {st.session_state.last_status}")
-                print(f"Alert Type: {'FIRST ALERT' if st.session_state.last_status != 'Danger' else 'REPEATED ALERT'}")
-                print(f"To: {email_receiver}")
-                print(f"{'='*60}\n")
-                
-                ok, error = send_email_alert(
-                    to_email=email_receiver,
-                    subject="[DANGER] Tilapia Water Quality Alert!",
-                    message=f"""
+            # CASE 2: Danger kéo dài → gửi lại lần 2 sau X phút
+            elif danger_now and st.session_state.last_alert_time is not None:
+                elapsed_min = (current_time - st.session_state.last_alert_time).total_seconds() / 60
+                if elapsed_min >= ALERT_INTERVAL_MIN:
+                    should_send = True
+
+            # SEND EMAIL IF NEEDED
+
+            if danger_now and should_send:
+                if email_sender and email_receiver and email_pass:
+                    print(f"\n{'='*60}")
+                    print(f"[EMAIL ALERT] Attempting to send email...")
+                    print(f"Time: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                    print(f"Status: {latest.get('status')}")
+                    print(f"Previous Status: {st.session_state.last_status}")
+                    print(f"Alert Type: {'FIRST ALERT' if st.session_state.last_status != 'Danger' else 'REPEATED ALERT'}")
+                    print(f"To: {email_receiver}")
+                    print(f"{'='*60}\n")
+                    
+                    ok, error = send_email_alert(
+                        to_email=email_receiver,
+                        subject="[DANGER] Tilapia Water Quality Alert!",
+                        message=f"""
 ⚠️ DANGER WATER CONDITION DETECTED!
 
 Timestamp: {latest['timestamp']}
@@ -289,35 +281,37 @@ Turbidity: {latest['turbidity']} NTU
 Message Type:
 - {'FIRST ALERT' if st.session_state.last_status != 'Danger' else 'REPEATED ALERT AFTER INTERVAL'}
 """,
-                    sender_email=email_sender,
-                    sender_password=email_pass
-                )
-                if ok:
-                    st.session_state.last_alert_time = current_time
-                    print(f"✅ [EMAIL SUCCESS] Email sent successfully at {current_time.strftime('%H:%M:%S')}\n")
-                    st.error("⚠️ Email alert sent successfully!")
-                else:
-                    print(f"❌ [EMAIL FAILED] {error}\n")
-                    st.warning(f"❌ Email alert failed!\n{error}")
-
-        # CASE 3: Chỉ reset khi trở về Safe (không reset khi Warning)
-        if latest.get("status") == "Safe":
-            st.session_state.last_alert_time = None
-
-        # Update trạng thái cuối
-        st.session_state.last_status = latest.get("status")
-
-
-
-        # ----------- RAW DATA TREND -----------
-        st.markdown("### 📉 Raw Sensor Trends (Last 200 records)")
-        fig = px.line(
-            df.tail(200),
-            x="timestamp",
-            y=["temp","ph","do","turbidity"],
-            labels={"value":"Measurement"},
-        )
-        st.plotly_chart(fig, use_container_width=True)
+                        sender_email=email_sender,
+                        sender_password=email_pass
+                    )
+                    if ok:
+                        st.session_state.last_alert_time = current_time
+                        print(f"✅ [EMAIL SUCCESS] Email sent successfully at {current_time.strftime('%H:%M:%S')}\n")
+                        st.error("⚠️ Email alert sent successfully!")
+                    else:
+                        print(f"❌ [EMAIL FAILED] {error}\n")
+                        st.warning(f"❌ Email alert failed!\n{error}")
+
+            # CASE 3: Chỉ reset khi trở về Safe (không reset khi Warning)
+            if latest.get("status") == "Safe":
+                st.session_state.last_alert_time = None
+
+            # Update trạng thái cuối
+            st.session_state.last_status = latest.get("status")
+
+        @st.fragment(run_every=TREND_REFRESH_SEC)
+        def trend_panel():
+            # ----------- RAW DATA TREND -----------
+            st.markdown("### 📉 Raw Sensor Trends (Last 200 records)")
+            recent = read_log().tail(200)
+            fig = line_chart("raw_trend", [
+                dict(x=recent["timestamp"], y=recent[col], name=col)
+                for col in ["temp","ph","do","turbidity"]
+            ], yaxis_title="Measurement")
+            st.plotly_chart(fig, use_container_width=True)
+
+        live_panel()
+        trend_panel()
 
 
 # -----------------------------------------------------------
@@ -336,16 +330,10 @@ elif nav == "Prediction":
             ("Turbidity","turbidity","pred_turb","Turbidity (NTU)")
         ]:
             if pred_col in df.columns:
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"], y=df[actual_col],
-                    mode="lines", name="Actual"
-                ))
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"], y=df[pred_col],
-                    mode="lines", name="Predicted"
-                ))
-                fig.update_layout(title=title, height=300)
+                fig = line_chart(actual_col, [
+                    dict(**xy(df, actual_col), name="Actual"),
+                    dict(**xy(df, pred_col), name="Predicted"),
+                ], title=title, height=300)
                 st.plotly_chart(fig, use_container_width=True)
 
         # SUMMARY
@@ -374,12 +362,8 @@ elif nav == "Prediction":
 elif nav == "Risk Analysis":
     st.subheader("📌 Risk Level Timeline")
 
-    fig = px.scatter(
-        df, x="timestamp", y=[1]*len(df),
-        color="status",
-        color_discrete_map={"Safe":"green","Warning":"orange","Danger":"red"}
-    )
-    fig.update_yaxes(visible=False)
+    risk_points = status_changes(df)
+    fig = risk_timeline("risk_page", risk_points)
     st.plotly_chart(fig, use_container_width=True)
 
     st.markdown("### 🔢 Risk Count Summary")
@@ -468,17 +452,10 @@ elif nav == "Reports":
     st.subheader("📦 Export Data & Reports")
 
     if not df.empty:
-        csv_bytes = df.to_csv(index=False).encode()
-        st.download_button("📥 Download CSV", csv_bytes, "tilapia_data.csv", "text/csv")
+        # Compress the log file itself instead of re-encoding the DataFrame in memory
+        st.download_button("📥 Download CSV (gzip)", log_gzip_bytes, "tilapia_data.csv.gz", "application/gzip")
 
         if st.button("📝 Generate PDF Report"):
             path = generate_pdf_report(df.tail(1))
             with open(path, "rb") as f:
                 st.download_button("📄 Download PDF", f, "report.pdf", "application/pdf")
-
-
-# ----------------- AUTO REFRESH -----------------
-time.sleep(refresh)
-st.rerun()
-
-
@@ -1,7 +1,7 @@
 # dashboard/app_simple_sqlite.py
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
+import pyarrow.compute as pc
 import plotly.express as px
 import sqlite3
 from pathlib import Path
@@ -9,7 +9,6 @@ from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from fpdf import FPDF
 import io
 import time
 import sys
@@ -19,12 +18,31 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
 from config import (
-    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC,
-    DATABASE_PATH,
+    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, LIVE_TOPIC,
+    MQTT_USERNAME, MQTT_PASSWORD, MQTT_TLS, LIVE_SECRET, LIVE_MAX_AGE_SEC,
+    DATABASE_PATH, STORAGE_BACKEND, RECENT_WINDOW_DIR, REPORT_CACHE_DIR, REPORT_CACHE_KEEP,
+    REPORT_REBUILD_SEC,
     EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, ALERT_INTERVAL_MIN,
-    Thresholds
+    HEARTBEAT_INTERVAL_SEC, HEARTBEAT_MISSED_BEATS, Thresholds
 )
 from logger import get_dashboard_logger
+from recent_buffer import RecentRows
+from downsample import xy, status_changes
+from charts import gauge, line_chart, risk_timeline
+from reports import ReportEngine, report_panel
+from live_feed import LiveFeed
+from recent_window import open_window
+
+# Import database helpers (streaming export) and the storage backend
+import importlib.util
+spec = importlib.util.spec_from_file_location("db_config", str(PROJECT_ROOT / "database" / "db_config.py"))
+db_config = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_config)
+sys.modules["db_config"] = db_config  # storage.py shares this instance
+
+spec = importlib.util.spec_from_file_location("storage", str(PROJECT_ROOT / "database" / "storage.py"))
+storage = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(storage)
 
 logger = get_dashboard_logger()
 
@@ -33,6 +51,28 @@ st.set_page_config(page_title="Tilapia Monitor", layout="wide", page_icon="🐟"
 # Database path from config
 DB_PATH = Path(DATABASE_PATH)
 
+# "Show records" choices (the recent-rows buffer holds the largest)
+LIMIT_OPTIONS = [50, 100, 200, 500]
+
+# Realtime prediction cards refresh (gauges use the sidebar interval)
+PREDICTION_REFRESH_SEC = 30
+
+# Analytics trend tabs: (actual column, prediction column, title, unit, line color)
+ANALYTICS_CHARTS = [
+    ('temp', 'pred_temp', 'Temperature (°C)', '°C', 'blue'),
+    ('ph', 'pred_ph', 'pH', 'pH', 'purple'),
+    ('do', 'pred_do', 'Dissolved Oxygen (mg/L)', 'mg/L', 'teal'),
+    ('turbidity', 'pred_turb', 'Turbidity (NTU)', 'NTU', 'orange'),
+]
+
+# History value filters: column -> (label, slider min, slider max)
+HISTORY_VALUE_SCALES = {
+    'temp': ("Temperature (°C)", 0.0, 40.0),
+    'ph': ("pH", 0.0, 14.0),
+    'do': ("DO (mg/L)", 0.0, 20.0),
+    'turbidity': ("Turbidity (NTU)", 0.0, 100.0),
+}
+
 # ESP32 path
 ESP32_DIR = PROJECT_ROOT / "esp32_mqtt_sim"
 
@@ -58,71 +98,79 @@ def send_email_alert(to_email, subject, message, sender_email, sender_password):
     except Exception as e:
         return False, str(e)
 
-# PDF Report
-def generate_pdf_report(df_tail):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, "Tilapia Water Quality Report", ln=True)
-    if not df_tail.empty:
-        latest = df_tail.iloc[-1]
-        pdf.cell(0, 10, f"Time: {latest['timestamp']}", ln=True)
-        pdf.cell(0, 10, f"Temperature: {latest['temp']} C", ln=True)
-        pdf.cell(0, 10, f"pH: {latest['ph']}", ln=True)
-        pdf.cell(0, 10, f"DO: {latest['do']} mg/L", ln=True)
-        pdf.cell(0, 10, f"Turbidity: {latest['turbidity']} NTU", ln=True)
-        pdf.cell(0, 10, f"Status: {latest['status']}", ln=True)
-    return pdf.output(dest='S').encode('latin1')
-
 def get_db_connection():
     if not DB_PATH.exists():
         raise FileNotFoundError(f"Database not found: {DB_PATH}")
     return sqlite3.connect(str(DB_PATH), check_same_thread=False)
 
-def init_db_if_needed():
-    """Initialize database if table doesn't exist"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sensor_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME NOT NULL,
-            temp REAL,
-            ph REAL,
-            do REAL,
-            turbidity REAL,
-            pred_temp REAL,
-            pred_ph REAL,
-            pred_do REAL,
-            pred_turb REAL,
-            sensor_risk TEXT,
-            pred_risk TEXT,
-            status TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
+@st.cache_resource
+def get_storage():
+    """One backend per server process (DuckDB keeps a persistent connection)"""
+    backend = storage.get_backend(STORAGE_BACKEND)
+    backend.init()
+    return backend
+
+@st.cache_resource
+def get_report_engine():
+    """Background report worker + PDF cache shared by all sessions"""
+    return ReportEngine(get_storage(), REPORT_CACHE_DIR, keep=REPORT_CACHE_KEEP,
+                        rebuild_interval=REPORT_REBUILD_SEC)
+
+@st.cache_resource
+def get_recent_rows():
+    """Recent-rows buffer shared by all sessions, sized for the largest 'Show records' option"""
+    return RecentRows(get_storage(), capacity=max(LIMIT_OPTIONS))
 
 def load_data(limit=100):
-    conn = get_db_connection()
-    query = f"SELECT * FROM sensor_logs ORDER BY timestamp DESC LIMIT {limit}"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df.sort_values('timestamp')
+    return get_recent_rows().get(limit)
+
+def load_table(limit=100):
+    """Same rows as load_data() as an Arrow table (charts and tables read it without pandas)"""
+    return get_recent_rows().get_table(limit)
+
+def has_values(table, col):
+    """Column has at least one non-null value (e.g. predictions after 24h of data)"""
+    return table[col].null_count < table.num_rows
+
+@st.cache_resource
+def get_live_feed():
+    """One LIVE_TOPIC subscription per server process, shared by all sessions"""
+    return LiveFeed(MQTT_BROKER, MQTT_PORT, LIVE_TOPIC, secret=LIVE_SECRET, max_age=LIVE_MAX_AGE_SEC,
+                    username=MQTT_USERNAME, password=MQTT_PASSWORD, tls=MQTT_TLS).start()
+
+@st.cache_resource
+def _map_recent_window(device_id="default"):
+    """Map the gateway's ring buffer once per process (raises until the gateway created it, so it is not cached)"""
+    window = open_window(RECENT_WINDOW_DIR, device_id)
+    if window is None:
+        raise FileNotFoundError(device_id)
+    return window
+
+def recent_window(n=200, device_id="default"):
+    """Last n readings from the gateway's ring buffer (no SQLite), None if there is none yet"""
+    try:
+        df = _map_recent_window(device_id).to_frame(n)
+    except (FileNotFoundError, ValueError, TimeoutError):
+        return None
+    return df if not df.empty else None
+
+def latest_reading(device_id=db_config.DEFAULT_DEVICE_ID):
+    """Latest reading pushed by the gateway; falls back to the ring buffer, then device_latest"""
+    reading = get_live_feed().latest(device_id)
+    if reading is not None:
+        return pd.Series(reading)
+    window = recent_window(1, device_id)
+    if window is not None:
+        return window.iloc[-1]
+    latest = get_storage().device_latest(device_id)
+    return latest.iloc[-1] if not latest.empty else load_data(1).iloc[-1]
 
 def get_stats():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    total = cursor.execute("SELECT COUNT(*) FROM sensor_logs").fetchone()[0]
-    conn.close()
-    return {'total': total}
+    return {'total': get_storage().stats()['total_records']}
 
 # Initialize database
 try:
-    init_db_if_needed()
+    get_storage()
 except Exception as e:
     st.error(f"❌ Database error: {e}")
     st.error(f"Expected path: {DB_PATH}")
@@ -146,7 +194,7 @@ with st.sidebar:
     nav = st.radio("Navigation", ["Realtime", "Analytics", "History", "Devices", "Settings"], index=0)
     
     st.markdown("---")
-    limit = st.selectbox("Show records", [50, 100, 200, 500], index=1)
+    limit = st.selectbox("Show records", LIMIT_OPTIONS, index=1)
     
     # Auto refresh
     st.markdown("---")
@@ -158,6 +206,9 @@ with st.sidebar:
     st.info(f"**Host**: {MQTT_BROKER}")
     st.info(f"**Port**: {MQTT_PORT}")
     st.info(f"**Topic**: {MQTT_TOPIC}")
+    feed = get_live_feed()
+    live = feed.connected and feed.latest() is not None
+    st.caption(f"Live feed ({LIVE_TOPIC}): " + ("🟢 push" if live else "🟡 polling database"))
     st.caption("ℹ️ Configure in `.env` file")
     
     # Email Alerts
@@ -196,153 +247,140 @@ st.title("🌊 Tilapia Water Quality Dashboard")
 st.markdown("Real-time monitoring with SQLite backend")
 
 try:
-    df = load_data(limit)
+    table = load_table(limit)
 except Exception as e:
     st.error(f"❌ Database error: {e}")
     st.stop()
 
-if df.empty:
+if table.num_rows == 0:
     st.warning("⚠️ No data. Start gateway to collect data.")
     st.stop()
 
-# Latest reading
-latest = df.iloc[-1]
-
 # ==================== NAVIGATION ====================
 
 if nav == "Realtime":
     st.subheader("📡 Real-time Monitoring")
     
-    # Gauge charts + Status card
-    c1, c2, c3, c4, c5 = st.columns([1, 1, 1, 1, 1])
-    
-    with c1:
-        fig_t = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest['temp'],
-            title={"text": "Temperature (°C)"},
-            gauge={"axis": {"range": [0, 40]}, "bar": {"color": "#2196F3"}}
-        ))
-        st.plotly_chart(fig_t, use_container_width=True)
-    
-    with c2:
-        fig_ph = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest['ph'],
-            title={"text": "pH"},
-            gauge={"axis": {"range": [0, 14]}, "bar": {"color": "#9C27B0"}}
-        ))
-        st.plotly_chart(fig_ph, use_container_width=True)
-    
-    with c3:
-        fig_do = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest['do'],
-            title={"text": "DO (mg/L)"},
-            gauge={"axis": {"range": [0, 10]}, "bar": {"color": "#009688"}}
-        ))
-        st.plotly_chart(fig_do, use_container_width=True)
-    
-    with c4:
-        fig_turb = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=latest['turbidity'],
-            title={"text": "Turbidity (NTU)"},
-            gauge={"axis": {"range": [0, 100]}, "bar": {"color": "#795548"}}
-        ))
-        st.plotly_chart(fig_turb, use_container_width=True)
-    
-    # Status card - BEAUTIFUL VERSION
-    with c5:
-        status = latest['status']
-        status_color = {
-            "Safe": "#4CAF50",
-            "Warning": "#FFC107",
-            "Danger": "#F44336"
-        }.get(status, "gray")
+    # Live panels rerun on their own timers; other pages render once per interaction
+    @st.fragment(run_every=refresh)
+    def live_panel():
+        latest = latest_reading()
         
-        st.markdown(
-            f"""<div style='background:{status_color};padding:20px;border-radius:10px;text-align:center;color:white;height:250px;display:flex;flex-direction:column;justify-content:center;'>
-            <h3 style='margin:0;font-size:24px;'>Status</h3>
-            <h2 style='margin:10px 0 0 0;font-size:32px;font-weight:bold;'>{status}</h2>
-            </div>""",
-            unsafe_allow_html=True
-        )
-    
-    # Alert banner based on status
-    st.markdown("---")
-    if status == "Danger":
-        st.error("🔴 **DANGER**: Critical water quality detected! Immediate action required!")
-    elif status == "Warning":
-        st.warning("🟡 **WARNING**: Suboptimal conditions. Monitor closely.")
-    else:
-        st.success("🟢 **SAFE**: Water quality is optimal for tilapia.")
-    
-    # Predictions with nice cards
-    st.markdown("---")
-    st.subheader("🔮 6-Hour Predictions")
-    
-    col1, col2, col3, col4 = st.columns(4)
+        # Gauge charts + Status card
+        c1, c2, c3, c4, c5 = st.columns([1, 1, 1, 1, 1])
+    
+        for column, col in zip((c1, c2, c3, c4), ('temp', 'ph', 'do', 'turbidity')):
+            with column:
+                st.plotly_chart(gauge(col, latest[col]), use_container_width=True)
+    
+        # Status card - BEAUTIFUL VERSION
+        with c5:
+            status = latest['status']
+            status_color = {
+                "Safe": "#4CAF50",
+                "Warning": "#FFC107",
+                "Danger": "#F44336"
+            }.get(status, "gray")
+        
+            st.markdown(
+                f"""<div style='background:{status_color};padding:20px;border-radius:10px;text-align:center;color:white;height:250px;display:flex;flex-direction:column;justify-content:center;'>
+                <h3 style='margin:0;font-size:24px;'>Status</h3>
+                <h2 style='margin:10px 0 0 0;font-size:32px;font-weight:bold;'>{status}</h2>
+                </div>""",
+                unsafe_allow_html=True
+            )
     
-    with col1:
-        pred = latest.get('pred_temp')
-        if pd.notna(pred):
-            delta = pred - latest['temp']
-            color = "🔴" if delta > 2 else "🔵" if delta < -2 else "🟢"
-            st.markdown(f"""
-            <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
-                <p style='margin:0;color:#666;font-size:14px;'>Temperature (6h)</p>
-                <h2 style='margin:5px 0;color:#2196F3;'>{pred:.1f}°C</h2>
-                <p style='margin:0;color:{"red" if delta > 0 else "blue"};font-size:16px;'>{color} {delta:+.1f}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        # Alert banner based on status
+        st.markdown("---")
+        if status == "Danger":
+            st.error("🔴 **DANGER**: Critical water quality detected! Immediate action required!")
+        elif status == "Warning":
+            st.warning("🟡 **WARNING**: Suboptimal conditions. Monitor closely.")
         else:
-            st.info("Insufficient data")
+            st.success("🟢 **SAFE**: Water quality is optimal for tilapia.")
+        st.caption(f"Last reading: {latest['timestamp']}")
+        
+        # Short trend straight from the gateway's ring buffer
+        window = recent_window(200)
+        if window is not None:
+            fig_recent = line_chart('recent', [
+                dict(x=window['timestamp'], y=window['temp'], name='Temp (°C)'),
+                dict(x=window['timestamp'], y=window['do'], name='DO (mg/L)'),
+            ], title=f"Last {len(window)} readings", height=280)
+            st.plotly_chart(fig_recent, use_container_width=True)
+    
+    @st.fragment(run_every=PREDICTION_REFRESH_SEC)
+    def prediction_panel():
+        latest = latest_reading()
+        
+        # Predictions with nice cards
+        st.markdown("---")
+        st.subheader("🔮 6-Hour Predictions")
     
-    with col2:
-        pred = latest.get('pred_ph')
-        if pd.notna(pred):
-            delta = pred - latest['ph']
-            color = "🔴" if abs(delta) > 0.5 else "🟢"
-            st.markdown(f"""
-            <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
-                <p style='margin:0;color:#666;font-size:14px;'>pH (6h)</p>
-                <h2 style='margin:5px 0;color:#9C27B0;'>{pred:.2f}</h2>
-                <p style='margin:0;color:{"red" if abs(delta) > 0.3 else "green"};font-size:16px;'>{color} {delta:+.2f}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.info("Insufficient data")
+        col1, col2, col3, col4 = st.columns(4)
     
-    with col3:
-        pred = latest.get('pred_do')
-        if pd.notna(pred):
-            delta = pred - latest['do']
-            color = "🔴" if pred < 4 else "🟡" if pred < 6 else "🟢"
-            st.markdown(f"""
-            <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
-                <p style='margin:0;color:#666;font-size:14px;'>DO (6h)</p>
-                <h2 style='margin:5px 0;color:#009688;'>{pred:.2f}</h2>
-                <p style='margin:0;color:{"red" if delta < 0 else "green"};font-size:16px;'>{color} {delta:+.2f}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.info("Insufficient data")
-    
-    with col4:
-        pred = latest.get('pred_turb')
-        if pd.notna(pred):
-            delta = pred - latest['turbidity']
-            color = "🔴" if pred > 50 else "🟡" if pred > 30 else "🟢"
-            st.markdown(f"""
-            <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
-                <p style='margin:0;color:#666;font-size:14px;'>Turbidity (6h)</p>
-                <h2 style='margin:5px 0;color:#795548;'>{pred:.1f}</h2>
-                <p style='margin:0;color:{"red" if delta > 0 else "green"};font-size:16px;'>{color} {delta:+.1f}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.info("Insufficient data")
+        with col1:
+            pred = latest.get('pred_temp')
+            if pd.notna(pred):
+                delta = pred - latest['temp']
+                color = "🔴" if delta > 2 else "🔵" if delta < -2 else "🟢"
+                st.markdown(f"""
+                <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
+                    <p style='margin:0;color:#666;font-size:14px;'>Temperature (6h)</p>
+                    <h2 style='margin:5px 0;color:#2196F3;'>{pred:.1f}°C</h2>
+                    <p style='margin:0;color:{"red" if delta > 0 else "blue"};font-size:16px;'>{color} {delta:+.1f}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.info("Insufficient data")
+    
+        with col2:
+            pred = latest.get('pred_ph')
+            if pd.notna(pred):
+                delta = pred - latest['ph']
+                color = "🔴" if abs(delta) > 0.5 else "🟢"
+                st.markdown(f"""
+                <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
+                    <p style='margin:0;color:#666;font-size:14px;'>pH (6h)</p>
+                    <h2 style='margin:5px 0;color:#9C27B0;'>{pred:.2f}</h2>
+                    <p style='margin:0;color:{"red" if abs(delta) > 0.3 else "green"};font-size:16px;'>{color} {delta:+.2f}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.info("Insufficient data")
+    
+        with col3:
+            pred = latest.get('pred_do')
+            if pd.notna(pred):
+                delta = pred - latest['do']
+                color = "🔴" if pred < 4 else "🟡" if pred < 6 else "🟢"
+                st.markdown(f"""
+                <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
+                    <p style='margin:0;color:#666;font-size:14px;'>DO (6h)</p>
+                    <h2 style='margin:5px 0;color:#009688;'>{pred:.2f}</h2>
+                    <p style='margin:0;color:{"red" if delta < 0 else "green"};font-size:16px;'>{color} {delta:+.2f}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.info("Insufficient data")
+    
+        with col4:
+            pred = latest.get('pred_turb')
+            if pd.notna(pred):
+                delta = pred - latest['turbidity']
+                color = "🔴" if pred > 50 else "🟡" if pred > 30 else "🟢"
+                st.markdown(f"""
+                <div style='background:#f0f2f6;padding:15px;border-radius:8px;text-align:center;'>
+                    <p style='margin:0;color:#666;font-size:14px;'>Turbidity (6h)</p>
+                    <h2 style='margin:5px 0;color:#795548;'>{pred:.1f}</h2>
+                    <p style='margin:0;color:{"red" if delta > 0 else "green"};font-size:16px;'>{color} {delta:+.1f}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.info("Insufficient data")
+
+    live_panel()
+    prediction_panel()
 
 elif nav == "Analytics":
     st.subheader("📊 Analytics & Statistics")
@@ -370,13 +408,8 @@ elif nav == "Analytics":
     # Risk Timeline
     st.markdown("---")
     st.subheader("📌 Risk Level Timeline")
-    fig_risk = px.scatter(
-        df, x="timestamp", y=[1]*len(df),
-        color="status",
-        color_discrete_map={"Safe":"green","Warning":"orange","Danger":"red"},
-        title="Risk Events Over Time"
-    )
-    fig_risk.update_yaxes(visible=False)
+    risk_points = status_changes(table)
+    fig_risk = risk_timeline('analytics', risk_points, title="Risk Events Over Time")
     st.plotly_chart(fig_risk, use_container_width=True)
     
     # Time series charts with predictions
@@ -385,54 +418,32 @@ elif nav == "Analytics":
     
     tab1, tab2, tab3, tab4 = st.tabs(["Temperature", "pH", "DO", "Turbidity"])
     
-    with tab1:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['timestamp'], y=df['temp'], name='Actual', line=dict(color='blue', width=2)))
-        if df['pred_temp'].notna().any():
-            fig.add_trace(go.Scatter(x=df['timestamp'], y=df['pred_temp'], name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
-        fig.update_layout(title='Temperature (°C)', xaxis_title='Time', yaxis_title='°C', height=400)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with tab2:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['timestamp'], y=df['ph'], name='Actual', line=dict(color='purple', width=2)))
-        if df['pred_ph'].notna().any():
-            fig.add_trace(go.Scatter(x=df['timestamp'], y=df['pred_ph'], name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
-        fig.update_layout(title='pH', xaxis_title='Time', yaxis_title='pH', height=400)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with tab3:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['timestamp'], y=df['do'], name='Actual', line=dict(color='teal', width=2)))
-        if df['pred_do'].notna().any():
-            fig.add_trace(go.Scatter(x=df['timestamp'], y=df['pred_do'], name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
-        fig.update_layout(title='Dissolved Oxygen (mg/L)', xaxis_title='Time', yaxis_title='mg/L', height=400)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with tab4:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['timestamp'], y=df['turbidity'], name='Actual', line=dict(color='orange', width=2)))
-        if df['pred_turb'].notna().any():
-            fig.add_trace(go.Scatter(x=df['timestamp'], y=df['pred_turb'], name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
-        fig.update_layout(title='Turbidity (NTU)', xaxis_title='Time', yaxis_title='NTU', height=400)
-        st.plotly_chart(fig, use_container_width=True)
+    for tab, (col, pred_col, title, unit, color) in zip((tab1, tab2, tab3, tab4), ANALYTICS_CHARTS):
+        with tab:
+            traces = [dict(**xy(table, col), name='Actual', line=dict(color=color, width=2))]
+            if has_values(table, pred_col):
+                traces.append(dict(**xy(table, pred_col), name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
+            fig = line_chart(col, traces, title=title, yaxis_title=unit, height=400)
+            st.plotly_chart(fig, use_container_width=True)
     
     # Prediction accuracy statistics
     st.markdown("---")
     st.subheader("🎯 Prediction Accuracy")
     
     pred_cols = []
-    if df['pred_temp'].notna().any():
+    if has_values(table, 'pred_temp'):
         pred_cols.extend(["temp", "pred_temp"])
-    if df['pred_ph'].notna().any():
+    if has_values(table, 'pred_ph'):
         pred_cols.extend(["ph", "pred_ph"])
-    if df['pred_do'].notna().any():
+    if has_values(table, 'pred_do'):
         pred_cols.extend(["do", "pred_do"])
-    if df['pred_turb'].notna().any():
+    if has_values(table, 'pred_turb'):
         pred_cols.extend(["turbidity", "pred_turb"])
     
     if pred_cols:
-        st.write(df[pred_cols].tail(50).describe())
+        # describe() is pandas-only: convert just these columns of the last 50 rows
+        tail = table.slice(max(0, table.num_rows - 50)).select(pred_cols)
+        st.write(tail.to_pandas().describe())
     else:
         st.info("No prediction data available yet. Wait for 24h of data.")
     
@@ -440,7 +451,7 @@ elif nav == "Analytics":
     st.markdown("---")
     st.subheader("📉 Statistical Summary")
     
-    summary = df[['temp', 'ph', 'do', 'turbidity']].describe().T
+    summary = table.select(['temp', 'ph', 'do', 'turbidity']).to_pandas().describe().T
     summary.columns = ['Count', 'Mean', 'Std', 'Min', '25%', '50%', '75%', 'Max']
     st.dataframe(summary, use_container_width=True)
     
@@ -464,15 +475,28 @@ elif nav == "Devices":
     st.markdown("---")
     st.subheader("🔧 Gateway Status")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    last_record = cursor.execute("SELECT timestamp FROM sensor_logs ORDER BY timestamp DESC LIMIT 1").fetchone()
-    conn.close()
-    
-    if last_record:
-        last_time = pd.to_datetime(last_record[0])
+    # Small-table reads: one heartbeat row per gateway, one latest row per device
+    health = get_storage().gateway_health()
+    fleet = get_storage().device_latest()
+    
+    if not health.empty:
+        for gw in health.itertuples():
+            beat_age = (datetime.now() - pd.to_datetime(gw.beat_at)).total_seconds()
+            last_msg = pd.to_datetime(gw.last_message_at)
+            details = (f"**{gw.gateway_id}** on {gw.host} · {gw.messages:,} messages, {gw.errors:,} errors · "
+                       f"last message: {last_msg.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(last_msg) else 'none'}")
+            if beat_age > HEARTBEAT_INTERVAL_SEC * HEARTBEAT_MISSED_BEATS:
+                st.error(f"❌ Gateway OFFLINE - last heartbeat {beat_age / 60:.1f} min ago · {details}")
+            elif not gw.mqtt_connected:
+                st.warning(f"⚠️ Gateway running, MQTT disconnected · {details}")
+            elif pd.isna(last_msg) or (datetime.now() - last_msg).total_seconds() > 300:
+                st.warning(f"⚠️ Gateway IDLE - alive, no sensor data for a while · {details}")
+            else:
+                st.success(f"✅ Gateway ONLINE · {details}")
+    elif not fleet.empty:
+        # Gateways older than the heartbeat table: judge by the newest reading
+        last_time = pd.to_datetime(fleet['timestamp']).max()
         time_diff = (datetime.now() - last_time).total_seconds() / 60
-        
         if time_diff < 5:
             st.success(f"✅ Gateway ONLINE - Last data: {last_time.strftime('%Y-%m-%d %H:%M:%S')} ({time_diff:.1f} min ago)")
         elif time_diff < 30:
@@ -482,6 +506,15 @@ elif nav == "Devices":
     else:
         st.error("❌ No data received yet")
     
+    if not fleet.empty:
+        st.markdown("### 🐟 Devices")
+        fleet_cols = ['device_id', 'timestamp', 'status', 'temp', 'ph', 'do', 'turbidity',
+                      'message_count', 'msg_rate_per_min', 'received_at']
+        st.dataframe(
+            fleet[fleet_cols].rename(columns={'timestamp': 'last reading', 'msg_rate_per_min': 'msgs/min'}),
+            use_container_width=True, hide_index=True
+        )
+    
     # Simulator Instructions
     st.markdown("---")
     st.subheader("🎮 Simulator")
@@ -614,32 +647,25 @@ elif nav == "Settings":
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if st.button("📤 Export Full Database"):
-            conn = get_db_connection()
-            full_df = pd.read_sql_query("SELECT * FROM sensor_logs ORDER BY timestamp DESC", conn)
-            conn.close()
-            csv = full_df.to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Download CSV", csv, "full_database.csv", "text/csv")
+        export_fmt = st.selectbox("Export format", db_config.EXPORT_FORMATS, index=1)
+        # Deferred download: runs only when clicked; the backend streams rows to a
+        # temp file and only the encoded file is held as bytes (gzip by default)
+        st.download_button(
+            "📤 Export Full Database",
+            lambda: get_storage().export_bytes(export_fmt),
+            f"full_database.{export_fmt}",
+            db_config.EXPORT_MIME_TYPES[export_fmt]
+        )
     
     with col2:
-        if st.button("📊 Generate PDF Report"):
-            pdf_bytes = generate_pdf_report(df.tail(20))
-            st.download_button("📥 Download PDF", pdf_bytes, "tilapia_report.pdf", "application/pdf")
+        report_panel(get_report_engine(), pc.max(table['timestamp']).as_py().date(), key="settings_report")
     
     with col3:
         days_to_keep = st.number_input("Keep last N days", min_value=1, max_value=365, value=30)
         if st.button(f"🗑️ Delete data older than {days_to_keep} days"):
             try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                # Sử dụng parameterized query an toàn hơn
-                cursor.execute("""
-                    DELETE FROM sensor_logs 
-                    WHERE timestamp < datetime('now', ? || ' days')
-                """, (f'-{days_to_keep}',))
-                deleted = cursor.rowcount
-                conn.commit()
-                conn.close()
+                # Batched delete: the gateway can keep writing between batches
+                deleted = db_config.delete_old_data(days=days_to_keep)
                 
                 if deleted > 0:
                     st.success(f"✅ Deleted {deleted} old records")
@@ -672,43 +698,83 @@ elif nav == "Settings":
 elif nav == "History":
     st.subheader("📋 Historical Data")
     
-    # Filter options
-    col1, col2 = st.columns(2)
+    # Filters run in SQL on the indexes; only one page is fetched at a time
+    info = get_storage().stats()
+    first_day = pd.Timestamp(info['first_timestamp']).date()
+    last_day = pd.Timestamp(info['last_timestamp']).date()
+    
+    col1, col2, col3 = st.columns(3)
     with col1:
-        status_filter = st.multiselect("Filter by status", ['Safe', 'Warning', 'Danger'], default=['Safe', 'Warning', 'Danger'])
+        device_filter = st.selectbox("Device", ["All"] + db_config.list_devices())
     with col2:
-        date_range = st.date_input("Date range", value=(df['timestamp'].min().date(), df['timestamp'].max().date()))
-    
-    # Apply filters
-    filtered_df = df[df['status'].isin(status_filter)]
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        filtered_df = filtered_df[(filtered_df['timestamp'].dt.date >= start_date) & (filtered_df['timestamp'].dt.date <= end_date)]
+        status_filter = st.multiselect("Filter by status", ['Safe', 'Warning', 'Danger'], default=['Safe', 'Warning', 'Danger'])
+    with col3:
+        date_range = st.date_input("Date range", value=(first_day, last_day), min_value=first_day, max_value=last_day)
+    
+    # Value filters only apply once moved off the full scale
+    value_ranges = {}
+    with st.expander("Value ranges"):
+        value_cols = st.columns(len(HISTORY_VALUE_SCALES))
+        for column, (col, (label, low, high)) in zip(value_cols, HISTORY_VALUE_SCALES.items()):
+            with column:
+                selected = st.slider(label, low, high, (low, high))
+            if selected != (low, high):
+                value_ranges[col] = selected
+    
+    page_size = st.selectbox("Rows per page", [50, 100, 200], index=1)
+    
+    filters = {
+        'device_id': None if device_filter == "All" else device_filter,
+        'start_time': f"{date_range[0]} 00:00:00" if len(date_range) == 2 else None,
+        'end_time': f"{date_range[1]} 23:59:59" if len(date_range) == 2 else None,
+        'statuses': status_filter,
+        'value_ranges': value_ranges,
+    }
+    
+    # Keyset cursors of the pages seen so far; reset whenever the filters change
+    filter_key = repr((filters, page_size))
+    if st.session_state.get('history_filter_key') != filter_key:
+        st.session_state['history_filter_key'] = filter_key
+        st.session_state['history_cursors'] = [None]
+    cursors = st.session_state['history_cursors']
+    
+    page_table, next_cursor = db_config.get_history_page(
+        **filters, before=cursors[-1], page_size=page_size, as_arrow=True
+    )
+    total, exact = db_config.count_history(**filters)
     
-    st.write(f"Showing {len(filtered_df)} of {len(df)} records")
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    with nav1:
+        if st.button("⬅️ Newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with nav2:
+        if st.button("Older ➡️", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    with nav3:
+        st.write(f"Page {len(cursors)} · {page_table.num_rows} rows of {'' if exact else '≤ '}{total:,} matching records")
     
     # Display table
-    display_cols = ['timestamp', 'temp', 'ph', 'do', 'turbidity', 'pred_temp', 'pred_ph', 'pred_do', 'pred_turb', 'status']
-    st.dataframe(filtered_df[display_cols].iloc[::-1], use_container_width=True, hide_index=True)
+    display_cols = ['timestamp', 'device_id', 'temp', 'ph', 'do', 'turbidity', 'pred_temp', 'pred_ph', 'pred_do', 'pred_turb', 'status']
+    st.dataframe(page_table.select(display_cols), use_container_width=True, hide_index=True)
     
     # Download options
     st.markdown("---")
     col1, col2 = st.columns(2)
     
     with col1:
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download CSV", csv, "tilapia_data.csv", "text/csv")
+        # Export every matching row (not just this page), streamed by the backend
+        st.download_button(
+            "📥 Download CSV (gzip)",
+            lambda: get_storage().export_bytes("csv.gz", **filters),
+            "tilapia_data.csv.gz",
+            db_config.EXPORT_MIME_TYPES["csv.gz"]
+        )
     
     with col2:
-        if st.button("📄 Generate PDF Report"):
-            pdf_bytes = generate_pdf_report(filtered_df)
-            st.download_button("📥 Download PDF", pdf_bytes, "tilapia_report.pdf", "application/pdf")
+        report_panel(get_report_engine(), last_day, key="history_report")
 
-# Footer & Auto-refresh (only for Realtime page)
+# Footer
 st.markdown("---")
 st.caption(f"🐟 Tilapia Water Quality Monitoring | Last update: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-# Only auto-refresh on Realtime page to reduce console errors and improve performance
-if nav == "Realtime":
-    time.sleep(refresh)
-    st.rerun()
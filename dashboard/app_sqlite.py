@@ -6,15 +6,16 @@ Streamlit Dashboard with SQLite Database Support
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-import time, io, os, json, sys
+import os, sys
 from datetime import datetime, timedelta
 from pathlib import Path
-from paho.mqtt import client as mqtt_client
-from fpdf import FPDF
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from downsample import xy, rollup as downsample_rollup
+from live_feed import LiveFeed
+from charts import line_chart
+from reports import ReportEngine, report_panel
 
 # Add database module to path
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -31,23 +32,47 @@ import importlib.util
 spec = importlib.util.spec_from_file_location("db_config", str(DB_CONFIG_FILE))
 db_config = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(db_config)
+sys.modules["db_config"] = db_config  # storage.py shares this instance
+
+spec = importlib.util.spec_from_file_location("storage", str(DB_DIR / "storage.py"))
+storage = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(storage)
 
-get_latest_data = db_config.get_latest_data
-get_all_data = db_config.get_all_data
-get_latest_24h = db_config.get_latest_24h
-get_risk_statistics = db_config.get_risk_statistics
-get_table_info = db_config.get_table_info
 export_to_csv = db_config.export_to_csv
-init_database = db_config.init_database
+
+
+@st.cache_resource
+def get_storage():
+    """One backend per server process (DuckDB keeps a persistent connection)"""
+    backend = storage.get_backend(os.getenv("STORAGE_BACKEND", "sqlite"))
+    backend.init()
+    return backend
 
 # ----------------- CONFIG -----------------
 ALERT_INTERVAL_MIN = 10  # Minutes between repeated alerts
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_TOPIC = "iot/tilapia/data"
+LIVE_TOPIC = os.getenv("LIVE_TOPIC", "iot/tilapia/live")
+REFRESH_SEC = 5          # Latest-reading panel
+TREND_REFRESH_SEC = 30   # Charts + table panel
+REPORT_CACHE_DIR = SCRIPT_DIR.parent / os.getenv("REPORT_CACHE_DIR", "database/reports")
+
+@st.cache_resource
+def get_live_feed():
+    """One LIVE_TOPIC subscription per server process, shared by all sessions"""
+    return LiveFeed(MQTT_BROKER, MQTT_PORT, LIVE_TOPIC, secret=os.getenv("LIVE_SECRET", ""),
+                    max_age=int(os.getenv("LIVE_MAX_AGE_SEC", "30"))).start()
+
+
+@st.cache_resource
+def get_report_engine():
+    """Background report worker + PDF cache shared by all sessions"""
+    return ReportEngine(get_storage(), REPORT_CACHE_DIR)
+
 
 # Initialize database
-init_database()
+backend = get_storage()
 
 # ----------------- EMAIL ALERT -----------------
 def send_email_alert(to_email, subject, message, sender_email, sender_password):
@@ -86,29 +111,6 @@ def get_latest(df):
     return df.iloc[-1].to_dict()
 
 
-# ----------------- PDF REPORT -----------------
-def generate_pdf_report(df_tail, out_path="report_generated.pdf"):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, "Tilapia Water Quality - Auto Report", ln=True)
-
-    if not df_tail.empty:
-        latest = df_tail.iloc[-1]
-        lines = [
-            f"Time: {latest['timestamp']}",
-            f"Temperature: {latest['temp']} °C",
-            f"pH: {latest['ph']}",
-            f"DO: {latest['do']} mg/L",
-            f"Turbidity: {latest['turbidity']} NTU",
-            f"Status: {latest['status']}"
-        ]
-        for line in lines:
-            pdf.cell(0, 10, line, ln=True)
-
-    pdf.output(out_path)
-
-
 # ========================================
 # STREAMLIT UI
 # ========================================
@@ -124,7 +126,7 @@ with st.sidebar:
     st.markdown("---")
     st.subheader("📊 Database Info")
     try:
-        info = get_table_info()
+        info = backend.stats()
         st.metric("Total Records", f"{info['total_records']:,}")
         st.metric("DB Size", f"{info['db_size_mb']} MB")
         if info['last_timestamp']:
@@ -153,86 +155,100 @@ with st.sidebar:
     
     # Auto refresh
     st.markdown("---")
-    auto_refresh = st.checkbox("🔄 Auto Refresh (5s)", value=True)
-    
-    if auto_refresh:
-        time.sleep(5)
-        st.rerun()
+    auto_refresh = st.checkbox(f"🔄 Auto Refresh ({REFRESH_SEC}s)", value=True)
 
 # Main content
 st.title("🌊 Tilapia Water Quality Monitoring Dashboard")
 st.markdown("Real-time monitoring with AI prediction (SQLite Backend)")
 
-# Load data based on selection
-try:
+
+def load_range(data_range):
+    """Rows for the selected range, plus DB-side buckets for All Data"""
+    rollup = None
     if data_range == "Last 100":
-        df = get_latest_data(100)
+        df = backend.latest(100)
     elif data_range == "Last 500":
-        df = get_latest_data(500)
+        df = backend.latest(500)
     elif data_range == "Last 24h":
-        df = get_latest_24h()
-    else:  # All Data
-        df = get_all_data()
+        df = backend.range(datetime.now() - timedelta(hours=24), datetime.now())
+    else:  # All Data: charts come from DB-side buckets, raw rows only for the table
+        df = backend.latest(500)
+        rollup = downsample_rollup(backend)
     
     if 'timestamp' in df.columns:
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         df = df.sort_values('timestamp')
-    
+    return df, rollup
+
+
+# Check if data exists
+try:
+    has_data = not backend.latest(1).empty
 except Exception as e:
     st.error(f"❌ Database error: {e}")
-    df = pd.DataFrame()
+    has_data = False
 
-# Check if data exists
-if df.empty:
+if not has_data:
     st.warning("⚠️ No data available. Start the gateway to collect data.")
     st.stop()
 
-# Latest reading
-latest = get_latest(df)
-st.markdown("---")
-st.subheader("📡 Latest Reading")
-
-col1, col2, col3, col4, col5 = st.columns(5)
+# Live panels rerun on their own timers instead of the whole script
+live_every = REFRESH_SEC if auto_refresh else None
+trend_every = TREND_REFRESH_SEC if auto_refresh else None
 
-with col1:
-    st.metric(
-        "Temperature",
-        f"{latest.get('temp', 0):.1f} °C",
-        f"{latest.get('pred_temp', 0):.1f} (6h)" if latest.get('pred_temp') else None
-    )
-
-with col2:
-    st.metric(
-        "pH",
-        f"{latest.get('ph', 0):.2f}",
-        f"{latest.get('pred_ph', 0):.2f} (6h)" if latest.get('pred_ph') else None
-    )
 
-with col3:
-    st.metric(
-        "DO",
-        f"{latest.get('do', 0):.2f} mg/L",
-        f"{latest.get('pred_do', 0):.2f} (6h)" if latest.get('pred_do') else None
-    )
-
-with col4:
-    st.metric(
-        "Turbidity",
-        f"{latest.get('turbidity', 0):.1f} NTU",
-        f"{latest.get('pred_turb', 0):.1f} (6h)" if latest.get('pred_turb') else None
-    )
-
-with col5:
-    status = latest.get('status', 'Unknown')
-    color = {"Safe": "🟢", "Warning": "🟡", "Danger": "🔴"}.get(status, "⚪")
-    st.metric("Status", f"{color} {status}")
+@st.fragment(run_every=live_every)
+def latest_panel():
+    # Latest reading
+    # Pushed by the gateway; the DB is only read until the first push arrives
+    latest = get_live_feed().latest() or get_latest(backend.latest(1))
+    st.markdown("---")
+    st.subheader("📡 Latest Reading")
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+
+    with col1:
+        st.metric(
+            "Temperature",
+            f"{latest.get('temp', 0):.1f} °C",
+            f"{latest.get('pred_temp', 0):.1f} (6h)" if latest.get('pred_temp') else None
+        )
+
+    with col2:
+        st.metric(
+            "pH",
+            f"{latest.get('ph', 0):.2f}",
+            f"{latest.get('pred_ph', 0):.2f} (6h)" if latest.get('pred_ph') else None
+        )
+
+    with col3:
+        st.metric(
+            "DO",
+            f"{latest.get('do', 0):.2f} mg/L",
+            f"{latest.get('pred_do', 0):.2f} (6h)" if latest.get('pred_do') else None
+        )
+
+    with col4:
+        st.metric(
+            "Turbidity",
+            f"{latest.get('turbidity', 0):.1f} NTU",
+            f"{latest.get('pred_turb', 0):.1f} (6h)" if latest.get('pred_turb') else None
+        )
+
+    with col5:
+        status = latest.get('status', 'Unknown')
+        color = {"Safe": "🟢", "Warning": "🟡", "Danger": "🔴"}.get(status, "⚪")
+        st.metric("Status", f"{color} {status}")
+
+
+latest_panel()
 
 # Risk Statistics
 st.markdown("---")
 st.subheader("📊 Risk Distribution")
 
 try:
-    risk_stats = get_risk_statistics()
+    risk_stats = backend.stats()['risk']
     if risk_stats:
         risk_df = pd.DataFrame(risk_stats)
         
@@ -258,82 +274,75 @@ try:
 except Exception as e:
     st.error(f"Could not load risk statistics: {e}")
 
-# Time Series Charts
-st.markdown("---")
-st.subheader("📈 Time Series Data")
-
-if len(df) > 0:
-    # Temperature
-    fig_temp = go.Figure()
-    fig_temp.add_trace(go.Scatter(
-        x=df['timestamp'], 
-        y=df['temp'],
-        name='Actual',
-        line=dict(color='blue', width=2)
-    ))
-    if 'pred_temp' in df.columns and df['pred_temp'].notna().any():
-        fig_temp.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df['pred_temp'],
-            name='Predicted (6h)',
-            line=dict(color='red', dash='dash')
-        ))
-    fig_temp.update_layout(title='Temperature (°C)', xaxis_title='Time', yaxis_title='°C')
-    st.plotly_chart(fig_temp, use_container_width=True)
-    
-    # pH
-    fig_ph = go.Figure()
-    fig_ph.add_trace(go.Scatter(x=df['timestamp'], y=df['ph'], name='Actual'))
-    if 'pred_ph' in df.columns and df['pred_ph'].notna().any():
-        fig_ph.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df['pred_ph'],
-            name='Predicted (6h)',
-            line=dict(dash='dash')
-        ))
-    fig_ph.update_layout(title='pH', xaxis_title='Time', yaxis_title='pH')
-    st.plotly_chart(fig_ph, use_container_width=True)
-    
-    # DO
-    fig_do = go.Figure()
-    fig_do.add_trace(go.Scatter(x=df['timestamp'], y=df['do'], name='Actual'))
-    if 'pred_do' in df.columns and df['pred_do'].notna().any():
-        fig_do.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df['pred_do'],
-            name='Predicted (6h)',
-            line=dict(dash='dash')
-        ))
-    fig_do.update_layout(title='Dissolved Oxygen (mg/L)', xaxis_title='Time', yaxis_title='mg/L')
-    st.plotly_chart(fig_do, use_container_width=True)
+# (actual column, prediction column, title, unit, line color)
+CHART_SPECS = [
+    ('temp', 'pred_temp', 'Temperature (°C)', '°C', 'blue'),
+    ('ph', 'pred_ph', 'pH', 'pH', None),
+    ('do', 'pred_do', 'Dissolved Oxygen (mg/L)', 'mg/L', None),
+    ('turbidity', 'pred_turb', 'Turbidity (NTU)', 'NTU', None),
+]
+
+
+@st.fragment(run_every=trend_every)
+def trend_panel():
+    try:
+        df, rollup = load_range(data_range)
+    except Exception as e:
+        st.error(f"❌ Database error: {e}")
+        return
     
-    # Turbidity
-    fig_turb = go.Figure()
-    fig_turb.add_trace(go.Scatter(x=df['timestamp'], y=df['turbidity'], name='Actual'))
-    if 'pred_turb' in df.columns and df['pred_turb'].notna().any():
-        fig_turb.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df['pred_turb'],
-            name='Predicted (6h)',
-            line=dict(dash='dash')
-        ))
-    fig_turb.update_layout(title='Turbidity (NTU)', xaxis_title='Time', yaxis_title='NTU')
-    st.plotly_chart(fig_turb, use_container_width=True)
-
-# Data Table
-st.markdown("---")
-st.subheader("📋 Recent Data")
-st.dataframe(df.tail(50).iloc[::-1], use_container_width=True, hide_index=True)
+    # Time Series Charts
+    st.markdown("---")
+    st.subheader("📈 Time Series Data")
+
+    if rollup is not None and not rollup.empty:
+        st.caption(f"All Data: {rollup.attrs['bucket_minutes']}-minute buckets (min/max band + mean)")
+        for col, pred_col, title, unit, color in CHART_SPECS:
+            traces = [
+                dict(x=rollup['bucket'], y=rollup[f'{col}_max'], line=dict(width=0),
+                     showlegend=False, hoverinfo='skip'),
+                dict(x=rollup['bucket'], y=rollup[f'{col}_min'], line=dict(width=0),
+                     fill='tonexty', name='Min–Max'),
+                dict(x=rollup['bucket'], y=rollup[f'{col}_mean'], name='Mean',
+                     line=dict(color=color, width=2)),
+            ]
+            if rollup[f'{pred_col}_mean'].notna().any():
+                traces.append(dict(**xy(rollup, f'{pred_col}_mean', x_col='bucket'),
+                                   name='Predicted (6h)', line=dict(dash='dash')))
+            fig = line_chart(f'rollup_{col}', traces, title=title, yaxis_title=unit)
+            st.plotly_chart(fig, use_container_width=True)
+    elif len(df) > 0:
+        for col, pred_col, title, unit, color in CHART_SPECS:
+            traces = [dict(**xy(df, col), name='Actual', line=dict(color=color, width=2))]
+            if pred_col in df.columns and df[pred_col].notna().any():
+                traces.append(dict(**xy(df, pred_col), name='Predicted (6h)',
+                                   line=dict(color='red' if color else None, dash='dash')))
+            fig = line_chart(col, traces, title=title, yaxis_title=unit)
+            st.plotly_chart(fig, use_container_width=True)
+
+    # Data Table
+    st.markdown("---")
+    st.subheader("📋 Recent Data")
+    st.dataframe(df.tail(50).iloc[::-1], use_container_width=True, hide_index=True)
+
+
+trend_panel()
 
-# Download button
-csv_bytes = df.to_csv(index=False).encode()
+# Download button (deferred; the selected backend streams the export, only the gzip is kept)
 st.download_button(
-    "📥 Download Full Data as CSV",
-    csv_bytes,
-    "tilapia_data.csv",
-    "text/csv"
+    "📥 Download Full Data as CSV (gzip)",
+    lambda: get_storage().export_bytes("csv.gz"),
+    "tilapia_data.csv.gz",
+    db_config.EXPORT_MIME_TYPES["csv.gz"]
 )
 
+# Daily / weekly PDF report (built in the background, cached per data version)
+st.markdown("---")
+st.subheader("📄 Reports")
+last_timestamp = backend.stats()['last_timestamp']
+if last_timestamp:
+    report_panel(get_report_engine(), pd.Timestamp(last_timestamp).date())
+
 # Footer
 st.markdown("---")
 st.caption("🐟 Tilapia Smart Water Quality Monitoring System | SQLite Backend")
@@ -0,0 +1,79 @@
+# dashboard/benchmark_arrow.py
+"""
+Benchmark: pandas vs Arrow from sensor_logs to st.dataframe
+
+Per refresh of N rows:
+- read:   SQLite -> DataFrame (pd.read_sql_query) vs SQLite -> compact Arrow
+          table (db_config.query_arrow: float32 values, dictionary labels)
+- encode: what st.dataframe does with it (Arrow IPC bytes for the browser)
+- memory: size of the result held in the recent-rows buffer
+
+plus the incremental refresh the buffer actually does once it is warm
+(fetch only the rows with id > last seen id).
+
+Usage:
+    python benchmark_arrow.py
+    python benchmark_arrow.py --rows 500 5000 50000 --repeat 5 --db ../database/iot_data.db
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "database"))
+import db_config
+
+
+def _timed(func, repeat):
+    func()  # warm-up (page cache, imports)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def benchmark_rows(n, repeat=5, new_rows=10):
+    results = {}
+    for label, read in (
+        ("pandas", lambda: db_config.get_latest_data(n)),
+        ("arrow", lambda: db_config.get_latest_arrow(n)),
+    ):
+        read_ms, data = _timed(read, repeat)
+        encode_ms, payload = _timed(lambda: convert_anything_to_arrow_bytes(data), repeat)
+        memory = data.memory_usage(deep=True).sum() if label == "pandas" else data.nbytes
+        results[label] = (read_ms, encode_ms, memory / 1024, len(payload) / 1024)
+
+    _, max_id = db_config.get_id_bounds()
+    incremental_ms, _ = _timed(lambda: db_config.get_rows_after_arrow(max_id - new_rows), repeat)
+    return results, incremental_ms
+
+
+def run_benchmark(rows, repeat, new_rows):
+    total = db_config.get_table_info()['total_records']
+    print("=" * 80)
+    print(f"🏹 PANDAS vs ARROW per refresh ({db_config.DB_PATH.name}, {total:,} rows)")
+    print("=" * 80)
+    print(f"{'rows':>8}  {'path':<7} {'read ms':>9} {'encode ms':>10} {'total ms':>9} {'memory KB':>10} {'payload KB':>11}")
+    for n in rows:
+        if n > total:
+            print(f"{n:>8}  skipped (only {total:,} rows)")
+            continue
+        results, incremental_ms = benchmark_rows(n, repeat, new_rows)
+        for label, (read_ms, encode_ms, memory_kb, payload_kb) in results.items():
+            print(f"{n:>8}  {label:<7} {read_ms:>9.2f} {encode_ms:>10.2f} {read_ms + encode_ms:>9.2f} "
+                  f"{memory_kb:>10.0f} {payload_kb:>11.0f}")
+    print(f"\n🔁 Warm buffer refresh ({new_rows} new rows, Arrow): {incremental_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pandas vs Arrow dashboard data path benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 5000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--new-rows", type=int, default=10, help="Rows per incremental refresh")
+    parser.add_argument("--db", type=Path, default=db_config.DB_PATH)
+    args = parser.parse_args()
+    db_config.DB_PATH = args.db
+    run_benchmark(args.rows, args.repeat, args.new_rows)
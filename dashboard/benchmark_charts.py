@@ -0,0 +1,112 @@
+# dashboard/benchmark_charts.py
+"""
+Benchmark: rebuilding SVG figures vs cached WebGL figures per rerun
+
+Measures the server side of one refresh (build the figure, then the
+to_dict + to_json that st.plotly_chart does) and the JSON sent to the
+browser. The browser's drawing time is not measured here: that is where
+Scattergl (one WebGL draw) replaces one SVG path per trace.
+
+Usage:
+    python benchmark_charts.py
+    python benchmark_charts.py --points 1000 10000 100000 --repeat 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from charts import GAUGES, gauge, line_chart
+
+
+def _series(n):
+    x = pd.date_range("2025-01-01", periods=n, freq="min")
+    rng = np.random.default_rng(0)
+    actual = 27 + np.cumsum(rng.normal(0, 0.05, n))
+    return x, actual, actual + rng.normal(0, 0.3, n)
+
+
+def _rebuild_svg(x, actual, pred):
+    """What the Analytics tabs did before: a new go.Scatter figure every rerun"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=actual, name='Actual', line=dict(color='blue', width=2)))
+    fig.add_trace(go.Scatter(x=x, y=pred, name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)))
+    fig.update_layout(title='Temperature (°C)', xaxis_title='Time', yaxis_title='°C', height=400)
+    return fig
+
+
+def _cached_gl(store, x, actual, pred):
+    return line_chart('temp', [
+        dict(x=x, y=actual, name='Actual', line=dict(color='blue', width=2)),
+        dict(x=x, y=pred, name='Predicted (6h)', line=dict(dash='dash', color='red', width=2)),
+    ], store=store, title='Temperature (°C)', yaxis_title='°C', height=400)
+
+
+def _rebuild_gauges(values):
+    return [
+        go.Figure(go.Indicator(mode="gauge+number", value=values[col], title={"text": title},
+                               gauge={"axis": {"range": axis_range}, "bar": {"color": color}}))
+        for col, (title, axis_range, color) in GAUGES.items()
+    ]
+
+
+def _timed(func, repeat):
+    func()  # warm-up (the cached variant builds its figure here)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def _serialize(figs):
+    """Same work as st.plotly_chart: Figure.to_dict() then to_json without validation"""
+    return sum(len(pio.to_json(fig.to_dict(), validate=False)) for fig in figs)
+
+
+def benchmark_points(n, repeat=10):
+    x, actual, pred = _series(n)
+    store = {}
+    results = {}
+    for label, build in (
+        ("Scatter, rebuilt", lambda: [_rebuild_svg(x, actual, pred)]),
+        ("Scattergl, cached", lambda: [_cached_gl(store, x, actual, pred)]),
+    ):
+        build_ms, figs = _timed(build, repeat)
+        json_ms, size = _timed(lambda: _serialize(figs), repeat)
+        results[label] = (build_ms, json_ms, size / 1024)
+    return results
+
+
+def benchmark_gauges(repeat=50):
+    values = {col: 1.0 for col in GAUGES}
+    store = {}
+    rebuild_ms, _ = _timed(lambda: _rebuild_gauges(values), repeat)
+    cached_ms, _ = _timed(lambda: [gauge(col, values[col], store=store) for col in GAUGES], repeat)
+    return rebuild_ms, cached_ms
+
+
+def run_benchmark(points, repeat):
+    print("=" * 72)
+    print("📊 CHART RENDER BENCHMARK (server side, per rerun)")
+    print("=" * 72)
+    print(f"{'points':>8}  {'variant':<20} {'build ms':>9} {'json ms':>9} {'total ms':>9} {'payload KB':>11}")
+    for n in points:
+        for label, (build_ms, json_ms, size_kb) in benchmark_points(n, repeat).items():
+            print(f"{n:>8}  {label:<20} {build_ms:>9.2f} {json_ms:>9.2f} {build_ms + json_ms:>9.2f} {size_kb:>11.0f}")
+
+    rebuild_ms, cached_ms = benchmark_gauges()
+    print(f"\n🎛️  4 gauges: rebuilt {rebuild_ms:.2f} ms, cached {cached_ms:.2f} ms")
+    print("\nℹ️  Dashboards downsample each trace to ≤ 2000 points (downsample.py);")
+    print("   larger sizes show the cost when a chart is fed raw rows.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plotly chart render benchmark")
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    run_benchmark(args.points, args.repeat)
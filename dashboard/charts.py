@@ -0,0 +1,104 @@
+# dashboard/charts.py
+"""
+Plotly figures reused across reruns
+
+Each browser session builds a figure once (layout, template, trace styles)
+and keeps it in st.session_state; a refresh only swaps the trace data or
+the gauge value, which skips Plotly's per-property validation of the whole
+figure. Time series use Scattergl, so the browser draws them with WebGL
+instead of one SVG node per point.
+
+    fig = line_chart('temp', [dict(name='Actual', **xy(df, 'temp'))], title='Temperature (°C)')
+    st.plotly_chart(fig, use_container_width=True)
+"""
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+
+RISK_COLORS = {"Safe": "green", "Warning": "orange", "Danger": "red"}
+
+# column -> (title, axis range, bar color)
+GAUGES = {
+    'temp': ("Temperature (°C)", [0, 40], "#2196F3"),
+    'ph': ("pH", [0, 14], "#9C27B0"),
+    'do': ("DO (mg/L)", [0, 10], "#009688"),
+    'turbidity': ("Turbidity (NTU)", [0, 100], "#795548"),
+}
+
+# Trace keys that carry data (everything else is style, set once)
+DATA_KEYS = ("x", "y")
+
+
+def cached_figure(key, build, store=None):
+    """Figure for `key` from the session (built with build() the first time)"""
+    store = st.session_state if store is None else store
+    figures = store.setdefault("_figures", {})
+    fig = figures.get(key)
+    if fig is None:
+        fig = figures[key] = build()
+    return fig
+
+
+def gauge(col, value, store=None):
+    """Gauge for one of GAUGES, only the value changes between refreshes"""
+    title, axis_range, color = GAUGES[col]
+
+    def build():
+        return go.Figure(go.Indicator(
+            mode="gauge+number",
+            title={"text": title},
+            gauge={"axis": {"range": axis_range}, "bar": {"color": color}}
+        ))
+
+    fig = cached_figure(("gauge", col), build, store)
+    fig.data[0].value = value
+    return fig
+
+
+def line_chart(key, traces, store=None, **layout):
+    """
+    WebGL line chart; traces are dicts of go.Scattergl arguments (x, y, name,
+    line, fill, ...). Styles and layout are applied when the figure is built,
+    x / y (and the title) on every call.
+    """
+    names = tuple(trace.get("name") for trace in traces)
+
+    def build():
+        fig = go.Figure([
+            go.Scattergl(mode="lines", **{k: v for k, v in trace.items() if k not in DATA_KEYS})
+            for trace in traces
+        ])
+        fig.update_layout(xaxis_title="Time", **layout)
+        return fig
+
+    # Adding / dropping a trace (e.g. no predictions yet) gets its own figure
+    fig = cached_figure(("line", key, names), build, store)
+    with fig.batch_update():
+        for trace, spec in zip(fig.data, traces):
+            trace.x = spec["x"]
+            trace.y = spec["y"]
+        if "title" in layout:
+            fig.layout.title.text = layout["title"]
+    return fig
+
+
+def risk_timeline(key, df, col="status", store=None, **layout):
+    """Status markers on one row, one WebGL trace per risk level"""
+    def build():
+        fig = go.Figure([
+            go.Scattergl(mode="markers", name=status, marker=dict(color=color))
+            for status, color in RISK_COLORS.items()
+        ])
+        fig.update_yaxes(visible=False)
+        fig.update_layout(xaxis_title="Time", **layout)
+        return fig
+
+    fig = cached_figure(("risk", key), build, store)
+    status = df[col].to_numpy()
+    with fig.batch_update():
+        for trace in fig.data:
+            x = df["timestamp"].to_numpy()[status == trace.name]
+            trace.x = x
+            trace.y = np.ones(len(x))
+    return fig
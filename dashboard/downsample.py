@@ -0,0 +1,142 @@
+# dashboard/downsample.py
+"""
+Server-side downsampling for long-range charts
+
+Every chart sends at most MAX_POINTS points to the browser, however many
+rows fall in the selected range:
+
+- lttb():    Largest-Triangle-Three-Buckets, keeps the visual shape of a line
+- minmax():  min + max of each bucket, keeps every spike (envelope)
+- rollup():  per-bucket min/mean/max computed in the database, so long ranges
+             never load raw rows at all
+
+    fig.add_trace(go.Scatter(**xy(df, 'temp'), name='Actual'))
+
+xy() and status_changes() take a DataFrame or an Arrow table.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Point budget per trace (about 2 points per horizontal pixel of a wide chart)
+MAX_POINTS = 2000
+
+
+def _as_float(x):
+    """Datetime / numeric array -> float64 for the area math"""
+    x = np.asarray(x)
+    if x.dtype == object:
+        x = pd.to_datetime(x).to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    # Average of every bucket in one pass (the "third point" of each triangle)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area (a, candidate, next bucket average) for the whole bucket
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax(x, y, n_out=MAX_POINTS):
+    """Indices of the min and max of equal-count buckets (plus both ends)"""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = (n_out - 2) // 2
+    size = -(-n // n_buckets)
+    # Pad to a (buckets x size) matrix so argmin/argmax run once over all buckets
+    pad = n_buckets * size - n
+    lows = np.concatenate((y, np.full(pad, np.inf))).reshape(n_buckets, size)
+    highs = np.concatenate((y, np.full(pad, -np.inf))).reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    keep = np.concatenate((
+        [0, n - 1],
+        offsets + lows.argmin(axis=1),
+        offsets + highs.argmax(axis=1),
+    ))
+    return np.unique(keep[keep < n])
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(x, y, n_out=MAX_POINTS, method="lttb"):
+    """Reduce (x, y) to at most n_out points; NaN values are dropped first"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    idx = METHODS[method](x, y, n_out)
+    return x[idx], y[idx]
+
+
+def xy(df, col, x_col="timestamp", n_out=MAX_POINTS, method="lttb"):
+    """go.Scatter keyword arguments for one downsampled column"""
+    x, y = downsample(df[x_col], df[col], n_out, method)
+    return {"x": x, "y": y}
+
+
+def status_changes(df, col="status"):
+    """Rows at the start and end of each run of equal status (lossless for timelines)"""
+    status = df[col].to_numpy()
+    if len(status) < 3:
+        return df
+    edge = np.ones(len(status), dtype=bool)
+    edge[1:-1] = (status[1:-1] != status[:-2]) | (status[1:-1] != status[2:])
+    return df.filter(pa.array(edge)) if isinstance(df, pa.Table) else df[edge]
+
+
+def bucket_minutes(start_time, end_time, n_buckets=MAX_POINTS // 2):
+    """Smallest whole-minute bucket that splits the range into <= n_buckets"""
+    span = (pd.Timestamp(end_time) - pd.Timestamp(start_time)).total_seconds() / 60
+    return max(1, int(np.ceil(span / n_buckets)))
+
+
+def rollup(backend, start_time=None, end_time=None, n_out=MAX_POINTS):
+    """
+    Per-bucket min / mean / max from the storage backend, sized so each
+    trace (one point per bucket) stays within n_out points. Open bounds
+    use the first / last stored timestamp.
+    """
+    if start_time is None or end_time is None:
+        info = backend.stats()
+        if not info['total_records']:
+            return pd.DataFrame()
+        start_time = start_time or info['first_timestamp']
+        end_time = end_time or info['last_timestamp']
+    minutes = bucket_minutes(start_time, end_time, max(1, n_out - 1))
+    df = backend.aggregates(start_time, end_time, bucket_minutes=minutes)
+    df['bucket'] = pd.to_datetime(df['bucket'])
+    df.attrs['bucket_minutes'] = minutes
+    return df
@@ -0,0 +1,100 @@
+# dashboard/live_feed.py
+"""
+Push channel from the gateway to the dashboards
+
+The gateway publishes every processed reading (values, predictions, risk)
+as JSON on LIVE_TOPIC with retain=True. Each dashboard process subscribes
+once (st.cache_resource) and every browser session reads the latest
+reading of a device from memory, so latest-value panels cost no DB query.
+
+Payloads are checked with live_message.decode(): readings older than
+max_age seconds (stale retained message, replay, stopped gateway) and, with
+a secret, unsigned or forged ones are ignored, so callers fall back to the
+database.
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from paho.mqtt import client as mqtt_client
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import live_message
+
+# Default for dashboards without config.LIVE_MAX_AGE_SEC (~10 publish intervals)
+LIVE_MAX_AGE_SEC = 30
+# Readings without device_id (as db_config.DEFAULT_DEVICE_ID)
+DEFAULT_DEVICE_ID = "default"
+
+
+class LiveFeed:
+    def __init__(self, broker, port, topic, secret="", max_age=LIVE_MAX_AGE_SEC,
+                 username="", password="", tls=False):
+        self.broker = broker
+        self.port = port
+        self.topic = topic
+        self.secret = secret
+        self.max_age = max_age
+        self.connected = False
+        self.received_at = None
+        self.rejected = 0
+        self._latest = {}  # device_id -> (reading, published_at)
+        self._lock = threading.Lock()
+        self._client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION1)
+        if username:
+            self._client.username_pw_set(username, password or None)
+        if tls:
+            self._client.tls_set()
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+
+    def start(self):
+        """Connect in the background; paho reconnects on its own"""
+        self._client.connect_async(self.broker, self.port)
+        self._client.loop_start()
+        return self
+
+    def stop(self):
+        self._client.loop_stop()
+        self._client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.connected = rc == 0
+        if self.connected:
+            # Retained message delivers the current reading right away (if still fresh)
+            client.subscribe(self.topic)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+
+    def _on_message(self, client, userdata, msg):
+        message = live_message.decode(msg.payload, self.secret, self.max_age)
+        if message is None:
+            self.rejected += 1
+            return
+        reading, published_at = message
+        device_id = reading.get("device_id") or DEFAULT_DEVICE_ID
+        with self._lock:
+            previous = self._latest.get(device_id)
+            if previous is not None and published_at < previous[1]:
+                return  # out of order / replayed older reading
+            self._latest[device_id] = (reading, published_at)
+            self.received_at = datetime.now()
+
+    def latest(self, device_id=None):
+        """
+        Most recent reading of device_id (dict with sensor_logs column names),
+        of any device when None; None if there is none or it is older than max_age
+        """
+        with self._lock:
+            if device_id is None:
+                entry = max(self._latest.values(), key=lambda item: item[1], default=None)
+            else:
+                entry = self._latest.get(device_id)
+            if entry is None or time.time() - entry[1] > self.max_age:
+                return None
+            return dict(entry[0])
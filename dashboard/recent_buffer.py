@@ -0,0 +1,94 @@
+# dashboard/recent_buffer.py
+"""
+Per-process buffer of the most recent sensor rows
+
+Shared by every browser session through st.cache_resource. A refresh first
+compares the backend's data version (PRAGMA data_version on SQLite); only
+when it moved does it look at MIN/MAX(id) and fetch rows with id > last seen
+id, so refresh cost scales with new rows instead of the window size.
+
+Rows are kept as an Arrow table with the compact sensor types (float32
+values, dictionary-encoded labels), which st.dataframe and the charts read
+without going through pandas; get() still returns a DataFrame for older
+callers.
+"""
+
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Merge appended chunks once there are this many (keeps slicing cheap)
+MAX_CHUNKS = 32
+
+
+class RecentRows:
+    def __init__(self, backend, capacity=500):
+        self.backend = backend
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._table = None
+        self._version = None
+        self._last_id = 0
+
+    def _reload(self):
+        table = self.backend.latest_arrow(self.capacity)
+        self._set(table.sort_by('id'))
+
+    def _set(self, table):
+        if table['id'].num_chunks > MAX_CHUNKS:
+            # unify_dictionaries: each fetched chunk has its own label dictionary
+            table = table.unify_dictionaries().combine_chunks()
+        self._table = table
+        if table.num_rows:
+            self._last_id = table['id'][-1].as_py()
+
+    def _refresh(self):
+        version = self.backend.data_version()
+        if self._table is not None and version is not None and version == self._version:
+            return
+        self._version = version
+
+        if self._table is None:
+            self._reload()
+            return
+
+        min_id, max_id = self.backend.id_bounds()
+        if max_id is None:
+            # Table emptied
+            self._set(self._table.slice(0, 0))
+            return
+        if max_id < self._last_id:
+            # Restored from an older snapshot: ids went backwards
+            self._reload()
+            return
+
+        table = self._table
+        if table.num_rows and min_id > table['id'][0].as_py():
+            # Retention removed old rows
+            table = table.filter(pc.greater_equal(table['id'], min_id))
+        if max_id > self._last_id:
+            new_rows = self.backend.after_arrow(self._last_id, limit=self.capacity)
+            if new_rows.num_rows >= self.capacity:
+                self._reload()
+                return
+            table = pa.concat_tables([table, new_rows.select(table.column_names)])
+            table = table.slice(max(0, table.num_rows - self.capacity))
+        self._set(table)
+
+    def get_table(self, limit=100):
+        """Latest `limit` rows sorted by timestamp, as an Arrow table"""
+        with self._lock:
+            self._refresh()
+            table = self._table
+        table = table.slice(max(0, table.num_rows - limit))
+        timestamps = table['timestamp'].to_numpy()
+        if len(timestamps) > 1 and (np.diff(timestamps) < np.timedelta64(0)).any():
+            # Rows arrive in id order; only out-of-order timestamps need a sort
+            table = table.sort_by('timestamp')
+        return table
+
+    def get(self, limit=100):
+        """Latest `limit` rows sorted by timestamp"""
+        return self.get_table(limit).to_pandas()
@@ -0,0 +1,377 @@
+# dashboard/reports.py
+"""
+Daily / weekly PDF reports built in the background and cached on disk
+
+A report covers one period and has several pages: summary, risk distribution,
+rollup table, prediction accuracy, alert log and small trend charts. The
+engine builds it in a worker thread; the file name carries the period and the
+range's data version (row count + max id), so asking again for an unchanged
+range is a file read, while new or deleted rows in the range trigger a rebuild.
+The current (still open) period is served from its last build and rebuilt at
+most every OPEN_PERIOD_REBUILD_SEC.
+
+    engine = ReportEngine(backend, REPORT_CACHE_DIR)
+    status = engine.request("daily", date(2025, 12, 11))   # never blocks
+    if status['state'] == 'ready':
+        pdf_bytes = status['path'].read_bytes()
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from fpdf import FPDF
+
+# period -> (days covered, rollup table bucket in minutes)
+PERIODS = {
+    "daily": (1, 60),
+    "weekly": (7, 1440),
+}
+
+# (actual column, prediction column, label, unit, chart color)
+PARAMETERS = [
+    ('temp', 'pred_temp', 'Temperature', '°C', (33, 150, 243)),
+    ('ph', 'pred_ph', 'pH', '', (156, 39, 176)),
+    ('do', 'pred_do', 'Dissolved Oxygen', 'mg/L', (0, 150, 136)),
+    ('turbidity', 'pred_turb', 'Turbidity', 'NTU', (121, 85, 72)),
+]
+
+RISK_COLORS = {"Safe": (76, 175, 80), "Warning": (255, 193, 7), "Danger": (244, 67, 54)}
+
+# Gateway predictions look this far ahead (compared with the actual value then)
+PREDICTION_HORIZON_H = 6
+
+# Alert log lists at most this many Danger episodes
+MAX_ALERTS = 40
+
+# A period that is still open is rebuilt at most this often (seconds)
+OPEN_PERIOD_REBUILD_SEC = 300
+
+
+def report_range(period, end_date):
+    """('YYYY-MM-DD 00:00:00', 'YYYY-MM-DD 23:59:59') covering the period ending on end_date"""
+    days, _ = PERIODS[period]
+    start = end_date - timedelta(days=days - 1)
+    return f"{start} 00:00:00", f"{end_date} 23:59:59"
+
+
+# ------------------ data ------------------
+def prediction_accuracy(hourly):
+    """MAE / RMSE of hourly mean predictions against the hourly mean actual value HORIZON hours later"""
+    rows = []
+    buckets = pd.to_datetime(hourly['bucket'])
+    for col, pred_col, label, unit, _ in PARAMETERS:
+        actual = pd.Series(hourly[f'{col}_mean'].to_numpy(), index=buckets)
+        predicted = pd.Series(hourly[f'{pred_col}_mean'].to_numpy(),
+                              index=buckets + pd.Timedelta(hours=PREDICTION_HORIZON_H))
+        pairs = pd.concat([actual, predicted], axis=1, join='inner').dropna()
+        if pairs.empty:
+            rows.append((label, 0, None, None))
+            continue
+        error = pairs[1] - pairs[0]
+        rows.append((label, len(pairs), float(error.abs().mean()), float(np.sqrt((error ** 2).mean()))))
+    return pd.DataFrame(rows, columns=['parameter', 'hours', 'mae', 'rmse'])
+
+
+def alert_log(df):
+    """One row per run of consecutive Danger readings"""
+    if df.empty:
+        return pd.DataFrame(columns=['start', 'end', 'readings', 'min_do', 'max_temp'])
+    status = df['status'].to_numpy()
+    run_id = np.concatenate(([0], np.cumsum(status[1:] != status[:-1])))
+    danger = df[status == 'Danger'].assign(run=run_id[status == 'Danger'])
+    return danger.groupby('run').agg(
+        start=('timestamp', 'first'), end=('timestamp', 'last'), readings=('timestamp', 'size'),
+        min_do=('do', 'min'), max_temp=('temp', 'max'),
+    ).reset_index(drop=True)
+
+
+def collect(backend, period, end_date):
+    """Everything a report shows, computed with a few range queries"""
+    start, end = report_range(period, end_date)
+    _, table_bucket = PERIODS[period]
+    horizon_start = (pd.Timestamp(start) - pd.Timedelta(hours=PREDICTION_HORIZON_H)).strftime("%Y-%m-%d %H:%M:%S")
+
+    hourly = backend.aggregates(horizon_start, end, bucket_minutes=60)
+    hourly['bucket'] = pd.to_datetime(hourly['bucket'])
+    accuracy = prediction_accuracy(hourly)
+    hourly = hourly[hourly['bucket'] >= pd.Timestamp(start)]
+    table = hourly if table_bucket == 60 else backend.aggregates(start, end, bucket_minutes=table_bucket)
+
+    raw = backend.range(start, end)[['timestamp', 'temp', 'ph', 'do', 'turbidity', 'status']]
+    risk = raw['status'].value_counts().reindex(list(RISK_COLORS), fill_value=0)
+
+    return {
+        'period': period, 'start': start, 'end': end,
+        'records': len(raw), 'summary': raw[['temp', 'ph', 'do', 'turbidity']].describe(),
+        'risk': risk, 'hourly': hourly, 'table': table,
+        'accuracy': accuracy, 'alerts': alert_log(raw),
+    }
+
+
+# ------------------ PDF ------------------
+def _fmt(value, digits=2):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "-"
+    return f"{value:.{digits}f}"
+
+
+class ReportPDF(FPDF):
+    def __init__(self, title):
+        super().__init__()
+        self.report_title = title
+        self.set_auto_page_break(True, margin=15)
+
+    def header(self):
+        self.set_font("Helvetica", "B", 10)
+        self.cell(0, 8, self.report_title, new_x="LMARGIN", new_y="NEXT")
+        self.ln(2)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Helvetica", "", 8)
+        self.cell(0, 8, f"Page {self.page_no()}", align="C")
+
+    def section(self, text):
+        self.set_font("Helvetica", "B", 13)
+        self.cell(0, 10, text, new_x="LMARGIN", new_y="NEXT")
+        self.set_font("Helvetica", "", 9)
+
+    def grid(self, headings, rows, col_widths=None):
+        with self.table(col_widths=col_widths, text_align="RIGHT", line_height=5) as table:
+            for row_values in [headings] + rows:
+                row = table.row()
+                for value in row_values:
+                    row.cell(str(value))
+        self.ln(4)
+
+    def sparkline(self, buckets, low, mean, high, label, color, height=38):
+        """Min/max band + mean line of one parameter, drawn with PDF primitives"""
+        x0, width = self.l_margin, self.epw
+        if self.get_y() + height + 12 > self.h - self.b_margin:
+            self.add_page()
+        self.set_font("Helvetica", "B", 9)
+        self.cell(0, 6, label, new_x="LMARGIN", new_y="NEXT")
+        y0 = self.get_y()
+        self.set_draw_color(200, 200, 200)
+        self.rect(x0, y0, width, height)
+
+        valid = ~np.isnan(mean)
+        if valid.sum() >= 2:
+            t = buckets.astype("int64").to_numpy()[valid].astype(float)
+            low, mean, high = low[valid], mean[valid], high[valid]
+            y_min, y_max = np.nanmin(low), np.nanmax(high)
+            span_t = (t[-1] - t[0]) or 1.0
+            span_y = (y_max - y_min) or 1.0
+            px = x0 + (t - t[0]) / span_t * width
+            to_y = lambda v: y0 + height - (v - y_min) / span_y * height  # noqa: E731
+
+            band = list(zip(px, to_y(high))) + list(zip(px[::-1], to_y(low)[::-1]))
+            self.set_fill_color(*[int(c + (255 - c) * 0.75) for c in color])
+            self.polygon(band, style="F")
+            self.set_draw_color(*color)
+            self.set_line_width(0.4)
+            self.polyline(list(zip(px, to_y(mean))))
+            self.set_line_width(0.2)
+            self.set_font("Helvetica", "", 7)
+            self.text(x0 + 1, y0 + 3, _fmt(y_max))
+            self.text(x0 + 1, y0 + height - 1, _fmt(y_min))
+        self.set_y(y0 + height + 4)
+
+
+def render_pdf(data):
+    """Multi-page report bytes from collect() output"""
+    title = f"Tilapia Water Quality - {data['period'].title()} Report ({data['start'][:10]} to {data['end'][:10]})"
+    pdf = ReportPDF(title)
+
+    # Page 1: summary + risk distribution
+    pdf.add_page()
+    pdf.section("Summary")
+    pdf.cell(0, 6, f"Records: {data['records']}    Generated: {datetime.now():%Y-%m-%d %H:%M}",
+             new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(2)
+    summary = data['summary']
+    pdf.grid(["", *[f"{label} {unit}".strip() for _, _, label, unit, _ in PARAMETERS]],
+             [[stat, *[_fmt(summary.loc[stat, col]) if stat in summary.index else "-"
+                       for col, *_ in PARAMETERS]]
+              for stat in ("mean", "min", "max", "std")])
+
+    pdf.section("Risk distribution")
+    total = int(data['risk'].sum()) or 1
+    for status, count in data['risk'].items():
+        share = count / total
+        pdf.cell(25, 6, status)
+        pdf.set_fill_color(*RISK_COLORS[status])
+        pdf.rect(pdf.get_x(), pdf.get_y() + 1, max(share * 120, 0.1), 4, style="F")
+        pdf.set_x(pdf.get_x() + 125)
+        pdf.cell(0, 6, f"{count} ({share:.1%})", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+
+    pdf.section(f"Prediction accuracy ({PREDICTION_HORIZON_H}h ahead, hourly means)")
+    pdf.grid(["Parameter", "Hours", "MAE", "RMSE"],
+             [[label, hours, _fmt(mae, 3), _fmt(rmse, 3)]
+              for label, hours, mae, rmse in data['accuracy'].itertuples(index=False)])
+
+    # Trend charts
+    pdf.add_page()
+    pdf.section("Hourly trends (mean line, min/max band)")
+    hourly = data['hourly']
+    for col, _, label, unit, color in PARAMETERS:
+        pdf.sparkline(hourly['bucket'], hourly[f'{col}_min'].to_numpy(float),
+                      hourly[f'{col}_mean'].to_numpy(float), hourly[f'{col}_max'].to_numpy(float),
+                      f"{label} {unit}".strip(), color)
+
+    # Rollup table
+    pdf.add_page()
+    bucket_label = "Hourly" if PERIODS[data['period']][1] == 60 else "Daily"
+    pdf.section(f"{bucket_label} rollup")
+    pdf.grid(["Bucket", "Rows", "Temp", "T min", "T max", "pH", "DO", "DO min", "Turb", "Danger"],
+             [[str(r.bucket)[:16], int(r.count), _fmt(r.temp_mean), _fmt(r.temp_min), _fmt(r.temp_max),
+               _fmt(r.ph_mean), _fmt(r.do_mean), _fmt(r.do_min), _fmt(r.turbidity_mean), int(r.danger_count)]
+              for r in data['table'].itertuples(index=False)],
+             col_widths=(34, 14, 16, 16, 16, 14, 14, 16, 16, 16))
+
+    # Alert log
+    pdf.section("Alert log (Danger episodes)")
+    alerts = data['alerts']
+    if alerts.empty:
+        pdf.cell(0, 6, "No Danger readings in this period.", new_x="LMARGIN", new_y="NEXT")
+    else:
+        pdf.grid(["Start", "End", "Readings", "Min DO", "Max temp"],
+                 [[str(a.start)[:19], str(a.end)[:19], a.readings, _fmt(a.min_do), _fmt(a.max_temp)]
+                  for a in alerts.head(MAX_ALERTS).itertuples(index=False)])
+        if len(alerts) > MAX_ALERTS:
+            pdf.cell(0, 6, f"... and {len(alerts) - MAX_ALERTS} more episodes", new_x="LMARGIN", new_y="NEXT")
+
+    return bytes(pdf.output())
+
+
+def build_report(backend, period, end_date):
+    return render_pdf(collect(backend, period, end_date))
+
+
+# ------------------ engine ------------------
+class ReportEngine:
+    """
+    Builds reports in one background thread and keeps the newest `keep` PDFs on disk.
+
+    At most one build per (period, end_date) is queued or running. A period
+    that has not ended yet changes with every new reading, so it is served
+    from its latest finished build and rebuilt at most once per
+    `rebuild_interval` seconds instead of chasing the live data version.
+    """
+
+    def __init__(self, backend, cache_dir, keep=20, rebuild_interval=OPEN_PERIOD_REBUILD_SEC):
+        self.backend = backend
+        self.cache_dir = Path(cache_dir)
+        self.keep = keep
+        self.rebuild_interval = rebuild_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+        self._jobs = {}      # (period, end_date) -> Future of the build in flight
+        self._errors = {}    # (period, end_date) -> error of the last failed build
+        self._lock = threading.Lock()
+
+    def path_for(self, period, end_date):
+        """Cache file for the range as it is now (changes when its rows change)"""
+        count, max_id = self.backend.range_version(*report_range(period, end_date))
+        return self.cache_dir / f"{period}_{end_date}_{count}_{max_id or 0}.pdf"
+
+    def latest_build(self, period, end_date):
+        """Newest finished PDF of the period (any data version), None if never built"""
+        builds = sorted(self.cache_dir.glob(f"{period}_{end_date}_*.pdf"),
+                        key=lambda p: p.stat().st_mtime, reverse=True)
+        return builds[0] if builds else None
+
+    def request(self, period, end_date):
+        """
+        Ready report or start building it. Returns {'state': 'ready' | 'running'
+        | 'failed', 'path': Path or None, 'error': str or None}
+        """
+        key = (period, end_date)
+        is_open = datetime.strptime(report_range(period, end_date)[1], "%Y-%m-%d %H:%M:%S") >= datetime.now()
+        latest = self.latest_build(period, end_date)
+        if is_open and latest is not None:
+            # Serve the last build; refresh it in the background once it is old enough
+            if time.time() - latest.stat().st_mtime >= self.rebuild_interval:
+                self._submit(key, self.path_for(period, end_date))
+            return {'state': 'ready', 'path': latest, 'error': None}
+
+        path = self.path_for(period, end_date)
+        if path.exists():
+            return {'state': 'ready', 'path': path, 'error': None}
+
+        with self._lock:
+            error = self._errors.pop(key, None)
+        if error is not None:
+            return {'state': 'failed', 'path': None, 'error': error}
+        self._submit(key, path)
+        return {'state': 'running', 'path': None, 'error': None}
+
+    def _submit(self, key, path):
+        """Queue a build unless one for the same period is already queued or running"""
+        with self._lock:
+            if key in self._jobs:
+                return
+            job = self._jobs[key] = self._executor.submit(self._build, *key, path)
+        job.add_done_callback(lambda done: self._finished(key, done))
+
+    def _finished(self, key, job):
+        with self._lock:
+            self._jobs.pop(key, None)
+            error = job.exception()
+            if error is not None:
+                self._errors[key] = str(error)
+
+    def _build(self, period, end_date, path):
+        pdf_bytes = build_report(self.backend, period, end_date)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(pdf_bytes)
+        tmp.replace(path)
+        self._prune()
+
+    def _prune(self):
+        reports = sorted(self.cache_dir.glob("*.pdf"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in reports[self.keep:]:
+            old.unlink(missing_ok=True)
+
+
+def report_panel(engine, last_day, key="report"):
+    """Streamlit controls: pick a period, poll the background build, download when ready"""
+    running_key = f"{key}_running"
+
+    # Polls once a second only while a build is running
+    @st.fragment(run_every=1 if st.session_state.get(running_key) else None)
+    def panel():
+        col1, col2 = st.columns(2)
+        with col1:
+            period = st.selectbox("Report period", list(PERIODS), key=f"{key}_period")
+        with col2:
+            end_date = st.date_input("Period ending", value=last_day, key=f"{key}_end")
+
+        status = engine.request(period, end_date)
+        running = status['state'] == 'running'
+        if running != st.session_state.get(running_key, False):
+            # Re-create the fragment with / without its polling timer
+            st.session_state[running_key] = running
+            st.rerun()
+
+        if status['state'] == 'ready':
+            st.download_button(
+                "📥 Download PDF Report",
+                lambda: status['path'].read_bytes(),
+                status['path'].name,
+                "application/pdf",
+                key=f"{key}_download"
+            )
+        elif status['state'] == 'failed':
+            st.error(f"❌ Report failed: {status['error']}")
+        else:
+            st.info("⏳ Building report in the background...")
+
+    panel()
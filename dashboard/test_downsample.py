@@ -0,0 +1,75 @@
+# dashboard/test_downsample.py
+"""
+Chart downsampling: LTTB against a straightforward reference implementation,
+point budget, endpoints and extremes for lttb() / minmax()
+"""
+
+import numpy as np
+import pandas as pd
+
+from downsample import downsample, lttb, minmax, status_changes
+
+
+def reference_lttb(x, y, n_out):
+    """Textbook LTTB, one bucket at a time"""
+    n = len(y)
+    every = (n - 2) / (n_out - 2)
+    out, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_lo, nxt_hi = hi, min(int((i + 2) * every) + 1, n)
+        if i == n_out - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out.append(a)
+    return np.array(out + [n - 1])
+
+
+def test_downsample():
+    print("=" * 60)
+    print("🧪 Downsampling: lttb / minmax")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    n, n_out = 10_000, 300
+    x = pd.date_range("2025-01-01", periods=n, freq="min").to_numpy()
+    y = np.cumsum(rng.normal(size=n))
+    # One-sample spikes that an averaging reducer would flatten
+    y[4321] += 80
+    y[777] -= 80
+
+    for method in (lttb, minmax):
+        idx = method(x, y, n_out)
+        assert len(idx) <= n_out, (method.__name__, len(idx))
+        assert idx[0] == 0 and idx[-1] == n - 1
+        assert (np.diff(idx) > 0).all()
+        assert int(np.argmax(y)) in idx and int(np.argmin(y)) in idx
+        print(f"   ✅ {method.__name__}: {len(idx)} points, endpoints and spikes kept")
+
+    x_float = x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    for size in (n_out, 1001):
+        assert np.array_equal(lttb(x, y, size), reference_lttb(x_float, y, size))
+    print("   ✅ lttb matches the reference implementation")
+
+    # minmax keeps the global extremes whatever the data
+    noise = rng.normal(size=n)
+    idx = minmax(x, noise, 101)
+    assert len(idx) <= 101 and {int(np.argmin(noise)), int(np.argmax(noise))} <= set(idx)
+
+    # Small inputs pass through; NaN values are dropped before reducing
+    assert np.array_equal(lttb(x[:50], y[:50], n_out), np.arange(50))
+    y_nan = y.copy()
+    y_nan[::7] = np.nan
+    y_nan[-1] = np.nan
+    xs, ys = downsample(x, y_nan, n_out)
+    assert len(ys) <= n_out and not np.isnan(ys).any() and xs[-1] == x[-2]
+
+    status = pd.DataFrame({"status": ["Safe"] * 5 + ["Danger"] * 3 + ["Safe"] * 4})
+    assert status_changes(status).index.tolist() == [0, 4, 5, 7, 8, 11]
+
+
+if __name__ == "__main__":
+    test_downsample()
@@ -0,0 +1,118 @@
+# dashboard/test_reports.py
+"""
+ReportEngine scheduling: cache key per data version, one build per period
+in flight, open-period rebuild throttle, failures reported once. PDFs are
+replaced by a stub build so only the engine is exercised.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+import reports
+from reports import ReportEngine
+
+
+class FakeBackend:
+    """Only what the engine asks the backend: the range's data version"""
+
+    def __init__(self):
+        self.version = (10, 10)
+
+    def range_version(self, start_time, end_time):
+        return self.version
+
+
+class StubBuild:
+    """Stands in for build_report(): counts builds, can hold one open or fail"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = False
+
+    def __call__(self, backend, period, end_date):
+        self.calls.append((period, end_date))
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("no data")
+        return b"%PDF-stub"
+
+
+def settle(engine):
+    """Wait until the queued builds (and their done callbacks) have run"""
+    engine._executor.submit(lambda: None).result(5)
+
+
+def test_reports():
+    print("=" * 60)
+    print("🧪 ReportEngine: cache key, dedupe, rebuild throttle")
+    print("=" * 60)
+
+    original_build = reports.build_report
+    build = reports.build_report = StubBuild()
+    backend = FakeBackend()
+    closed = date(2025, 1, 1)
+    today = date.today()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = ReportEngine(backend, tmp, rebuild_interval=60)
+
+            # Closed period: repeated requests while the build runs queue nothing more
+            build.gate.clear()
+            assert engine.request("daily", closed)['state'] == 'running'
+            assert engine.request("daily", closed)['state'] == 'running'
+            build.gate.set()
+            settle(engine)
+            assert len(build.calls) == 1 and not engine._jobs
+            status = engine.request("daily", closed)
+            assert status['state'] == 'ready' and status['path'].name == "daily_2025-01-01_10_10.pdf"
+            assert engine.request("daily", closed)['path'] == status['path'] and len(build.calls) == 1
+            print("   ✅ Unchanged range: one build, then served from the cache")
+
+            # New rows in the range change the cache key -> one rebuild
+            backend.version = (11, 12)
+            assert engine.request("daily", closed)['state'] == 'running'
+            settle(engine)
+            assert engine.request("daily", closed)['path'].name == "daily_2025-01-01_11_12.pdf"
+            assert len(build.calls) == 2
+
+            # Open period: the last build is served; rebuilt once it is older than rebuild_interval
+            assert engine.request("daily", today)['state'] == 'running'
+            settle(engine)
+            served = engine.request("daily", today)['path']
+            backend.version = (12, 13)
+            for _ in range(3):
+                assert engine.request("daily", today) == {'state': 'ready', 'path': served, 'error': None}
+            assert len(build.calls) == 3
+            old = time.time() - 120
+            os.utime(served, (old, old))
+            build.gate.clear()
+            for _ in range(3):
+                assert engine.request("daily", today)['path'] == served
+            build.gate.set()
+            settle(engine)
+            assert len(build.calls) == 4 and not engine._jobs
+            assert engine.latest_build("daily", today).name == f"daily_{today}_12_13.pdf"
+            print("   ✅ Open period: served from the last build, one throttled rebuild")
+
+            # A failed build is reported once, then the next request retries
+            build.fail = True
+            engine.request("weekly", closed)
+            settle(engine)
+            status = engine.request("weekly", closed)
+            assert status['state'] == 'failed' and status['error'] == "no data"
+            assert engine.request("weekly", closed)['state'] == 'running'
+            settle(engine)
+            assert len(build.calls) == 6
+            engine._executor.shutdown()
+            print("   ✅ Failure reported once, then retried")
+    finally:
+        reports.build_report = original_build
+
+
+if __name__ == "__main__":
+    test_reports()
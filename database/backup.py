@@ -0,0 +1,85 @@
+# database/backup.py
+"""
+Online hot backup & snapshots for the gateway database
+
+Snapshots are taken with SQLite's online backup API in small page steps,
+so the gateway can keep writing while a snapshot runs.
+
+Usage:
+    python backup.py snapshot [--keep 7]      # verified snapshot + rotation
+    python backup.py list
+    python backup.py verify [path] [--full]   # live DB if no path
+    python backup.py restore <snapshot>       # stop the gateway first
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from db_config import (
+    init_database, create_snapshot, list_snapshots, verify_database, restore_snapshot,
+    SNAPSHOT_DIR, SNAPSHOT_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+)
+
+
+def cmd_snapshot(args):
+    print(f"📸 Creating snapshot in {args.dir}...")
+    result = create_snapshot(args.dir, keep=args.keep, pages=args.pages, sleep=args.sleep)
+    print(f"   ✅ {result['path']}")
+    print(f"   {result['pages']} pages in {result['steps']} steps, {result['seconds']}s "
+          f"({result['restarts']} restarts)")
+    for name in result['removed']:
+        print(f"   🗑️  Rotated out {name}")
+
+
+def cmd_list(args):
+    snapshots = list_snapshots(args.dir)
+    if not snapshots:
+        print("No snapshots found.")
+    for path in snapshots:
+        print(f"   {path.name}  ({path.stat().st_size / (1024 * 1024):.2f} MB)")
+
+
+def cmd_verify(args):
+    target = args.path or "live database"
+    ok, problems = verify_database(args.path, full=args.full)
+    if ok:
+        print(f"✅ {target}: ok")
+    else:
+        print(f"❌ {target}:")
+        for problem in problems[:20]:
+            print(f"   {problem}")
+        sys.exit(1)
+
+
+def cmd_restore(args):
+    print(f"♻️  Restoring from {args.path}...")
+    result = restore_snapshot(args.path, pages=args.pages, sleep=args.sleep)
+    print(f"   ✅ Restored {result['pages']} pages in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online backup & snapshots")
+    parser.add_argument("--dir", type=Path, default=SNAPSHOT_DIR, help="Snapshot directory")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="Pages copied per step")
+    parser.add_argument("--sleep", type=float, default=BACKUP_STEP_SLEEP, help="Seconds between steps")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("snapshot", help="Create a verified snapshot and rotate old ones")
+    p.add_argument("--keep", type=int, default=SNAPSHOT_KEEP, help="Snapshots to keep (0 = all)")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("list", help="List snapshots")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("verify", help="Integrity-check a database file")
+    p.add_argument("path", nargs="?", default=None)
+    p.add_argument("--full", action="store_true", help="integrity_check instead of quick_check")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("restore", help="Restore the live database from a snapshot")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args()
+    init_database()
+    args.func(args)
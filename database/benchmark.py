@@ -1,13 +1,24 @@
 # database/benchmark.py
 """
 Benchmark: CSV vs SQLite performance comparison
+
+Usage:
+    python benchmark.py                                  # full suite
+    python benchmark.py --backends sqlite duckdb --rows 50000
 """
 
+import argparse
 import time
 import pandas as pd
 import sqlite3
+import shutil
+import tempfile
+import threading
 from pathlib import Path
 from datetime import datetime
+import db_config
+from db_config import backup_database, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+from storage import BACKENDS, get_backend
 
 # Paths
 CSV_PATH = Path(__file__).parent.parent / "dashboard" / "data_log.csv"
@@ -132,6 +143,151 @@ def benchmark_query_sqlite():
     return elapsed
 
 
+def _writer_latencies(db_file, stop_event, latencies):
+    """Insert one row per commit (like the gateway) and record each latency"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        conn.execute("""
+            INSERT INTO sensor_logs (timestamp, temp, ph, do, turbidity, status)
+            VALUES (?, 30.0, 7.0, 6.0, 15.0, 'Safe')
+        """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+        conn.commit()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.005)
+    conn.close()
+
+
+def _latency_summary(latencies):
+    s = pd.Series(latencies) * 1000
+    return f"writes={len(s)} p50={s.quantile(0.5):.2f}ms p99={s.quantile(0.99):.2f}ms max={s.max():.2f}ms"
+
+
+def benchmark_backup(pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """Benchmark online backup time and writer stall while it runs"""
+    print(f"\n📸 Testing online backup (pages/step={pages}, sleep={sleep}s)...")
+    
+    if not DB_PATH.exists():
+        print("   ⚠️  Database not found")
+        return None
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Work on a copy so the benchmark writer never touches the real data
+        src = Path(tmp) / "bench_source.db"
+        shutil.copy(DB_PATH, src)
+        
+        stop = threading.Event()
+        baseline, during = [], []
+        
+        writer = threading.Thread(target=_writer_latencies, args=(str(src), stop, baseline))
+        writer.start()
+        time.sleep(1.0)
+        stop.set()
+        writer.join()
+        
+        stop.clear()
+        writer = threading.Thread(target=_writer_latencies, args=(str(src), stop, during))
+        writer.start()
+        stats = backup_database(Path(tmp) / "bench_copy.db", pages=pages, sleep=sleep, source_path=src)
+        stop.set()
+        writer.join()
+    
+    print(f"   Backup: {stats['pages']} pages, {stats['steps']} steps, "
+          f"{stats['restarts']} restarts, {stats['seconds']:.3f}s")
+    print(f"   Writer (idle):         {_latency_summary(baseline)}")
+    print(f"   Writer (during backup): {_latency_summary(during)}")
+    return stats['seconds']
+
+
+def _synthetic_rows(num_records, start=datetime(2024, 1, 1)):
+    """Gateway-shaped rows, one per minute"""
+    statuses = ['Safe', 'Safe', 'Safe', 'Warning', 'Danger']
+    return [{
+        'timestamp': (start + pd.Timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+        'temp': 28.0 + (i % 50) * 0.1,
+        'ph': 7.0 + (i % 10) * 0.05,
+        'do': 6.0 - (i % 20) * 0.1,
+        'turbidity': 15.0 + (i % 30) * 0.5,
+        'pred_temp': 28.5, 'pred_ph': 7.1, 'pred_do': 5.9, 'pred_turb': 16.0,
+        'sensor_risk': statuses[i % 5], 'pred_risk': 'Safe', 'status': statuses[i % 5]
+    } for i in range(num_records)]
+
+
+def _timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def benchmark_backend(name, num_records=20000, batch_size=500):
+    """Run the same workload against one storage backend in a temp dir"""
+    print(f"\n🗄️  Testing {name} backend ({num_records} records)...")
+    
+    rows = _synthetic_rows(num_records)
+    last_day_start = rows[-1]['timestamp'][:10] + " 00:00:00"
+    results = {}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_path = db_config.DB_PATH
+        try:
+            if name == "sqlite":
+                db_config.DB_PATH = Path(tmp) / "bench.db"
+                backend = get_backend(name)
+            else:
+                backend = get_backend(name, path=Path(tmp) / f"bench.{name}")
+            backend.init()
+            
+            results['batch insert'], _ = _timed(lambda: [
+                backend.insert_batch(rows[i:i + batch_size]) for i in range(0, len(rows), batch_size)
+            ])
+            single = _synthetic_rows(200, start=datetime(2023, 12, 1))
+            elapsed, _ = _timed(lambda: [backend.insert_batch([row]) for row in single])
+            results['single insert (per row)'] = elapsed / len(single)
+            results['latest(100)'], _ = _timed(lambda: backend.latest(100), repeat=20)
+            results['range(1 day)'], df = _timed(lambda: backend.range(last_day_start, rows[-1]['timestamp']), repeat=5)
+            results['aggregates(1h)'], _ = _timed(lambda: backend.aggregates(bucket_minutes=60), repeat=5)
+            results['stats'], _ = _timed(backend.stats, repeat=5)
+            
+            def retention_loop():
+                deleted = 0
+                while True:
+                    step = backend.retention(1, batch_size)
+                    deleted += step
+                    if step < batch_size:
+                        return deleted
+            results['retention (all)'], deleted = _timed(retention_loop)
+            backend.close()
+        finally:
+            db_config.DB_PATH = saved_path
+    
+    print(f"   Batch insert: {results['batch insert']:.3f}s "
+          f"({num_records / results['batch insert']:,.0f} records/sec)")
+    print(f"   Single insert: {results['single insert (per row)'] * 1000:.2f} ms/row")
+    print(f"   latest(100): {results['latest(100)'] * 1000:.2f} ms")
+    print(f"   range(1 day): {results['range(1 day)'] * 1000:.2f} ms ({len(df)} rows)")
+    print(f"   aggregates(1h): {results['aggregates(1h)'] * 1000:.2f} ms")
+    print(f"   stats: {results['stats'] * 1000:.2f} ms")
+    print(f"   retention: {results['retention (all)']:.3f}s ({deleted} rows)")
+    return results
+
+
+def benchmark_backends(names=None, num_records=20000):
+    """Compare storage backends on the same workload"""
+    results = {}
+    for name in names or BACKENDS:
+        try:
+            results[name] = benchmark_backend(name, num_records)
+        except ImportError as e:
+            print(f"   ⚠️  Skipping {name}: {e}")
+    
+    if len(results) > 1:
+        table = pd.DataFrame(results) * 1000
+        print("\n   Summary (ms):")
+        print(table.round(2).to_string().replace("\n", "\n   ").join(["   ", ""]))
+    return results
+
+
 def run_benchmark():
     """Run all benchmarks"""
     print("=" * 60)
@@ -170,6 +326,22 @@ def run_benchmark():
     benchmark_query_sqlite()
     print("\n   ℹ️  CSV requires loading entire file to filter")
     
+    # Backup benchmark
+    print("\n" + "─" * 60)
+    print("📊 ONLINE BACKUP (writer stall)")
+    print("─" * 60)
+    
+    benchmark_backup()
+    benchmark_backup(pages=-1, sleep=0)
+    print("\n   ℹ️  pages=-1 copies everything in one step (shown for comparison)")
+    
+    # Storage backends
+    print("\n" + "─" * 60)
+    print("📊 STORAGE BACKENDS (same workload)")
+    print("─" * 60)
+    
+    benchmark_backends()
+    
     # Summary
     print("\n" + "=" * 60)
     print("📈 SUMMARY")
@@ -191,4 +363,13 @@ def run_benchmark():
 
 
 if __name__ == "__main__":
-    run_benchmark()
+    parser = argparse.ArgumentParser(description="Storage benchmarks")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS),
+                        help="Only compare these storage backends")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows for the backend workload")
+    args = parser.parse_args()
+    
+    if args.backends:
+        benchmark_backends(args.backends, args.rows)
+    else:
+        run_benchmark()
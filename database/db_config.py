@@ -4,10 +4,16 @@ SQLite Database Configuration & Helper Functions
 """
 
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 import threading
+import csv
+import gzip
+import io
+import json
+import time
 
 # Database path
 DB_DIR = Path(__file__).parent
@@ -16,6 +22,76 @@ DB_PATH = DB_DIR / "iot_data.db"
 # Thread-safe lock for concurrent access
 db_lock = threading.Lock()
 
+# Retention / maintenance settings (small batches keep each write lock short)
+MAINTENANCE_DELETE_BATCH = 500
+MAINTENANCE_VACUUM_PAGES = 256
+
+# Online backup settings (pages copied per step, pause between steps)
+BACKUP_PAGES_PER_STEP = 64
+BACKUP_STEP_SLEEP = 0.005
+SNAPSHOT_DIR = DB_DIR / "snapshots"
+SNAPSHOT_KEEP = 7
+
+# Streaming export settings
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ("csv", "csv.gz", "ndjson", "parquet")
+EXPORT_MIME_TYPES = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# Columns written by the gateway (order used by batch inserts)
+SENSOR_COLUMNS = (
+    "timestamp", "temp", "ph", "do", "turbidity",
+    "pred_temp", "pred_ph", "pred_do", "pred_turb",
+    "sensor_risk", "pred_risk", "status", "device_id"
+)
+
+# Readings without a device id (single-pond setups, old CSV imports)
+DEFAULT_DEVICE_ID = "default"
+
+# Hourly per-device / per-status row counts, kept in step with sensor_logs by
+# triggers so History can count a year of rows without scanning it
+ROLLUP_TABLE = "sensor_rollup_hourly"
+HOUR_BUCKET_SQL = "COALESCE(strftime('%Y-%m-%d %H:00:00', {ts}), substr({ts}, 1, 13) || ':00:00')"
+
+# Latest reading per device (one row each, UPSERTed by a trigger on every insert)
+# and one liveness row per gateway, so status pages never scan sensor_logs
+DEVICE_LATEST_TABLE = "device_latest"
+HEARTBEAT_TABLE = "gateway_heartbeat"
+# Weight of the newest interval in the per-device message-rate moving average
+RATE_SMOOTHING = 0.2
+# created_at defaults to CURRENT_TIMESTAMP (UTC); received_at is local time like
+# the heartbeat and the dashboard clock
+RECEIVED_AT_SQL = "datetime(COALESCE({ts}, CURRENT_TIMESTAMP), 'localtime')"
+
+# Multi-horizon forecasts, one row per reading keyed by its sensor_logs id: the
+# values are a float32 blob [target][horizon] in FORECAST_TARGETS order
+FORECAST_TABLE = "forecast_horizons"
+FORECAST_TARGETS = ("Temperature", "pH", "Dissolved_Oxygen", "Turbidity")
+FORECAST_COLUMNS = ("id", "device_id", "timestamp", "horizons", "forecast", "eta_hours", "eta_param")
+FORECAST_INSERT_SQL = f"""
+    INSERT OR REPLACE INTO {FORECAST_TABLE} ({", ".join(FORECAST_COLUMNS)})
+    VALUES ({", ".join("?" for _ in FORECAST_COLUMNS)})
+"""
+
+# Columns the History view can filter by value range
+HISTORY_VALUE_COLUMNS = ("temp", "ph", "do", "turbidity")
+
+# Columns a backtest re-scores (and may write back by id)
+RESCORE_COLUMNS = ("pred_temp", "pred_ph", "pred_do", "pred_turb", "sensor_risk", "pred_risk", "status")
+
+# Secondary indexes on sensor_logs (can be dropped and rebuilt around bulk loads)
+INDEX_DEFINITIONS = {
+    "idx_timestamp": "CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_logs(timestamp DESC)",
+    "idx_status": "CREATE INDEX IF NOT EXISTS idx_status ON sensor_logs(status)",
+    "idx_created_at": "CREATE INDEX IF NOT EXISTS idx_created_at ON sensor_logs(created_at DESC)",
+    "idx_device_timestamp": "CREATE INDEX IF NOT EXISTS idx_device_timestamp ON sensor_logs(device_id, timestamp DESC)",
+}
+
 
 def get_connection():
     """Get database connection"""
@@ -29,6 +105,12 @@ def init_database():
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Only takes effect for a new file; existing files are converted once
+    # with enable_incremental_vacuum()
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL lets dashboards read while the gateway writes
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
     # Create sensor_logs table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS sensor_logs (
@@ -45,32 +127,432 @@ def init_database():
             sensor_risk TEXT,
             pred_risk TEXT,
             status TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            device_id TEXT DEFAULT 'default'
         )
     """)
     
-    # Create indexes for faster queries
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_timestamp 
-        ON sensor_logs(timestamp DESC)
-    """)
+    # Databases created before device_id existed
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(sensor_logs)")}
+    if "device_id" not in columns:
+        cursor.execute("ALTER TABLE sensor_logs ADD COLUMN device_id TEXT DEFAULT 'default'")
     
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_status 
-        ON sensor_logs(status)
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_created_at 
-        ON sensor_logs(created_at DESC)
-    """)
+    # Create indexes for faster queries
+    create_indexes(conn)
     
     conn.commit()
+    init_rollup(conn)
+    init_device_latest(conn)
+    init_forecasts(conn)
     conn.close()
     
     print(f"✅ Database initialized at: {DB_PATH}")
 
 
+def create_indexes(conn):
+    """Create (or rebuild after a bulk load) the sensor_logs indexes"""
+    for sql in INDEX_DEFINITIONS.values():
+        conn.execute(sql)
+
+
+def drop_indexes(conn):
+    """Drop sensor_logs indexes so a bulk load only writes the table b-tree"""
+    for name in INDEX_DEFINITIONS:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _rollup_upsert(prefix, delta):
+    """Trigger statement adding delta to the bucket of the NEW / OLD row"""
+    return f"""
+        INSERT INTO {ROLLUP_TABLE} (bucket, device_id, status, count)
+        VALUES ({HOUR_BUCKET_SQL.format(ts=prefix + ".timestamp")},
+                COALESCE({prefix}.device_id, '{DEFAULT_DEVICE_ID}'), COALESCE({prefix}.status, ''), {delta})
+        ON CONFLICT(bucket, device_id, status) DO UPDATE SET count = count + ({delta});
+    """
+
+
+def init_rollup(conn):
+    """
+    Create the hourly rollup table and its triggers, back-filling it from
+    sensor_logs the first time (one transaction, so no row is missed or
+    counted twice while the gateway keeps writing)
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_TABLE,)
+        ).fetchone()
+        if not exists:
+            conn.execute(f"""
+                CREATE TABLE {ROLLUP_TABLE} (
+                    bucket TEXT NOT NULL,
+                    device_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, device_id, status)
+                ) WITHOUT ROWID
+            """)
+            _fill_rollup(conn)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_rollup_insert AFTER INSERT ON sensor_logs BEGIN
+                {_rollup_upsert("NEW", 1)}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_rollup_delete AFTER DELETE ON sensor_logs BEGIN
+                {_rollup_upsert("OLD", -1)}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_rollup_update
+            AFTER UPDATE OF timestamp, device_id, status ON sensor_logs BEGIN
+                {_rollup_upsert("OLD", -1)}
+                {_rollup_upsert("NEW", 1)}
+            END
+        """)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _fill_rollup(conn):
+    conn.execute(f"""
+        INSERT INTO {ROLLUP_TABLE} (bucket, device_id, status, count)
+        SELECT {HOUR_BUCKET_SQL.format(ts="timestamp")} AS b,
+               COALESCE(device_id, '{DEFAULT_DEVICE_ID}') AS d, COALESCE(status, '') AS s, COUNT(*)
+        FROM sensor_logs
+        GROUP BY b, d, s
+    """)
+
+
+def rebuild_rollup():
+    """Recount the rollup from sensor_logs (repair tool, e.g. after editing the file by hand)"""
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.execute(f"DELETE FROM {ROLLUP_TABLE}")
+                _fill_rollup(conn)
+        finally:
+            conn.close()
+
+
+def next_avg_interval(avg_interval_s, message_count, interval):
+    """
+    avg_interval_s after one more reading, as in the trigger's upsert (for
+    backends without triggers); message_count and interval (s) before / since the stored one
+    """
+    if interval is None or interval <= 0:
+        if avg_interval_s is None or message_count <= 1:
+            return None
+        return avg_interval_s * (message_count - 1) / message_count
+    if avg_interval_s is None:
+        return interval
+    return (1 - RATE_SMOOTHING) * avg_interval_s + RATE_SMOOTHING * interval
+
+
+def _device_latest_upsert():
+    reading = [col for col in SENSOR_COLUMNS if col != "device_id"]
+    # Late (back-filled) readings are counted but do not replace the latest one
+    newer = f"excluded.timestamp >= {DEVICE_LATEST_TABLE}.timestamp"
+    # Seconds since the device's previous reading (reading time, so batched inserts count too)
+    interval = f"((julianday(excluded.timestamp) - julianday({DEVICE_LATEST_TABLE}.timestamp)) * 86400.0)"
+    # A late / same-time reading adds a message without widening the span: the
+    # mean interval of the rebuild (span / (n - 1)) becomes span / n (Python twin: next_avg_interval)
+    avg_interval = f"""CASE
+        WHEN {interval} IS NULL OR {interval} <= 0 THEN avg_interval_s * NULLIF(message_count - 1.0, 0) / message_count
+        WHEN avg_interval_s IS NULL THEN {interval}
+        ELSE {1 - RATE_SMOOTHING} * avg_interval_s + {RATE_SMOOTHING} * {interval}
+    END"""
+    return f"""
+        INSERT INTO {DEVICE_LATEST_TABLE} (
+            device_id, id, {", ".join(reading)}, received_at, message_count
+        ) VALUES (
+            COALESCE(NEW.device_id, '{DEFAULT_DEVICE_ID}'), NEW.id,
+            {", ".join("NEW." + col for col in reading)},
+            {RECEIVED_AT_SQL.format(ts="NEW.created_at")}, 1
+        )
+        ON CONFLICT(device_id) DO UPDATE SET
+            {", ".join(f"{col} = CASE WHEN {newer} THEN excluded.{col} ELSE {col} END" for col in ["id", *reading])},
+            received_at = excluded.received_at,
+            message_count = message_count + 1,
+            avg_interval_s = {avg_interval},
+            msg_rate_per_min = 60.0 / NULLIF({avg_interval}, 0);
+    """
+
+
+def init_device_latest(conn):
+    """
+    Create device_latest (+ insert trigger) and gateway_heartbeat, filling
+    device_latest from sensor_logs the first time
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (DEVICE_LATEST_TABLE,)
+        ).fetchone()
+        if not exists:
+            conn.execute(f"""
+                CREATE TABLE {DEVICE_LATEST_TABLE} (
+                    device_id TEXT PRIMARY KEY,
+                    id INTEGER,
+                    timestamp DATETIME,
+                    temp REAL,
+                    ph REAL,
+                    do REAL,
+                    turbidity REAL,
+                    pred_temp REAL,
+                    pred_ph REAL,
+                    pred_do REAL,
+                    pred_turb REAL,
+                    sensor_risk TEXT,
+                    pred_risk TEXT,
+                    status TEXT,
+                    received_at DATETIME,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    avg_interval_s REAL,
+                    msg_rate_per_min REAL
+                ) WITHOUT ROWID
+            """)
+            _fill_device_latest(conn)
+        # Re-created so files from older versions pick up the current upsert
+        conn.execute("DROP TRIGGER IF EXISTS trg_device_latest")
+        conn.execute(f"""
+            CREATE TRIGGER trg_device_latest AFTER INSERT ON sensor_logs BEGIN
+                {_device_latest_upsert()}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {HEARTBEAT_TABLE} (
+                gateway_id TEXT PRIMARY KEY,
+                started_at DATETIME,
+                beat_at DATETIME,
+                last_message_at DATETIME,
+                messages INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                mqtt_connected INTEGER,
+                host TEXT,
+                pid INTEGER
+            ) WITHOUT ROWID
+        """)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _fill_device_latest(conn):
+    reading = [col for col in SENSOR_COLUMNS if col != "device_id"]
+    conn.execute(f"""
+        INSERT INTO {DEVICE_LATEST_TABLE} (
+            device_id, id, {", ".join(reading)}, received_at,
+            message_count, avg_interval_s, msg_rate_per_min
+        )
+        SELECT d, id, {", ".join(reading)}, {RECEIVED_AT_SQL.format(ts="created_at")}, n,
+               span / NULLIF(n - 1, 0), 60.0 * (n - 1) / NULLIF(span, 0)
+        FROM (
+            SELECT *, COALESCE(device_id, '{DEFAULT_DEVICE_ID}') AS d,
+                   ROW_NUMBER() OVER w AS rn,
+                   COUNT(*) OVER (PARTITION BY COALESCE(device_id, '{DEFAULT_DEVICE_ID}')) AS n,
+                   (julianday(MAX(timestamp) OVER p) - julianday(MIN(timestamp) OVER p)) * 86400.0 AS span
+            FROM sensor_logs
+            WINDOW p AS (PARTITION BY COALESCE(device_id, '{DEFAULT_DEVICE_ID}')),
+                   w AS (p ORDER BY timestamp DESC, id DESC)
+        )
+        WHERE rn = 1
+    """)
+
+
+def rebuild_device_latest():
+    """Recompute device_latest from sensor_logs (repair tool, e.g. after a restore or deleting a device)"""
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.execute(f"DELETE FROM {DEVICE_LATEST_TABLE}")
+                _fill_device_latest(conn)
+        finally:
+            conn.close()
+
+
+def get_device_latest(device_id=None):
+    """
+    Latest reading of every device (primary-key reads, no sensor_logs scan)
+    
+    Returns:
+        DataFrame, one row per device; with device_id a single row (empty if unknown)
+    """
+    conn = get_connection()
+    if device_id is None:
+        df = pd.read_sql_query(f"SELECT * FROM {DEVICE_LATEST_TABLE} ORDER BY device_id", conn)
+    else:
+        df = pd.read_sql_query(
+            f"SELECT * FROM {DEVICE_LATEST_TABLE} WHERE device_id = ?", conn, params=(device_id,)
+        )
+    conn.close()
+    return df
+
+
+def update_heartbeat(gateway_id, started_at, last_message_at=None, messages=0, errors=0,
+                     mqtt_connected=None, host=None, pid=None):
+    """UPSERT the gateway's liveness row (called on a timer, also when no data arrives)"""
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.execute(f"""
+                    INSERT INTO {HEARTBEAT_TABLE} (
+                        gateway_id, started_at, beat_at, last_message_at,
+                        messages, errors, mqtt_connected, host, pid
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(gateway_id) DO UPDATE SET
+                        started_at = excluded.started_at,
+                        beat_at = excluded.beat_at,
+                        last_message_at = excluded.last_message_at,
+                        messages = excluded.messages,
+                        errors = excluded.errors,
+                        mqtt_connected = excluded.mqtt_connected,
+                        host = excluded.host,
+                        pid = excluded.pid
+                """, (
+                    gateway_id, _ts(started_at), _ts(datetime.now()), _ts(last_message_at),
+                    int(messages), int(errors),
+                    None if mqtt_connected is None else int(bool(mqtt_connected)), host, pid
+                ))
+        finally:
+            conn.close()
+
+
+def get_gateway_health():
+    """Heartbeat rows of every gateway (DataFrame, newest beat first)"""
+    conn = get_connection()
+    df = pd.read_sql_query(f"SELECT * FROM {HEARTBEAT_TABLE} ORDER BY beat_at DESC", conn)
+    conn.close()
+    return df
+
+
+def _ts(value):
+    """datetime -> 'YYYY-MM-DD HH:MM:SS' (the format sensor timestamps use), None stays None"""
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value is not None else None
+
+
+def init_forecasts(conn):
+    """
+    Create the forecast side table, keyed by the reading's sensor_logs id; a
+    trigger drops a reading's forecasts when retention deletes the reading.
+    Tables from before the id key ((device_id, timestamp), where two readings
+    in the same second overwrote each other) are converted once.
+    """
+    with conn:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({FORECAST_TABLE})")}
+        if columns and "id" not in columns:
+            conn.execute(f"ALTER TABLE {FORECAST_TABLE} RENAME TO {FORECAST_TABLE}_old")
+            conn.execute("DROP TRIGGER IF EXISTS trg_forecast_delete")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (
+                id INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                horizons TEXT NOT NULL,
+                forecast BLOB NOT NULL,
+                eta_hours REAL,
+                eta_param TEXT
+            )
+        """)
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_forecast_device_timestamp
+            ON {FORECAST_TABLE}(device_id, timestamp)
+        """)
+        if columns and "id" not in columns:
+            # Old rows attach to the newest reading with the same device + timestamp
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {FORECAST_TABLE}
+                SELECT (SELECT MAX(s.id) FROM sensor_logs s
+                        WHERE COALESCE(s.device_id, '{DEFAULT_DEVICE_ID}') = f.device_id
+                          AND s.timestamp = f.timestamp),
+                       f.device_id, f.timestamp, f.horizons, f.forecast, f.eta_hours, f.eta_param
+                FROM {FORECAST_TABLE}_old f
+                WHERE EXISTS (SELECT 1 FROM sensor_logs s
+                              WHERE COALESCE(s.device_id, '{DEFAULT_DEVICE_ID}') = f.device_id
+                                AND s.timestamp = f.timestamp)
+            """)
+            conn.execute(f"DROP TABLE {FORECAST_TABLE}_old")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_forecast_delete AFTER DELETE ON sensor_logs BEGIN
+                DELETE FROM {FORECAST_TABLE} WHERE id = OLD.id;
+            END
+        """)
+
+
+def forecast_params(row):
+    """
+    Row dict {id (sensor_logs id of the reading), device_id, timestamp,
+    horizons, forecast (targets x horizons), eta_hours, eta_param} -> INSERT
+    parameters in FORECAST_COLUMNS order
+    """
+    forecast = np.asarray(row["forecast"], dtype="<f4")
+    eta = row.get("eta_hours")
+    return (
+        int(row["id"]),
+        row.get("device_id") or DEFAULT_DEVICE_ID,
+        str(row["timestamp"]),
+        ",".join(str(int(h)) for h in row["horizons"]),
+        forecast.reshape(len(FORECAST_TARGETS), -1).tobytes(),
+        None if eta is None or np.isnan(eta) else float(eta),
+        row.get("eta_param"),
+    )
+
+
+def insert_forecast_batch(rows):
+    """INSERT OR REPLACE forecast rows by reading id (see forecast_params), return count"""
+    params = [forecast_params(row) for row in rows]
+    if not params:
+        return 0
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany(FORECAST_INSERT_SQL, params)
+        finally:
+            conn.close()
+    return len(params)
+
+
+def decode_forecasts(df):
+    """
+    Expand the forecast blobs into {target}_{h}h float columns (one decode per
+    distinct horizons layout, not per row); drops horizons / forecast
+    """
+    out = df.drop(columns=["horizons", "forecast"])
+    for layout, group in df.groupby("horizons", sort=False):
+        horizons = layout.split(",")
+        values = np.frombuffer(b"".join(bytes(b) for b in group["forecast"]), dtype="<f4")
+        values = values.reshape(len(group), len(FORECAST_TARGETS), len(horizons))
+        for i, target in enumerate(FORECAST_TARGETS):
+            for j, horizon in enumerate(horizons):
+                out.loc[group.index, f"{target}_{horizon}h"] = values[:, i, j]
+    return out
+
+
+def get_forecasts(device_id=None, start_time=None, end_time=None, limit=None):
+    """
+    Multi-horizon forecasts + ETA to Danger, oldest first, as a wide DataFrame
+    (id, device_id, timestamp, eta_hours, eta_param, Temperature_1h, ...)
+    """
+    where, params = history_filter(device_id, start_time, end_time)
+    query = f"""
+        SELECT {", ".join(FORECAST_COLUMNS)} FROM {FORECAST_TABLE}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY timestamp ASC, id ASC
+        {f"LIMIT {int(limit)}" if limit else ""}
+    """
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return decode_forecasts(df)
+
+
 def insert_sensor_data(data: dict):
     """
     Insert sensor data with predictions
@@ -110,6 +592,77 @@ def insert_sensor_data(data: dict):
         return row_id
 
 
+def sensor_params(row):
+    """Dict keyed by SENSOR_COLUMNS (or tuple in that order) -> INSERT parameters"""
+    return tuple(row.get(col) for col in SENSOR_COLUMNS) if isinstance(row, dict) else tuple(row)
+
+
+def _sensor_insert_sql():
+    placeholders = [
+        f"COALESCE(?, '{DEFAULT_DEVICE_ID}')" if col == "device_id" else "?" for col in SENSOR_COLUMNS
+    ]
+    return f"""
+        INSERT INTO sensor_logs ({", ".join(SENSOR_COLUMNS)})
+        VALUES ({", ".join(placeholders)})
+    """
+
+
+def insert_reading(row, forecast=None):
+    """
+    Insert one reading and, optionally, its forecast row in the same transaction
+
+    Args:
+        row: Dict keyed by SENSOR_COLUMNS (or tuple in that order)
+        forecast: Optional {horizons, forecast, eta_hours, eta_param} (see forecast_params)
+
+    Returns:
+        id of the new sensor_logs row (the forecast row's key)
+    """
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                reading_id = conn.execute(_sensor_insert_sql(), sensor_params(row)).lastrowid
+                if forecast is not None:
+                    values = dict(zip(SENSOR_COLUMNS, sensor_params(row)))
+                    conn.execute(FORECAST_INSERT_SQL, forecast_params({
+                        **forecast, "id": reading_id,
+                        "device_id": values["device_id"], "timestamp": values["timestamp"],
+                    }))
+        finally:
+            conn.close()
+    return reading_id
+
+
+def insert_sensor_batch(rows, conn=None):
+    """
+    Insert many rows with a single executemany()
+    
+    Args:
+        rows: Iterable of dicts (keys from SENSOR_COLUMNS) or tuples in SENSOR_COLUMNS order
+        conn: Optional open connection; the caller then owns the transaction
+              and must commit. Without it, the batch is committed atomically.
+    
+    Returns:
+        Number of inserted rows
+    """
+    params = [sensor_params(row) for row in rows]
+    sql = _sensor_insert_sql()
+    
+    if conn is not None:
+        conn.executemany(sql, params)
+        return len(params)
+    
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany(sql, params)
+        finally:
+            conn.close()
+    return len(params)
+
+
 def get_latest_data(limit=100):
     """Get latest N records"""
     conn = get_connection()
@@ -134,6 +687,177 @@ def get_data_by_timerange(start_time, end_time):
     return df
 
 
+def get_rows_after(last_id, limit=None):
+    """Rows with id > last_id in insert order (incremental polling)"""
+    conn = get_connection()
+    df = pd.read_sql_query(f"""
+        SELECT * FROM sensor_logs
+        WHERE id > ?
+        ORDER BY id ASC
+        {"LIMIT " + str(int(limit)) if limit else ""}
+    """, conn, params=(int(last_id),))
+    conn.close()
+    return df
+
+
+def sensor_arrow_schema():
+    """
+    Compact Arrow types for sensor_logs: float32 values, int8-dictionary
+    labels, millisecond timestamps (int64 underneath)
+    """
+    import pyarrow as pa
+    
+    label = pa.dictionary(pa.int8(), pa.string())
+    types = {
+        "id": pa.int64(),
+        "timestamp": pa.timestamp("ms"),
+        **{col: pa.float32() for col in ("temp", "ph", "do", "turbidity",
+                                          "pred_temp", "pred_ph", "pred_do", "pred_turb")},
+        "sensor_risk": label,
+        "pred_risk": label,
+        "status": label,
+        "created_at": pa.timestamp("ms"),
+        "device_id": pa.dictionary(pa.int16(), pa.string()),
+    }
+    return pa.schema([pa.field(name, dtype) for name, dtype in types.items()])
+
+
+def to_sensor_array(values, dtype):
+    """Python values / Arrow array -> array of the compact sensor type"""
+    import pyarrow as pa
+    
+    if pa.types.is_dictionary(dtype):
+        return pa.array(values, pa.string()).dictionary_encode().cast(dtype)
+    if pa.types.is_timestamp(dtype):
+        # SQLite stores 'YYYY-MM-DD HH:MM:SS' text; Arrow parses it without Python datetimes
+        array = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values, pa.string())
+        return array.cast(dtype)
+    return pa.array(values, dtype, from_pandas=True)
+
+
+def conform_arrow(table):
+    """Cast an Arrow table (DuckDB result, from_pandas, ...) to the compact sensor types"""
+    import pyarrow as pa
+    
+    schema = sensor_arrow_schema()
+    columns = []
+    for name in table.column_names:
+        column = table[name]
+        if name in schema.names:
+            dtype = schema.field(name).type
+            if pa.types.is_dictionary(dtype) and not pa.types.is_dictionary(column.type):
+                column = column.cast(pa.string()).dictionary_encode()
+            # safe=False: DuckDB timestamps are microseconds, readings are whole seconds
+            column = column.cast(dtype, safe=False)
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def query_arrow(query, params=(), batch_size=EXPORT_CHUNK_SIZE):
+    """
+    Run a sensor_logs query straight into an Arrow table (no pandas frame in
+    between); columns of sensor_arrow_schema() get the compact types
+    """
+    import pyarrow as pa
+    
+    schema = sensor_arrow_schema()
+    conn = sqlite3.connect(str(DB_PATH))
+    try:
+        cursor = conn.execute(query, params)
+        names = [d[0] for d in cursor.description]
+        types = [schema.field(n).type if n in schema.names else None for n in names]
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            batches.append(pa.record_batch([
+                to_sensor_array(col, dtype) if dtype is not None else pa.array(col)
+                for col, dtype in zip(columns, types)
+            ], names=names))
+    finally:
+        conn.close()
+    
+    if not batches:
+        return pa.schema([
+            pa.field(n, t if t is not None else pa.null()) for n, t in zip(names, types)
+        ]).empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def get_latest_arrow(limit=100):
+    """Latest N records as a compact Arrow table, newest first"""
+    return query_arrow(f"SELECT * FROM sensor_logs ORDER BY timestamp DESC LIMIT {int(limit)}")
+
+
+def get_rows_after_arrow(last_id, limit=None):
+    """get_rows_after() as a compact Arrow table"""
+    return query_arrow(f"""
+        SELECT * FROM sensor_logs
+        WHERE id > ?
+        ORDER BY id ASC
+        {"LIMIT " + str(int(limit)) if limit else ""}
+    """, (int(last_id),))
+
+
+def get_range_arrow(device_id=None, start_time=None, end_time=None):
+    """
+    Readings of a time range as a compact Arrow table, per device in time
+    order (device_id, timestamp, id) - the columnar input of a backtest
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    where, params = history_filter(device_id, start_time, end_time)
+    table = query_arrow(f"""
+        SELECT * FROM sensor_logs
+        {"WHERE " + " AND ".join(where) if where else ""}
+    """, params)
+    # idx_device_timestamp is DESC: sorting in Arrow beats SQLite's temp b-tree
+    keys = pa.table({
+        "device_id": table["device_id"].cast(pa.string()),
+        "timestamp": table["timestamp"],
+        "id": table["id"],
+    })
+    return table.take(pc.sort_indices(keys, sort_keys=[(name, "ascending") for name in keys.column_names]))
+
+
+def update_scores(rows):
+    """
+    Bulk UPDATE of RESCORE_COLUMNS by id, one transaction
+
+    Args:
+        rows: Iterable of tuples (*RESCORE_COLUMNS values, id)
+
+    Returns:
+        Number of updated rows. The rollup stays in step (UPDATE trigger) and
+        device_latest rows take the new scores of the reading they point at.
+    """
+    params = list(rows)
+    if not params:
+        return 0
+    with db_lock:
+        conn = get_connection()
+        try:
+            with conn:
+                assignments = ", ".join(f"{col} = ?" for col in RESCORE_COLUMNS)
+                conn.executemany(f"UPDATE sensor_logs SET {assignments} WHERE id = ?", params)
+                # Only the device rows pointing at a rescored reading (one row per device at most)
+                conn.executemany(f"UPDATE {DEVICE_LATEST_TABLE} SET {assignments} WHERE id = ?", params)
+        finally:
+            conn.close()
+    return len(params)
+
+
+def get_id_bounds():
+    """(MIN(id), MAX(id)) - both are rowid lookups, (None, None) when empty"""
+    conn = get_connection()
+    bounds = conn.execute("SELECT MIN(id), MAX(id) FROM sensor_logs").fetchone()
+    conn.close()
+    return tuple(bounds)
+
+
 def get_all_data():
     """Get all data (use with caution for large datasets)"""
     conn = get_connection()
@@ -145,6 +869,20 @@ def get_all_data():
     return df
 
 
+def get_range_version(start_time, end_time):
+    """
+    (row count, max id) of a time range - changes when rows in the range are
+    inserted or deleted, not when other ranges change (index-only scan)
+    """
+    conn = get_connection()
+    version = conn.execute("""
+        SELECT COUNT(*), MAX(id) FROM sensor_logs
+        WHERE timestamp BETWEEN ? AND ?
+    """, (str(start_time), str(end_time))).fetchone()
+    conn.close()
+    return tuple(version)
+
+
 def get_risk_statistics():
     """Get risk distribution statistics"""
     conn = get_connection()
@@ -176,37 +914,671 @@ def get_latest_24h():
     return df
 
 
-def delete_old_data(days=30):
-    """Delete data older than N days"""
+def get_aggregates(start_time=None, end_time=None, bucket_minutes=60):
+    """
+    Per-bucket count / mean / min / max of the sensor values
+    
+    Args:
+        start_time, end_time: Optional 'YYYY-MM-DD HH:MM:SS' bounds (inclusive)
+        bucket_minutes: Bucket width in minutes
+    """
+    where, params = [], []
+    if start_time is not None:
+        where.append("timestamp >= ?")
+        params.append(str(start_time))
+    if end_time is not None:
+        where.append("timestamp <= ?")
+        params.append(str(end_time))
+    
+    bucket_sec = int(bucket_minutes * 60)
+    conn = get_connection()
+    df = pd.read_sql_query(f"""
+        SELECT
+            datetime((CAST(strftime('%s', timestamp) AS INTEGER) / {bucket_sec}) * {bucket_sec}, 'unixepoch') AS bucket,
+            COUNT(*) AS count,
+            AVG(temp) AS temp_mean, MIN(temp) AS temp_min, MAX(temp) AS temp_max,
+            AVG(ph) AS ph_mean, MIN(ph) AS ph_min, MAX(ph) AS ph_max,
+            AVG(do) AS do_mean, MIN(do) AS do_min, MAX(do) AS do_max,
+            AVG(turbidity) AS turbidity_mean, MIN(turbidity) AS turbidity_min, MAX(turbidity) AS turbidity_max,
+            AVG(pred_temp) AS pred_temp_mean, AVG(pred_ph) AS pred_ph_mean,
+            AVG(pred_do) AS pred_do_mean, AVG(pred_turb) AS pred_turb_mean,
+            SUM(status = 'Danger') AS danger_count
+        FROM sensor_logs
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY bucket
+        ORDER BY bucket ASC
+    """, conn, params=params)
+    conn.close()
+    return df
+
+
+def iter_hourly_means(device_id=None, start_time=None, end_time=None, chunk_hours=24 * 7):
+    """
+    Yield DataFrames of hourly sensor means (bucket, temp, ph, do, turbidity,
+    count), oldest first, one window of chunk_hours at a time
+
+    Each window is a GROUP BY over an index-backed timestamp range aligned to
+    whole hours, so only that window's hourly rows are in memory, never the
+    raw readings. Default bounds come from the rollup table (no scan).
+    """
+    conn = get_connection()
+    try:
+        if start_time is None or end_time is None:
+            where, params = ["count > 0"], []
+            if device_id is not None:
+                where.append("device_id = ?")
+                params.append(device_id)
+            first, last = conn.execute(
+                f"SELECT MIN(bucket), MAX(bucket) FROM {ROLLUP_TABLE} WHERE {' AND '.join(where)}", params
+            ).fetchone()
+            if first is None:
+                return
+            start_time = start_time if start_time is not None else first
+            last_hour = _hour_floor(end_time if end_time is not None else last)
+        else:
+            last_hour = _hour_floor(end_time)
+
+        step = pd.Timedelta(hours=chunk_hours)
+        window = pd.Timestamp(_hour_floor(start_time))
+        stop = pd.Timestamp(last_hour) + pd.Timedelta(hours=1)
+        while window < stop:
+            upper = min(window + step, stop)
+            where, params = history_filter(device_id, window.strftime("%Y-%m-%d %H:%M:%S"), None)
+            where.append("timestamp < ?")
+            params.append(upper.strftime("%Y-%m-%d %H:%M:%S"))
+            if upper == stop and end_time is not None:
+                # Caller's end_time is inclusive and may fall inside the last hour
+                where.append("timestamp <= ?")
+                params.append(str(end_time))
+            df = pd.read_sql_query(f"""
+                SELECT {HOUR_BUCKET_SQL.format(ts="timestamp")} AS bucket,
+                       AVG(temp) AS temp, AVG(ph) AS ph, AVG(do) AS do, AVG(turbidity) AS turbidity,
+                       COUNT(*) AS count
+                FROM sensor_logs
+                WHERE {' AND '.join(where)}
+                GROUP BY bucket
+                ORDER BY bucket ASC
+            """, conn, params=params)
+            if len(df):
+                yield df
+            window = upper
+    finally:
+        conn.close()
+
+
+def history_filter(device_id=None, start_time=None, end_time=None, statuses=None, value_ranges=None):
+    """WHERE clauses + params shared by get_history_page() and count_history()"""
+    where, params = [], []
+    if device_id is not None:
+        where.append("device_id = ?")
+        params.append(device_id)
+    if start_time is not None:
+        where.append("timestamp >= ?")
+        params.append(str(start_time))
+    if end_time is not None:
+        where.append("timestamp <= ?")
+        params.append(str(end_time))
+    if statuses is not None:
+        where.append(f"status IN ({', '.join('?' * len(statuses))})" if statuses else "0")
+        params.extend(statuses)
+    for col, (low, high) in (value_ranges or {}).items():
+        if col not in HISTORY_VALUE_COLUMNS:
+            raise ValueError(f"Cannot filter on column: {col}")
+        where.append(f"{col} BETWEEN ? AND ?")
+        params.extend([low, high])
+    return where, params
+
+
+def get_history_page(device_id=None, start_time=None, end_time=None, statuses=None,
+                     value_ranges=None, before=None, page_size=100, as_arrow=False):
+    """
+    One page of readings, newest first, with keyset pagination
+    
+    Args:
+        device_id, start_time, end_time, statuses: Optional filters (index-backed)
+        value_ranges: Optional {column: (low, high)} for HISTORY_VALUE_COLUMNS
+        before: Cursor (timestamp, id) of the last row of the previous page
+        page_size: Rows per page
+        as_arrow: Return a compact Arrow table (sensor_arrow_schema) instead of a DataFrame
+    
+    Returns:
+        (DataFrame / Arrow table, cursor for the next page or None on the last page)
+    """
+    where, params = history_filter(device_id, start_time, end_time, statuses, value_ranges)
+    if before is not None:
+        # Seek past the previous page instead of OFFSET, so page 1000 costs the same as page 1
+        where.append("(timestamp, id) < (?, ?)")
+        params.extend([str(before[0]), int(before[1])])
+    
+    query = f"""
+        SELECT * FROM sensor_logs
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT {int(page_size) + 1}
+    """
+    
+    if as_arrow:
+        table = query_arrow(query, params)
+        if table.num_rows <= page_size:
+            return table, None
+        table = table.slice(0, page_size)
+        last_ts = table['timestamp'][-1].as_py().strftime("%Y-%m-%d %H:%M:%S")
+        return table, (last_ts, table['id'][-1].as_py())
+    
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    
+    if len(df) <= page_size:
+        return df, None
+    df = df.iloc[:page_size]
+    return df, (df['timestamp'].iloc[-1], int(df['id'].iloc[-1]))
+
+
+def _hour_floor(ts):
+    return pd.Timestamp(ts).floor("h").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _hour_ceil(ts):
+    return pd.Timestamp(ts).ceil("h").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def count_history(device_id=None, start_time=None, end_time=None, statuses=None, value_ranges=None):
+    """
+    Row count for History filters without scanning the range
+    
+    Whole hours come from the rollup table, the partial first / last hour is
+    counted on the timestamp index. Value ranges are not in the rollup: the
+    count then ignores them and is an upper bound.
+    
+    Returns:
+        (count, exact)
+    """
+    rollup_where, rollup_params = [], []
+    if device_id is not None:
+        rollup_where.append("device_id = ?")
+        rollup_params.append(device_id)
+    if statuses is not None:
+        rollup_where.append(f"status IN ({', '.join('?' * len(statuses))})" if statuses else "0")
+        rollup_params.extend(statuses)
+    
+    # [start, head_end) and [tail_start, end] are counted exactly, whole hours in between from the rollup
+    head_end = _hour_ceil(start_time) if start_time is not None else None
+    tail_start = _hour_floor(end_time) if end_time is not None else None
+    
+    conn = get_connection()
+    try:
+        if head_end is not None and tail_start is not None and head_end >= tail_start:
+            # Range within about two hours: just count it
+            where, params = history_filter(device_id, start_time, end_time, statuses)
+            total = conn.execute(f"SELECT COUNT(*) FROM sensor_logs WHERE {' AND '.join(where)}", params).fetchone()[0]
+        else:
+            where, params = list(rollup_where), list(rollup_params)
+            if head_end is not None:
+                where.append("bucket >= ?")
+                params.append(head_end)
+            if tail_start is not None:
+                where.append("bucket < ?")
+                params.append(tail_start)
+            total = conn.execute(f"""
+                SELECT COALESCE(SUM(count), 0) FROM {ROLLUP_TABLE}
+                {"WHERE " + " AND ".join(where) if where else ""}
+            """, params).fetchone()[0]
+            edges = []
+            if start_time is not None:
+                where, params = history_filter(device_id, start_time, None, statuses)
+                edges.append((where + ["timestamp < ?"], params + [head_end]))
+            if tail_start is not None:
+                edges.append(history_filter(device_id, tail_start, end_time, statuses))
+            for where, params in edges:
+                total += conn.execute(f"SELECT COUNT(*) FROM sensor_logs WHERE {' AND '.join(where)}", params).fetchone()[0]
+    finally:
+        conn.close()
+    return total, not value_ranges
+
+
+def list_devices():
+    """Device ids with stored readings (from the rollup, no table scan)"""
+    conn = get_connection()
+    rows = conn.execute(f"""
+        SELECT device_id FROM {ROLLUP_TABLE}
+        GROUP BY device_id HAVING SUM(count) > 0
+        ORDER BY device_id
+    """).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def delete_expired_batch(days=30, batch_size=MAINTENANCE_DELETE_BATCH):
+    """
+    Delete at most `batch_size` of the oldest rows older than N days
+    
+    Returns:
+        (deleted_rows, seconds the write lock was held)
+    """
+    with db_lock:
+        conn = get_connection()
+        try:
+            start = time.perf_counter()
+            with conn:
+                deleted = conn.execute("""
+                    DELETE FROM sensor_logs
+                    WHERE id IN (
+                        SELECT id FROM sensor_logs
+                        WHERE timestamp < datetime('now', ? || ' days')
+                        ORDER BY timestamp
+                        LIMIT ?
+                    )
+                """, (f'-{days}', batch_size)).rowcount
+            return deleted, time.perf_counter() - start
+        finally:
+            conn.close()
+
+
+def delete_old_data(days=30, batch_size=MAINTENANCE_DELETE_BATCH):
+    """Delete data older than N days (in short batches so writers are not starved)"""
+    total = 0
+    while True:
+        deleted, _ = delete_expired_batch(days, batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def enable_incremental_vacuum():
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL
+    
+    This needs one full VACUUM (locks the file for the rebuild), so run it once
+    while the gateway is stopped. Returns True if a conversion was done.
+    """
     with db_lock:
         conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            DELETE FROM sensor_logs 
-            WHERE timestamp < datetime('now', ? || ' days')
-        """, (f'-{days}',))
-        
-        deleted = cursor.rowcount
-        conn.commit()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return True
+        finally:
+            conn.close()
+
+
+def is_incremental_vacuum():
+    """True if the database file uses auto_vacuum=INCREMENTAL"""
+    conn = get_connection()
+    try:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
         conn.close()
-        
-        return deleted
 
 
-def export_to_csv(output_path, limit=None):
-    """Export database to CSV"""
+def incremental_vacuum_step(pages=MAINTENANCE_VACUUM_PAGES):
+    """
+    Return up to `pages` free pages to the OS
+    
+    Returns:
+        (pages_freed, seconds the write lock was held)
+    """
+    with db_lock:
+        conn = get_connection()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0, 0.0
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            start = time.perf_counter()
+            # The pragma frees one page per sqlite3_step(); execute() steps a
+            # row-less statement only once, executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            elapsed = time.perf_counter() - start
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return before - after, elapsed
+        finally:
+            conn.close()
+
+
+def checkpoint_wal(mode="PASSIVE"):
+    """
+    Copy WAL frames back into the database file
+    
+    PASSIVE never waits for readers or writers; TRUNCATE also shrinks the WAL.
+    
+    Returns:
+        (busy, wal_frames, checkpointed_frames, seconds spent)
+    """
+    conn = get_connection()
+    try:
+        start = time.perf_counter()
+        busy, log, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return busy, log, checkpointed, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def run_maintenance_step(days=30, batch_size=MAINTENANCE_DELETE_BATCH,
+                         vacuum_pages=MAINTENANCE_VACUUM_PAGES):
+    """
+    One bounded maintenance step: delete a batch of expired rows, reclaim a few
+    free pages, checkpoint the WAL. Call it between ingest writes.
+    
+    Args:
+        days: Retention in days (None or 0 skips the delete phase)
+    
+    Returns:
+        dict with per-phase results and how long each phase blocked writers (ms)
+    """
+    deleted, delete_s = delete_expired_batch(days, batch_size) if days else (0, 0.0)
+    freed, vacuum_s = incremental_vacuum_step(vacuum_pages)
+    busy, wal_frames, checkpointed, checkpoint_s = checkpoint_wal("PASSIVE")
+    
+    return {
+        'deleted': deleted,
+        'delete_blocked_ms': round(delete_s * 1000, 2),
+        'pages_freed': freed,
+        'vacuum_blocked_ms': round(vacuum_s * 1000, 2),
+        'wal_frames': wal_frames,
+        'wal_checkpointed': checkpointed,
+        'checkpoint_ms': round(checkpoint_s * 1000, 2),
+        'pending': deleted >= batch_size,
+    }
+
+
+def iter_query_chunks(query, params=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield (columns, rows) chunks of a query result
+    
+    Rows are stepped out of the SQLite cursor with fetchmany(), so only one
+    chunk is held in memory regardless of how many rows the query matches.
+    """
     conn = get_connection()
+    conn.row_factory = None  # Plain tuples are cheaper than sqlite3.Row
+    try:
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield columns, rows
+    finally:
+        conn.close()
+
+
+def _export_format(output, fmt):
+    """Resolve export format from explicit value or output file suffix"""
+    if fmt is None:
+        name = str(output).lower() if isinstance(output, (str, Path)) else ""
+        if name.endswith(".csv.gz"):
+            fmt = "csv.gz"
+        elif name.endswith((".ndjson", ".jsonl")):
+            fmt = "ndjson"
+        elif name.endswith(".parquet"):
+            fmt = "parquet"
+        else:
+            fmt = "csv"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (use one of {EXPORT_FORMATS})")
+    return fmt
+
+
+def _arrow_schema(conn, table):
+    """Build a stable Arrow schema from the declared SQLite column types"""
+    import pyarrow as pa
+    
+    fields = []
+    for _, name, decl_type, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        decl_type = (decl_type or "").upper()
+        if "INT" in decl_type:
+            fields.append(pa.field(name, pa.int64()))
+        elif "REAL" in decl_type:
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def stream_export(output, fmt=None, where=None, params=(), limit=None,
+                  table="sensor_logs", chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Export a table incrementally to a file path or writable binary stream
+    
+    Args:
+        output: File path or binary file-like object (file, socket, response body)
+        fmt: 'csv', 'csv.gz', 'ndjson' or 'parquet' (default: from file suffix, else csv)
+        where: Optional SQL filter, e.g. "status = ?" (values go in params)
+        params: Query parameters for the WHERE clause
+        limit: Optional maximum number of rows
+        chunk_size: Rows fetched from the cursor and written per step
     
-    query = "SELECT * FROM sensor_logs ORDER BY timestamp DESC"
+    Returns:
+        Number of exported rows
+    """
+    fmt = _export_format(output, fmt)
+    
+    query = f"SELECT * FROM {table}"
+    if where:
+        query += f" WHERE {where}"
+    query += " ORDER BY timestamp DESC"
+    params = list(params)
     if limit:
-        query += f" LIMIT {limit}"
+        query += " LIMIT ?"
+        params.append(int(limit))
     
-    df = pd.read_sql_query(query, conn)
-    df.to_csv(output_path, index=False)
-    conn.close()
+    own_file = isinstance(output, (str, Path))
+    raw = open(output, "wb") if own_file else output
+    total = 0
+    
+    try:
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            conn = get_connection()
+            schema = _arrow_schema(conn, table)
+            conn.close()
+            with pq.ParquetWriter(raw, schema, compression="snappy") as writer:
+                for columns, rows in iter_query_chunks(query, params, chunk_size):
+                    batch = pa.RecordBatch.from_arrays(
+                        [pa.array(col, type=schema.field(name).type)
+                         for name, col in zip(columns, zip(*rows))],
+                        schema=schema
+                    )
+                    writer.write_batch(batch)
+                    total += len(rows)
+            return total
+        
+        binary = gzip.GzipFile(fileobj=raw, mode="wb") if fmt == "csv.gz" else raw
+        text = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        try:
+            if fmt == "ndjson":
+                for columns, rows in iter_query_chunks(query, params, chunk_size):
+                    text.writelines(
+                        json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+                    total += len(rows)
+            else:
+                writer = csv.writer(text, lineterminator="\n")
+                conn = get_connection()
+                writer.writerow([col[1] for col in conn.execute(f"PRAGMA table_info({table})")])
+                conn.close()
+                for _, rows in iter_query_chunks(query, params, chunk_size):
+                    writer.writerows(rows)
+                    total += len(rows)
+            text.flush()
+        finally:
+            # Detach so closing the wrapper never closes a caller-owned stream
+            text.detach()
+            if binary is not raw:
+                binary.close()
+    finally:
+        if own_file:
+            raw.close()
+    
+    return total
+
+
+def export_to_csv(output_path, limit=None, fmt=None):
+    """Export database to CSV (or csv.gz / ndjson / parquet by suffix)"""
+    total = stream_export(output_path, fmt=fmt, limit=limit)
+    print(f"✅ Exported {total} records to {output_path}")
+    return total
+
+
+BACKUP_MAX_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback when concurrent writes keep restarting the copy"""
+
+
+def _run_backup(src, dst, pages, sleep):
+    """
+    Copy src into dst with the online backup API, return step statistics
+    
+    SQLite restarts a stepped backup whenever another connection writes to the
+    source. In WAL mode the source connection pins a read snapshot for the whole
+    copy instead: writers keep appending to the WAL and the copy never restarts.
+    Without WAL, after BACKUP_MAX_RESTARTS restarts the copy falls back to a
+    single step so a busy writer cannot livelock it.
+    """
+    stats = {'steps': 0, 'restarts': 0, 'pages': 0}
+    last_remaining = [None]
+    
+    def progress(status, remaining, total):
+        stats['steps'] += 1
+        stats['pages'] = total
+        # Another connection wrote to the source: SQLite restarts the copy
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            stats['restarts'] += 1
+            if stats['restarts'] >= BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining[0] = remaining
+    
+    wal = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    start = time.perf_counter()
+    try:
+        if wal:
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+    except _BackupRestarted:
+        src.backup(dst, pages=-1)
+    finally:
+        if wal:
+            src.rollback()
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def backup_database(dest_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP,
+                    source_path=None):
+    """
+    Hot-copy the live database with SQLite's online backup API
+    
+    The copy runs `pages` pages at a time and sleeps between steps, so the
+    gateway's writes are never held off for more than one short step.
+    
+    Args:
+        source_path: Database to copy (default: DB_PATH)
+    
+    Returns:
+        dict with steps, restarts, pages and seconds
+    """
+    dest_path = Path(dest_path)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    src = sqlite3.connect(str(source_path)) if source_path else get_connection()
+    dst = sqlite3.connect(str(dest_path))
+    try:
+        stats = _run_backup(src, dst, pages, sleep)
+        # A standalone snapshot should not need a -wal file next to it
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return stats
+
+
+def verify_database(path=None, full=False):
+    """
+    Integrity-check a database file (live DB by default)
+    
+    Args:
+        full: Run integrity_check instead of the faster quick_check
+    
+    Returns:
+        (ok, list of problems)
+    """
+    conn = sqlite3.connect(f"file:{path or DB_PATH}?mode=ro", uri=True)
+    try:
+        pragma = "integrity_check" if full else "quick_check"
+        messages = [row[0] for row in conn.execute(f"PRAGMA {pragma}")]
+    except sqlite3.DatabaseError as e:
+        messages = [str(e)]
+    finally:
+        conn.close()
+    ok = messages == ["ok"]
+    return ok, [] if ok else messages
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot files, newest first"""
+    snapshot_dir = Path(snapshot_dir)
+    if not snapshot_dir.exists():
+        return []
+    return sorted(snapshot_dir.glob(f"{DB_PATH.stem}_*.db"), reverse=True)
+
+
+def create_snapshot(snapshot_dir=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP,
+                    pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """
+    Write a verified, timestamped snapshot and rotate out the oldest ones
     
-    print(f"✅ Exported {len(df)} records to {output_path}")
+    Returns:
+        dict with path, backup statistics and removed snapshots
+    """
+    snapshot_dir = Path(snapshot_dir)
+    path = snapshot_dir / f"{DB_PATH.stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+    tmp_path = path.with_suffix(".db.part")
+    
+    stats = backup_database(tmp_path, pages=pages, sleep=sleep)
+    ok, problems = verify_database(tmp_path)
+    if not ok:
+        tmp_path.unlink(missing_ok=True)
+        raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {problems[:3]}")
+    # Only complete, verified snapshots ever carry the .db name
+    tmp_path.replace(path)
+    
+    removed = []
+    if keep:
+        for old in list_snapshots(snapshot_dir)[keep:]:
+            old.unlink()
+            removed.append(old.name)
+    
+    return {'path': str(path), 'removed': removed, **stats}
+
+
+def restore_snapshot(snapshot_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """
+    Restore the live database from a snapshot (stop the gateway first)
+    
+    The snapshot is verified before anything is overwritten, and the restore
+    goes through the backup API so open connections see a consistent file.
+    """
+    ok, problems = verify_database(snapshot_path, full=True)
+    if not ok:
+        raise sqlite3.DatabaseError(f"Snapshot is corrupt, not restoring: {problems[:3]}")
+    
+    with db_lock:
+        src = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+        dst = get_connection()
+        try:
+            stats = _run_backup(src, dst, pages, sleep)
+        finally:
+            src.close()
+            dst.close()
+    return stats
 
 
 def get_table_info():
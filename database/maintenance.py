@@ -0,0 +1,85 @@
+# database/maintenance.py
+"""
+Incremental retention & vacuum maintenance
+
+Runs bounded steps (delete a small batch of expired rows, incremental_vacuum
+a few pages, PASSIVE WAL checkpoint) and reports how long each step blocked
+writers. The gateway runs the same step between writes; this script is for
+catching up manually or converting an existing file.
+
+Usage:
+    python maintenance.py --convert          # one-time: enable auto_vacuum=INCREMENTAL
+    python maintenance.py --days 30          # run steps until nothing is left to delete
+    python maintenance.py --days 30 --steps 1
+"""
+
+import argparse
+import time
+from db_config import (
+    init_database, get_table_info, enable_incremental_vacuum, run_maintenance_step,
+    checkpoint_wal, MAINTENANCE_DELETE_BATCH, MAINTENANCE_VACUUM_PAGES
+)
+
+
+def run(days, batch_size, vacuum_pages, max_steps=None, pause=0.05):
+    """Run maintenance steps until caught up (or max_steps), print timings"""
+    steps = 0
+    total_deleted = 0
+    total_freed = 0
+    worst_block = 0.0
+
+    while True:
+        result = run_maintenance_step(days=days, batch_size=batch_size, vacuum_pages=vacuum_pages)
+        steps += 1
+        total_deleted += result['deleted']
+        total_freed += result['pages_freed']
+        worst_block = max(worst_block, result['delete_blocked_ms'], result['vacuum_blocked_ms'])
+
+        print(
+            f"   step {steps}: deleted={result['deleted']} ({result['delete_blocked_ms']} ms) | "
+            f"freed pages={result['pages_freed']} ({result['vacuum_blocked_ms']} ms) | "
+            f"WAL {result['wal_checkpointed']}/{result['wal_frames']} ({result['checkpoint_ms']} ms)"
+        )
+
+        if max_steps and steps >= max_steps:
+            break
+        if not result['pending'] and result['pages_freed'] < vacuum_pages:
+            break
+        # Give writers a window between steps
+        time.sleep(pause)
+
+    return steps, total_deleted, total_freed, worst_block
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental retention & vacuum maintenance")
+    parser.add_argument("--days", type=int, default=0, help="Delete rows older than N days (0 = keep all)")
+    parser.add_argument("--batch-size", type=int, default=MAINTENANCE_DELETE_BATCH, help="Rows deleted per step")
+    parser.add_argument("--vacuum-pages", type=int, default=MAINTENANCE_VACUUM_PAGES, help="Pages reclaimed per step")
+    parser.add_argument("--steps", type=int, default=None, help="Stop after N steps")
+    parser.add_argument("--convert", action="store_true",
+                        help="Enable auto_vacuum=INCREMENTAL (one full VACUUM, stop the gateway first)")
+    args = parser.parse_args()
+
+    init_database()
+
+    if args.convert:
+        print("🔧 Converting database to auto_vacuum=INCREMENTAL...")
+        start = time.perf_counter()
+        converted = enable_incremental_vacuum()
+        if converted:
+            print(f"   ✅ Converted in {time.perf_counter() - start:.1f}s")
+        else:
+            print("   ℹ️  Already INCREMENTAL")
+
+    size_before = get_table_info()['db_size_mb']
+    print(f"\n🧹 Running maintenance (retention: {args.days or 'off'} days)...")
+    steps, deleted, freed, worst = run(args.days, args.batch_size, args.vacuum_pages, args.steps)
+    checkpoint_wal("TRUNCATE")
+    size_after = get_table_info()['db_size_mb']
+
+    print(f"\n✅ Done in {steps} steps")
+    print(f"   Deleted rows: {deleted}")
+    print(f"   Freed pages: {freed}")
+    print(f"   Longest writer block: {worst:.1f} ms")
+    print(f"   Size: {size_before} MB → {size_after} MB")
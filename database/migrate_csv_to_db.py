@@ -1,79 +1,208 @@
 # database/migrate_csv_to_db.py
 """
 Migrate existing CSV data to SQLite database
+
+The CSV is streamed in chunks and each chunk is written with executemany()
+inside one transaction. Progress is checkpointed in the `migration_state`
+table in the same transaction as the rows, so an interrupted migration
+resumes exactly where it stopped.
+
+Usage:
+    python migrate_csv_to_db.py                      # resume or start
+    python migrate_csv_to_db.py --defer-indexes      # faster for large logs
+    python migrate_csv_to_db.py --restart            # ignore saved progress
 """
 
+import argparse
+import time
 import pandas as pd
 from pathlib import Path
-from db_config import init_database, insert_sensor_data, get_table_info
+from db_config import (
+    init_database, get_connection, get_table_info,
+    insert_sensor_batch, create_indexes, drop_indexes, SENSOR_COLUMNS
+)
 from tqdm import tqdm
 
 # CSV file path
 CSV_PATH = Path(__file__).parent.parent / "dashboard" / "data_log.csv"
 
+# Rows per transaction
+CHUNK_SIZE = 50000
+
+REQUIRED_COLS = ['timestamp', 'temp', 'ph', 'do', 'turbidity', 'status']
+
+
+def init_migration_state(conn):
+    """Create the checkpoint table"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migration_state (
+            source TEXT PRIMARY KEY,
+            rows_done INTEGER NOT NULL,
+            indexes_deferred INTEGER DEFAULT 0,
+            completed INTEGER DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def load_checkpoint(conn, source):
+    """Return (rows_done, indexes_deferred, completed) for a source file"""
+    row = conn.execute(
+        "SELECT rows_done, indexes_deferred, completed FROM migration_state WHERE source = ?",
+        (source,)
+    ).fetchone()
+    return tuple(row) if row else (0, 0, 0)
+
+
+def save_checkpoint(conn, source, rows_done, indexes_deferred=0, completed=0):
+    """Record progress (call inside the chunk's transaction)"""
+    conn.execute("""
+        INSERT INTO migration_state (source, rows_done, indexes_deferred, completed, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source) DO UPDATE SET
+            rows_done = excluded.rows_done,
+            indexes_deferred = excluded.indexes_deferred,
+            completed = excluded.completed,
+            updated_at = excluded.updated_at
+    """, (source, rows_done, indexes_deferred, completed))
+
+
+def chunk_to_rows(chunk):
+    """Convert a CSV chunk to tuples in SENSOR_COLUMNS order (NaN -> NULL)"""
+    chunk = chunk.reindex(columns=list(SENSOR_COLUMNS)).astype(object)
+    chunk = chunk.where(chunk.notna(), None)
+    return list(chunk.itertuples(index=False, name=None))
+
 
-def migrate_csv_to_sqlite():
+def insert_chunk(conn, rows):
+    """
+    Insert one chunk inside the caller's open transaction; if executemany()
+    fails, retry row by row so a single bad record does not drop the whole
+    chunk. Returns (success, failed).
+    """
+    conn.execute("SAVEPOINT chunk")
+    try:
+        insert_sensor_batch(rows, conn=conn)
+        conn.execute("RELEASE chunk")
+        return len(rows), 0
+    except Exception as e:
+        # Undo the partially applied batch before the row-by-row retry
+        conn.execute("ROLLBACK TO chunk")
+        conn.execute("RELEASE chunk")
+        print(f"\n⚠️  Batch insert failed ({e}), retrying row by row...")
+
+    success = failed = 0
+    for row in rows:
+        try:
+            insert_sensor_batch([row], conn=conn)
+            success += 1
+        except Exception as e:
+            failed += 1
+            if failed <= 5:  # Only show first 5 errors
+                print(f"\n❌ Error at row {row[0]}: {e}")
+    return success, failed
+
+
+def migrate_csv_to_sqlite(csv_path=CSV_PATH, chunk_size=CHUNK_SIZE,
+                          defer_indexes=False, restart=False):
     """Migrate all data from CSV to SQLite"""
-    
+
     print("🔄 Starting migration from CSV to SQLite...")
-    
+
     # Initialize database
     init_database()
-    
+
     # Check if CSV exists
-    if not CSV_PATH.exists():
-        print(f"⚠️  CSV file not found: {CSV_PATH}")
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        print(f"⚠️  CSV file not found: {csv_path}")
         print("   No data to migrate.")
         return
-    
-    # Read CSV
-    print(f"📂 Reading CSV: {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH)
-    print(f"   Found {len(df)} records")
-    
-    if len(df) == 0:
-        print("   No data to migrate.")
-        return
-    
-    # Validate columns
-    required_cols = ['timestamp', 'temp', 'ph', 'do', 'turbidity', 'status']
-    missing = [col for col in required_cols if col not in df.columns]
+
+    # Validate columns from the header only
+    print(f"📂 Reading CSV: {csv_path}")
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    missing = [col for col in REQUIRED_COLS if col not in columns]
     if missing:
         print(f"❌ Missing columns: {missing}")
         return
-    
+
+    conn = get_connection()
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MB page cache during the load
+    init_migration_state(conn)
+
+    source = str(csv_path.resolve())
+    if restart:
+        conn.execute("DELETE FROM migration_state WHERE source = ?", (source,))
+        conn.commit()
+
+    rows_done, indexes_deferred, completed = load_checkpoint(conn, source)
+    if rows_done:
+        print(f"⏩ Resuming after {rows_done:,} already migrated rows")
+
+    if defer_indexes and not indexes_deferred:
+        print("🗂️  Dropping indexes (rebuilt at the end)...")
+        drop_indexes(conn)
+        indexes_deferred = 1
+        save_checkpoint(conn, source, rows_done, indexes_deferred)
+        conn.commit()
+
     # Insert data
     print("\n💾 Inserting data into SQLite...")
     success = 0
     failed = 0
-    
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Migrating"):
-        try:
-            data = {
-                'timestamp': row['timestamp'],
-                'temp': row.get('temp'),
-                'ph': row.get('ph'),
-                'do': row.get('do'),
-                'turbidity': row.get('turbidity'),
-                'pred_temp': row.get('pred_temp'),
-                'pred_ph': row.get('pred_ph'),
-                'pred_do': row.get('pred_do'),
-                'pred_turb': row.get('pred_turb'),
-                'sensor_risk': row.get('sensor_risk'),
-                'pred_risk': row.get('pred_risk'),
-                'status': row.get('status')
-            }
-            insert_sensor_data(data)
-            success += 1
-        except Exception as e:
-            failed += 1
-            if failed <= 5:  # Only show first 5 errors
-                print(f"\n❌ Error at row {idx}: {e}")
-    
+    start = time.perf_counter()
+
+    reader = pd.read_csv(
+        csv_path,
+        chunksize=chunk_size,
+        skiprows=range(1, rows_done + 1) if rows_done else None
+    )
+
+    try:
+        with tqdm(desc="Migrating", unit="rows", initial=rows_done) as progress:
+            for chunk in reader:
+                rows = chunk_to_rows(chunk)
+                chunk_start = time.perf_counter()
+
+                # Rows and checkpoint commit together: a crash never double-inserts.
+                # Explicit BEGIN: otherwise SAVEPOINT opens (and RELEASE commits)
+                # its own transaction before the checkpoint is written
+                with conn:
+                    conn.execute("BEGIN")
+                    ok, bad = insert_chunk(conn, rows)
+                    save_checkpoint(conn, source, rows_done + len(rows), indexes_deferred)
+                rows_done += len(rows)
+
+                success += ok
+                failed += bad
+                elapsed = time.perf_counter() - chunk_start
+                progress.update(len(rows))
+                progress.set_postfix(rows_per_sec=f"{len(rows) / max(elapsed, 1e-9):,.0f}")
+    except KeyboardInterrupt:
+        conn.close()
+        print(f"\n⏸️  Interrupted after {rows_done:,} rows. Run again to resume.")
+        return
+
+    if indexes_deferred:
+        print("\n🗂️  Rebuilding indexes...")
+        index_start = time.perf_counter()
+        create_indexes(conn)
+        print(f"   Done in {time.perf_counter() - index_start:.1f}s")
+
+    save_checkpoint(conn, source, rows_done, 0, completed=1)
+    conn.commit()
+    conn.close()
+
+    total_time = time.perf_counter() - start
+
     print(f"\n✅ Migration completed!")
     print(f"   Success: {success}")
     print(f"   Failed: {failed}")
-    
+    print(f"   Time: {total_time:.1f}s ({success / max(total_time, 1e-9):,.0f} rows/sec)")
+
     # Show database info
     info = get_table_info()
     print(f"\n📊 Database Statistics:")
@@ -83,4 +212,16 @@ def migrate_csv_to_sqlite():
 
 
 if __name__ == "__main__":
-    migrate_csv_to_sqlite()
+    parser = argparse.ArgumentParser(description="Migrate data_log.csv into SQLite")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="Source CSV file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="Drop indexes during the load and rebuild them at the end")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress")
+    args = parser.parse_args()
+    migrate_csv_to_sqlite(
+        csv_path=args.csv,
+        chunk_size=args.chunk_size,
+        defer_indexes=args.defer_indexes,
+        restart=args.restart
+    )
@@ -0,0 +1,684 @@
+# database/storage.py
+"""
+Pluggable storage backends for sensor_logs
+
+Every backend exposes the same small interface (insert_batch, latest, range,
+aggregates, stats, retention), so the gateway, dashboards and benchmark can
+switch storage engine with STORAGE_BACKEND instead of editing SQL.
+
+    from storage import get_backend
+    backend = get_backend("sqlite")        # or "duckdb"
+    backend.insert_batch([row])
+    df = backend.latest(100)
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import db_config
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import db_config
+
+
+class StorageBackend(ABC):
+    """Common interface for sensor_logs storage engines"""
+
+    name = "base"
+
+    def init(self):
+        """Create schema if needed"""
+
+    @abstractmethod
+    def insert_batch(self, rows):
+        """Insert rows (dicts keyed by db_config.SENSOR_COLUMNS), return count"""
+
+    @abstractmethod
+    def insert_reading(self, row, forecast=None):
+        """Insert one reading (+ its forecast row, see db_config.insert_reading) atomically, return its id"""
+
+    @abstractmethod
+    def latest(self, limit=100):
+        """Latest N records, newest first"""
+
+    @abstractmethod
+    def after(self, last_id, limit=None):
+        """Records with id > last_id in insert order"""
+
+    def latest_arrow(self, limit=100):
+        """latest() as an Arrow table with db_config.sensor_arrow_schema() types"""
+        return _pandas_to_arrow(self.latest(limit))
+
+    def after_arrow(self, last_id, limit=None):
+        """after() as an Arrow table with db_config.sensor_arrow_schema() types"""
+        return _pandas_to_arrow(self.after(last_id, limit))
+
+    @abstractmethod
+    def id_bounds(self):
+        """(min id, max id), (None, None) when empty"""
+
+    def data_version(self):
+        """Cheap token that changes when another connection commits (None = unknown)"""
+        return None
+
+    @abstractmethod
+    def range(self, start_time=None, end_time=None):
+        """Records with start_time <= timestamp <= end_time (None = open), oldest first"""
+
+    def range_arrow(self, start_time=None, end_time=None, device_id=None):
+        """range() of one / every device as an Arrow table, ordered by (device_id, timestamp, id)"""
+        df = self.range(start_time, end_time)
+        if device_id is not None:
+            df = df[df["device_id"] == device_id]
+        return _pandas_to_arrow(df.sort_values(["device_id", "timestamp", "id"], kind="stable"))
+
+    @abstractmethod
+    def update_scores(self, rows):
+        """Bulk UPDATE of db_config.RESCORE_COLUMNS by id; rows are tuples (*RESCORE_COLUMNS, id)"""
+
+    @abstractmethod
+    def range_version(self, start_time, end_time):
+        """(count, max id) of a time range: cache key for results computed from it"""
+
+    @abstractmethod
+    def aggregates(self, start_time=None, end_time=None, bucket_minutes=60):
+        """Per-bucket count / mean / min / max (same columns as db_config.get_aggregates)"""
+
+    @abstractmethod
+    def stats(self):
+        """dict with total_records, first/last timestamp, size_mb and risk distribution"""
+
+    @abstractmethod
+    def device_latest(self, device_id=None):
+        """Latest reading + message_count / msg_rate_per_min per device (same columns as db_config)"""
+
+    @abstractmethod
+    def heartbeat(self, gateway_id, started_at, **status):
+        """UPSERT the gateway's liveness row (status: see db_config.update_heartbeat)"""
+
+    @abstractmethod
+    def gateway_health(self):
+        """Heartbeat rows, newest beat first"""
+
+    @abstractmethod
+    def insert_forecasts(self, rows):
+        """INSERT OR REPLACE multi-horizon forecast rows by reading id (see db_config.forecast_params), return count"""
+
+    @abstractmethod
+    def forecasts(self, device_id=None, start_time=None, end_time=None, limit=None):
+        """Forecast rows decoded to {target}_{h}h columns (same as db_config.get_forecasts)"""
+
+    @abstractmethod
+    def retention(self, days, batch_size=db_config.MAINTENANCE_DELETE_BATCH):
+        """Delete at most batch_size rows older than N days, return deleted count"""
+
+    def maintenance(self, days, batch_size=db_config.MAINTENANCE_DELETE_BATCH,
+                    vacuum_pages=db_config.MAINTENANCE_VACUUM_PAGES):
+        """One bounded maintenance step (default: retention only, same keys as db_config)"""
+        start = time.perf_counter()
+        deleted = self.retention(days, batch_size) if days else 0
+        return {
+            'deleted': deleted,
+            'delete_blocked_ms': round((time.perf_counter() - start) * 1000, 2),
+            'pages_freed': 0,
+            'vacuum_blocked_ms': 0.0,
+            'wal_frames': 0,
+            'wal_checkpointed': 0,
+            'checkpoint_ms': 0.0,
+            'pending': deleted >= batch_size,
+        }
+
+    @abstractmethod
+    def export(self, output_path, fmt=None, **filters):
+        """
+        Stream sensor_logs rows (newest first) to a file, return row count
+
+        fmt: one of db_config.EXPORT_FORMATS (default: from the file suffix);
+        filters: db_config.history_filter() keywords
+        """
+
+    def export_bytes(self, fmt="csv.gz", **filters):
+        """export() into a temp file, returned as bytes (download buttons)"""
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / f"export.{fmt}"
+            self.export(path, fmt, **filters)
+            return path.read_bytes()
+
+    def close(self):
+        """Release resources"""
+
+
+def _pandas_to_arrow(df):
+    import pyarrow as pa
+    return db_config.conform_arrow(pa.Table.from_pandas(df, preserve_index=False))
+
+
+class SQLiteBackend(StorageBackend):
+    """The existing db_config SQLite implementation (database/iot_data.db)"""
+
+    name = "sqlite"
+
+    def __init__(self):
+        self._version_conn = None
+        self._lock = threading.Lock()
+
+    def init(self):
+        db_config.init_database()
+
+    def after(self, last_id, limit=None):
+        return db_config.get_rows_after(last_id, limit)
+
+    def after_arrow(self, last_id, limit=None):
+        return db_config.get_rows_after_arrow(last_id, limit)
+
+    def id_bounds(self):
+        return db_config.get_id_bounds()
+
+    def data_version(self):
+        # PRAGMA data_version only moves when *other* connections commit,
+        # so it needs one long-lived connection that never writes
+        with self._lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(db_config.DB_PATH, check_same_thread=False)
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+
+    def insert_batch(self, rows):
+        return db_config.insert_sensor_batch(rows)
+
+    def insert_reading(self, row, forecast=None):
+        return db_config.insert_reading(row, forecast)
+
+    def latest(self, limit=100):
+        return db_config.get_latest_data(int(limit))
+
+    def latest_arrow(self, limit=100):
+        return db_config.get_latest_arrow(int(limit))
+
+    def range(self, start_time=None, end_time=None):
+        return db_config.get_data_by_timerange(
+            str(start_time) if start_time is not None else "0000-01-01 00:00:00",
+            str(end_time) if end_time is not None else "9999-12-31 23:59:59"
+        )
+
+    def range_arrow(self, start_time=None, end_time=None, device_id=None):
+        return db_config.get_range_arrow(device_id, start_time, end_time)
+
+    def update_scores(self, rows):
+        return db_config.update_scores(rows)
+
+    def range_version(self, start_time, end_time):
+        return db_config.get_range_version(start_time, end_time)
+
+    def aggregates(self, start_time=None, end_time=None, bucket_minutes=60):
+        return db_config.get_aggregates(start_time, end_time, bucket_minutes)
+
+    def stats(self):
+        return {**db_config.get_table_info(), 'risk': db_config.get_risk_statistics()}
+
+    def device_latest(self, device_id=None):
+        return db_config.get_device_latest(device_id)
+
+    def heartbeat(self, gateway_id, started_at, **status):
+        db_config.update_heartbeat(gateway_id, started_at, **status)
+
+    def gateway_health(self):
+        return db_config.get_gateway_health()
+
+    def insert_forecasts(self, rows):
+        return db_config.insert_forecast_batch(rows)
+
+    def forecasts(self, device_id=None, start_time=None, end_time=None, limit=None):
+        return db_config.get_forecasts(device_id, start_time, end_time, limit)
+
+    def retention(self, days, batch_size=db_config.MAINTENANCE_DELETE_BATCH):
+        deleted, _ = db_config.delete_expired_batch(days, batch_size)
+        return deleted
+
+    def export(self, output_path, fmt=None, **filters):
+        where, params = db_config.history_filter(**filters)
+        return db_config.stream_export(output_path, fmt, where=" AND ".join(where) or None, params=params)
+
+    def maintenance(self, days, batch_size=db_config.MAINTENANCE_DELETE_BATCH,
+                    vacuum_pages=db_config.MAINTENANCE_VACUUM_PAGES):
+        return db_config.run_maintenance_step(days, batch_size, vacuum_pages)
+
+
+class DuckDBBackend(StorageBackend):
+    """
+    Embedded DuckDB file (columnar, vectorized scans and aggregates)
+
+    DuckDB allows a single writing process per file: the gateway holds the
+    connection, other processes can only open it once the gateway is stopped.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path=None):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("DuckDB backend requires: pip install duckdb")
+        self.path = Path(path) if path else db_config.DB_DIR / "iot_data.duckdb"
+        self._conn = duckdb.connect(str(self.path))
+        self._lock = threading.Lock()
+
+    def init(self):
+        with self._lock:
+            self._conn.execute("CREATE SEQUENCE IF NOT EXISTS sensor_logs_id")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sensor_logs (
+                    id BIGINT DEFAULT nextval('sensor_logs_id'),
+                    timestamp TIMESTAMP NOT NULL,
+                    temp DOUBLE,
+                    ph DOUBLE,
+                    "do" DOUBLE,
+                    turbidity DOUBLE,
+                    pred_temp DOUBLE,
+                    pred_ph DOUBLE,
+                    pred_do DOUBLE,
+                    pred_turb DOUBLE,
+                    sensor_risk VARCHAR,
+                    pred_risk VARCHAR,
+                    status VARCHAR,
+                    created_at TIMESTAMP DEFAULT current_timestamp,
+                    device_id VARCHAR DEFAULT 'default'
+                )
+            """)
+            self._conn.execute(
+                "ALTER TABLE sensor_logs ADD COLUMN IF NOT EXISTS device_id VARCHAR DEFAULT 'default'"
+            )
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {db_config.HEARTBEAT_TABLE} (
+                    gateway_id VARCHAR PRIMARY KEY,
+                    started_at TIMESTAMP,
+                    beat_at TIMESTAMP,
+                    last_message_at TIMESTAMP,
+                    messages BIGINT,
+                    errors BIGINT,
+                    mqtt_connected BOOLEAN,
+                    host VARCHAR,
+                    pid INTEGER
+                )
+            """)
+            exists = self._conn.execute(
+                "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [db_config.DEVICE_LATEST_TABLE]
+            ).fetchone()
+            if not exists:
+                self._conn.execute(f"""
+                    CREATE TABLE {db_config.DEVICE_LATEST_TABLE} (
+                        device_id VARCHAR PRIMARY KEY,
+                        id BIGINT,
+                        timestamp TIMESTAMP,
+                        temp DOUBLE,
+                        ph DOUBLE,
+                        "do" DOUBLE,
+                        turbidity DOUBLE,
+                        pred_temp DOUBLE,
+                        pred_ph DOUBLE,
+                        pred_do DOUBLE,
+                        pred_turb DOUBLE,
+                        sensor_risk VARCHAR,
+                        pred_risk VARCHAR,
+                        status VARCHAR,
+                        received_at TIMESTAMP,
+                        message_count BIGINT NOT NULL DEFAULT 0,
+                        avg_interval_s DOUBLE,
+                        msg_rate_per_min DOUBLE
+                    )
+                """)
+                self._fill_device_latest()
+            columns = {row[0] for row in self._conn.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+                [db_config.FORECAST_TABLE]
+            ).fetchall()}
+            if columns and "id" not in columns:
+                # Keyed by (device_id, timestamp) before: re-key on the reading id
+                self._conn.execute(f"ALTER TABLE {db_config.FORECAST_TABLE} RENAME TO {db_config.FORECAST_TABLE}_old")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {db_config.FORECAST_TABLE} (
+                    id BIGINT PRIMARY KEY,
+                    device_id VARCHAR NOT NULL,
+                    timestamp TIMESTAMP NOT NULL,
+                    horizons VARCHAR NOT NULL,
+                    forecast BLOB NOT NULL,
+                    eta_hours DOUBLE,
+                    eta_param VARCHAR
+                )
+            """)
+            if columns and "id" not in columns:
+                self._conn.execute(f"""
+                    INSERT OR IGNORE INTO {db_config.FORECAST_TABLE}
+                    SELECT MAX(s.id), f.device_id, f.timestamp, f.horizons, f.forecast, f.eta_hours, f.eta_param
+                    FROM {db_config.FORECAST_TABLE}_old f
+                    JOIN sensor_logs s ON s.device_id = f.device_id AND s.timestamp = f.timestamp
+                    GROUP BY ALL
+                """)
+                self._conn.execute(f"DROP TABLE {db_config.FORECAST_TABLE}_old")
+
+    def insert_batch(self, rows):
+        frame = pd.DataFrame(
+            [[row.get(col) for col in db_config.SENSOR_COLUMNS] if isinstance(row, dict) else list(row)
+             for row in rows],
+            columns=list(db_config.SENSOR_COLUMNS)
+        )
+        if frame.empty:
+            return 0
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+        frame["device_id"] = frame["device_id"].fillna(db_config.DEFAULT_DEVICE_ID)
+        columns = ", ".join(f'"{col}"' for col in db_config.SENSOR_COLUMNS)  # "do" is a keyword
+        with self._lock:
+            self._conn.begin()
+            try:
+                # Bulk append straight from the DataFrame (no per-row statements)
+                self._conn.register("incoming", frame)
+                inserted = self._conn.execute(
+                    f"INSERT INTO sensor_logs ({columns}) SELECT {columns} FROM incoming RETURNING id, {columns}"
+                ).fetchall()
+                self._conn.unregister("incoming")
+                self._update_device_latest(sorted(inserted))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return len(frame)
+
+    def _update_device_latest(self, rows):
+        """
+        Apply (id, *SENSOR_COLUMNS) rows in id order as the SQLite trigger
+        does (same message_count / avg_interval_s), one write per device
+        """
+        if not rows:
+            return
+        table = db_config.DEVICE_LATEST_TABLE
+        reading = [col for col in db_config.SENSOR_COLUMNS if col != "device_id"]
+        devices = sorted({row[-1] for row in rows})
+        current = self._conn.execute(
+            f"SELECT * FROM {table} WHERE device_id IN ({', '.join('?' * len(devices))})", devices
+        ).df()
+        state = {record["device_id"]: record for record in current.to_dict("records")}
+        now = pd.Timestamp.now()
+        for reading_id, *values in rows:
+            new = dict(zip(reading, values[:-1]), id=reading_id, received_at=now)
+            old = state.get(values[-1])
+            if old is None:
+                state[values[-1]] = {"device_id": values[-1], **new, "message_count": 1,
+                                     "avg_interval_s": None, "msg_rate_per_min": None}
+                continue
+            interval = (pd.Timestamp(new["timestamp"]) - pd.Timestamp(old["timestamp"])).total_seconds()
+            avg = db_config.next_avg_interval(
+                None if pd.isna(old["avg_interval_s"]) else old["avg_interval_s"], old["message_count"], interval
+            )
+            # Late (back-filled) readings are counted but do not replace the latest one
+            if interval >= 0:
+                old.update(new)
+            old.update(received_at=now, message_count=old["message_count"] + 1, avg_interval_s=avg,
+                       msg_rate_per_min=60.0 / avg if avg else None)
+        frame = pd.DataFrame(list(state.values()), columns=current.columns)
+        self._conn.register("latest_rows", frame)
+        self._conn.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM latest_rows")
+        self._conn.unregister("latest_rows")
+
+    def _fill_device_latest(self):
+        """First fill from sensor_logs (as db_config._fill_device_latest: mean interval, then the moving average)"""
+        self._conn.execute(f"""
+            INSERT INTO {db_config.DEVICE_LATEST_TABLE}
+            SELECT device_id,
+                   arg_max(id, (timestamp, id)) AS id,
+                   {", ".join(f'arg_max("{col}", (timestamp, id)) AS "{col}"' for col in db_config.SENSOR_COLUMNS
+                              if col != "device_id")},
+                   arg_max(created_at, (timestamp, id)) AS received_at,
+                   COUNT(*) AS message_count,
+                   epoch(MAX(timestamp) - MIN(timestamp)) / NULLIF(COUNT(*) - 1, 0) AS avg_interval_s,
+                   60.0 * (COUNT(*) - 1) / NULLIF(epoch(MAX(timestamp) - MIN(timestamp)), 0) AS msg_rate_per_min
+            FROM sensor_logs
+            GROUP BY device_id
+        """)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, list(params)).df()
+
+    def _query_arrow(self, sql, params=()):
+        with self._lock:
+            result = self._conn.execute(sql, list(params))
+            # to_arrow_table() replaces the deprecated fetch_arrow_table() in newer DuckDB
+            fetch = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+            return db_config.conform_arrow(fetch())
+
+    def latest(self, limit=100):
+        return self._query("SELECT * FROM sensor_logs ORDER BY timestamp DESC LIMIT ?", (int(limit),))
+
+    def after(self, last_id, limit=None):
+        return self._query(self._after_sql(limit), (int(last_id),))
+
+    def latest_arrow(self, limit=100):
+        return self._query_arrow("SELECT * FROM sensor_logs ORDER BY timestamp DESC LIMIT ?", (int(limit),))
+
+    def after_arrow(self, last_id, limit=None):
+        return self._query_arrow(self._after_sql(limit), (int(last_id),))
+
+    @staticmethod
+    def _after_sql(limit):
+        return f"""
+            SELECT * FROM sensor_logs WHERE id > ? ORDER BY id ASC
+            {"LIMIT " + str(int(limit)) if limit else ""}
+        """
+
+    def id_bounds(self):
+        with self._lock:
+            return tuple(self._conn.execute("SELECT MIN(id), MAX(id) FROM sensor_logs").fetchone())
+
+    @staticmethod
+    def _time_filter(start_time, end_time):
+        where, params = [], []
+        if start_time is not None:
+            where.append("timestamp >= CAST(? AS TIMESTAMP)")
+            params.append(str(start_time))
+        if end_time is not None:
+            where.append("timestamp <= CAST(? AS TIMESTAMP)")
+            params.append(str(end_time))
+        return ("WHERE " + " AND ".join(where) if where else ""), params
+
+    def range(self, start_time=None, end_time=None):
+        where, params = self._time_filter(start_time, end_time)
+        return self._query(f"SELECT * FROM sensor_logs {where} ORDER BY timestamp ASC", params)
+
+    def range_arrow(self, start_time=None, end_time=None, device_id=None):
+        where, params = self._time_filter(start_time, end_time)
+        if device_id is not None:
+            where = f"{where} AND device_id = ?" if where else "WHERE device_id = ?"
+            params = [*params, device_id]
+        return self._query_arrow(f"SELECT * FROM sensor_logs {where} ORDER BY device_id, timestamp, id", params)
+
+    def update_scores(self, rows):
+        frame = pd.DataFrame(list(rows), columns=[*db_config.RESCORE_COLUMNS, "id"])
+        if frame.empty:
+            return 0
+        assignments = ", ".join(f"{col} = u.{col}" for col in db_config.RESCORE_COLUMNS)
+        with self._lock:
+            # One set-based UPDATE joined on id instead of a statement per row
+            self._conn.register("scores", frame)
+            self._conn.execute(f"UPDATE sensor_logs SET {assignments} FROM scores u WHERE sensor_logs.id = u.id")
+            # device_latest rows take the new scores of the reading they point at (as in SQLite)
+            self._conn.execute(f"""
+                UPDATE {db_config.DEVICE_LATEST_TABLE} SET {assignments}
+                FROM scores u WHERE {db_config.DEVICE_LATEST_TABLE}.id = u.id
+            """)
+            self._conn.unregister("scores")
+        return len(frame)
+
+    def range_version(self, start_time, end_time):
+        where, params = self._time_filter(start_time, end_time)
+        with self._lock:
+            return tuple(self._conn.execute(f"SELECT COUNT(*), MAX(id) FROM sensor_logs {where}", params).fetchone())
+
+    def aggregates(self, start_time=None, end_time=None, bucket_minutes=60):
+        where, params = self._time_filter(start_time, end_time)
+        return self._query(f"""
+            SELECT
+                time_bucket(INTERVAL '{int(bucket_minutes)} minutes', timestamp, TIMESTAMP '1970-01-01') AS bucket,
+                COUNT(*) AS count,
+                AVG(temp) AS temp_mean, MIN(temp) AS temp_min, MAX(temp) AS temp_max,
+                AVG(ph) AS ph_mean, MIN(ph) AS ph_min, MAX(ph) AS ph_max,
+                AVG("do") AS do_mean, MIN("do") AS do_min, MAX("do") AS do_max,
+                AVG(turbidity) AS turbidity_mean, MIN(turbidity) AS turbidity_min, MAX(turbidity) AS turbidity_max,
+                AVG(pred_temp) AS pred_temp_mean, AVG(pred_ph) AS pred_ph_mean,
+                AVG(pred_do) AS pred_do_mean, AVG(pred_turb) AS pred_turb_mean,
+                COUNT(*) FILTER (WHERE status = 'Danger') AS danger_count
+            FROM sensor_logs
+            {where}
+            GROUP BY bucket
+            ORDER BY bucket ASC
+        """, params)
+
+    def stats(self):
+        with self._lock:
+            total, first, last = self._conn.execute(
+                "SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM sensor_logs"
+            ).fetchone()
+            risk = self._conn.execute("""
+                SELECT status, COUNT(*) AS count,
+                       ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS percentage
+                FROM sensor_logs GROUP BY status ORDER BY count DESC
+            """).fetchall()
+        return {
+            'total_records': total,
+            'first_timestamp': str(first) if first else None,
+            'last_timestamp': str(last) if last else None,
+            'db_size_mb': round(self.path.stat().st_size / (1024 * 1024), 2),
+            'risk': [{'status': s, 'count': c, 'percentage': p} for s, c, p in risk],
+        }
+
+    def device_latest(self, device_id=None):
+        # No triggers in DuckDB: the insert methods keep the table up to date
+        where = "WHERE device_id = ?" if device_id is not None else ""
+        return self._query(
+            f"SELECT * FROM {db_config.DEVICE_LATEST_TABLE} {where} ORDER BY device_id",
+            () if device_id is None else (device_id,)
+        )
+
+    def heartbeat(self, gateway_id, started_at, last_message_at=None, messages=0, errors=0,
+                  mqtt_connected=None, host=None, pid=None):
+        with self._lock:
+            self._conn.execute(f"""
+                INSERT OR REPLACE INTO {db_config.HEARTBEAT_TABLE}
+                VALUES (?, ?, current_localtimestamp(), ?, ?, ?, ?, ?, ?)
+            """, [gateway_id, started_at, last_message_at, int(messages), int(errors),
+                  mqtt_connected, host, pid])
+
+    def gateway_health(self):
+        return self._query(f"SELECT * FROM {db_config.HEARTBEAT_TABLE} ORDER BY beat_at DESC")
+
+    def insert_reading(self, row, forecast=None):
+        values = dict(zip(db_config.SENSOR_COLUMNS, db_config.sensor_params(row)))
+        values["device_id"] = values["device_id"] or db_config.DEFAULT_DEVICE_ID
+        columns = ", ".join(f'"{col}"' for col in db_config.SENSOR_COLUMNS)
+        with self._lock:
+            self._conn.begin()
+            try:
+                reading_id = self._conn.execute(
+                    f"INSERT INTO sensor_logs ({columns}) VALUES ({', '.join('?' * len(values))}) RETURNING id",
+                    [values[col] for col in db_config.SENSOR_COLUMNS]
+                ).fetchone()[0]
+                self._update_device_latest([(reading_id, *(values[col] for col in db_config.SENSOR_COLUMNS))])
+                if forecast is not None:
+                    self._conn.execute(db_config.FORECAST_INSERT_SQL, list(db_config.forecast_params({
+                        **forecast, "id": reading_id,
+                        "device_id": values["device_id"], "timestamp": values["timestamp"],
+                    })))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return reading_id
+
+    def insert_forecasts(self, rows):
+        params = [list(db_config.forecast_params(row)) for row in rows]
+        if not params:
+            return 0
+        with self._lock:
+            self._conn.executemany(db_config.FORECAST_INSERT_SQL, params)
+        return len(params)
+
+    def forecasts(self, device_id=None, start_time=None, end_time=None, limit=None):
+        where, params = self._time_filter(start_time, end_time)
+        if device_id is not None:
+            where = f"{where} AND device_id = ?" if where else "WHERE device_id = ?"
+            params = [*params, device_id]
+        df = self._query(f"""
+            SELECT * FROM {db_config.FORECAST_TABLE} {where} ORDER BY timestamp, id
+            {f"LIMIT {int(limit)}" if limit else ""}
+        """, params)
+        return db_config.decode_forecasts(df)
+
+    def retention(self, days, batch_size=db_config.MAINTENANCE_DELETE_BATCH):
+        # Naive local time like the stored timestamps (current_timestamp is a TIMESTAMPTZ)
+        cutoff = f"localtimestamp - INTERVAL '{int(days)} days'"
+        with self._lock:
+            deleted = self._conn.execute(f"""
+                DELETE FROM sensor_logs WHERE id IN (
+                    SELECT id FROM sensor_logs
+                    WHERE timestamp < {cutoff}
+                    ORDER BY timestamp
+                    LIMIT {int(batch_size)}
+                )
+                RETURNING id
+            """).df()
+            # No triggers in DuckDB: forecasts of the deleted readings go in the same step
+            if not deleted.empty:
+                self._conn.register("deleted", deleted)
+                self._conn.execute(f"DELETE FROM {db_config.FORECAST_TABLE} WHERE id IN (SELECT id FROM deleted)")
+                self._conn.unregister("deleted")
+            return len(deleted)
+
+    # COPY options per db_config.EXPORT_FORMATS (json = one object per line)
+    COPY_OPTIONS = {
+        "csv": "FORMAT csv, HEADER",
+        "csv.gz": "FORMAT csv, HEADER, COMPRESSION gzip",
+        "ndjson": "FORMAT json",
+        "parquet": "FORMAT parquet",
+    }
+
+    def export(self, output_path, fmt=None, **filters):
+        fmt = db_config._export_format(output_path, fmt)
+        where, params = db_config.history_filter(**filters)
+        query = f"SELECT * FROM sensor_logs {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY timestamp DESC"
+        path = str(output_path).replace("'", "''")
+        with self._lock:
+            # COPY streams from the scan to the file in DuckDB, nothing goes through pandas
+            row = self._conn.execute(f"COPY ({query}) TO '{path}' ({self.COPY_OPTIONS[fmt]})", params).fetchone()
+        return int(row[0]) if row else 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+}
+
+
+def get_backend(name="sqlite", **kwargs):
+    """Create a storage backend by name (see BACKENDS)"""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {name} (use one of {list(BACKENDS)})")
+    return backend_cls(**kwargs)
@@ -0,0 +1,93 @@
+# database/test_history.py
+"""
+History page: keyset pagination where a page ends inside a run of equal
+timestamps, and count_history() (rollup + partial hours) against COUNT(*)
+"""
+
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+import db_config
+
+PAGE_SIZE = 4
+
+
+def make_rows():
+    """Readings every 7 minutes over a few hours, plus 10 at the same second"""
+    times = list(pd.date_range("2025-01-01 09:00", "2025-01-01 12:30", freq="7min"))
+    times += [pd.Timestamp("2025-01-01 10:30:00")] * 10
+    return [{
+        "device_id": f"pond-{i % 2}",
+        "timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"),
+        "temp": 25.0 + i % 10, "ph": 7.5, "do": 6.5, "turbidity": 15.0,
+        "status": ["Safe", "Warning", "Danger"][i % 3],
+    } for i, ts in enumerate(times)]
+
+
+def walk_pages(**kwargs):
+    """Every page of get_history_page() until the cursor runs out"""
+    ids, before, pages = [], None, 0
+    while True:
+        page, before = db_config.get_history_page(before=before, page_size=PAGE_SIZE, **kwargs)
+        pages += 1
+        ids += [int(i) for i in (page["id"].to_pylist() if kwargs.get("as_arrow") else page["id"])]
+        assert len(ids) <= 1000, "cursor does not advance"
+        if before is None:
+            return ids, pages
+
+
+def expected(where="1", params=()):
+    conn = db_config.get_connection()
+    try:
+        return [row[0] for row in conn.execute(
+            f"SELECT id FROM sensor_logs WHERE {where} ORDER BY timestamp DESC, id DESC", params
+        )]
+    finally:
+        conn.close()
+
+
+def test_history():
+    print("=" * 60)
+    print("🧪 History: keyset pages and counts")
+    print("=" * 60)
+
+    original_path = db_config.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        db_config.DB_PATH = Path(tmp) / "history.db"
+        try:
+            db_config.init_database()
+            db_config.insert_sensor_batch(make_rows())
+
+            # 10 equal timestamps with PAGE_SIZE 4: at least two page boundaries fall inside the run
+            for as_arrow in (False, True):
+                ids, pages = walk_pages(as_arrow=as_arrow)
+                assert ids == expected(), ids
+                print(f"   ✅ {'Arrow' if as_arrow else 'DataFrame'}: {len(ids)} rows in {pages} pages, none lost or repeated")
+
+            filters = dict(device_id="pond-1", start_time="2025-01-01 09:20:00",
+                           end_time="2025-01-01 11:40:00", statuses=["Safe", "Danger"])
+            where = "device_id = ? AND timestamp BETWEEN ? AND ? AND status IN (?, ?)"
+            params = ("pond-1", "2025-01-01 09:20:00", "2025-01-01 11:40:00", "Safe", "Danger")
+            ids, _ = walk_pages(**filters)
+            assert ids == expected(where, params)
+
+            # Partial first / last hour on the index, whole hours from the rollup
+            for kwargs, where_, params_ in (
+                ({}, "1", ()),
+                (filters, where, params),
+                (dict(start_time="2025-01-01 10:30:00", end_time="2025-01-01 10:30:00"),
+                 "timestamp = ?", ("2025-01-01 10:30:00",)),
+            ):
+                assert db_config.count_history(**kwargs) == (len(expected(where_, params_)), True), kwargs
+            # Value ranges are not in the rollup: upper bound, flagged inexact
+            count, exact = db_config.count_history(value_ranges={"temp": (25.0, 27.0)})
+            assert not exact and count >= len(expected("temp BETWEEN 25 AND 27"))
+            print("   ✅ count_history matches COUNT(*) for device / time / status filters")
+        finally:
+            db_config.DB_PATH = original_path
+
+
+if __name__ == "__main__":
+    test_history()
@@ -0,0 +1,68 @@
+# database/test_migration.py
+"""
+CSV -> SQLite migration resume: a crash between a chunk's rows and its
+checkpoint must not insert the chunk twice
+"""
+
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+import db_config
+import migrate_csv_to_db
+
+
+class Crash(Exception):
+    pass
+
+
+def count_rows():
+    conn = db_config.get_connection()
+    try:
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT timestamp) FROM sensor_logs").fetchone()
+    finally:
+        conn.close()
+
+
+def test_migration_resume():
+    print("=" * 60)
+    print("🧪 Migration resume after a crash before the checkpoint")
+    print("=" * 60)
+
+    original_path, original_checkpoint = db_config.DB_PATH, migrate_csv_to_db.save_checkpoint
+
+    def crash_on_second_chunk(conn, source, rows_done, *args, **kwargs):
+        if rows_done > 4:
+            raise Crash()
+        original_checkpoint(conn, source, rows_done, *args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "data_log.csv"
+        pd.DataFrame({
+            "timestamp": pd.date_range("2025-01-01", periods=10, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+            "temp": 30.0, "ph": 7.5, "do": 6.5, "turbidity": 15.0, "status": "Safe",
+        }).to_csv(csv_path, index=False)
+        db_config.DB_PATH = Path(tmp) / "migrate.db"
+        try:
+            migrate_csv_to_db.save_checkpoint = crash_on_second_chunk
+            try:
+                migrate_csv_to_db.migrate_csv_to_sqlite(csv_path, chunk_size=4)
+                raise AssertionError("expected the simulated crash")
+            except Crash:
+                pass
+            finally:
+                migrate_csv_to_db.save_checkpoint = original_checkpoint
+            assert count_rows()[0] == 4
+            print("   ✅ Crash rolled back the chunk together with its checkpoint")
+
+            migrate_csv_to_db.migrate_csv_to_sqlite(csv_path, chunk_size=4)
+            total, distinct = count_rows()
+            assert total == distinct == 10, (total, distinct)
+            print(f"   ✅ Resume inserted every row once ({total} rows)")
+        finally:
+            db_config.DB_PATH = original_path
+
+
+if __name__ == "__main__":
+    test_migration_resume()
@@ -0,0 +1,122 @@
+# features.py - Feature spec shared by training (train/trainIoT.py) and serving (gateway)
+"""
+The lag / rolling / calendar features the forecast models use, defined once.
+
+- build_features():    vectorized (pandas) over a whole history, for training
+                       and backfills
+- StreamingFeatures:   incremental, keeps only the last HISTORY_LEN readings
+                       in a deque, for the gateway (one reading per message)
+
+Both walk the same spec (LAGS, WINDOWS, CALENDAR) and produce the same
+columns in feature_columns() order; test_features.py checks that they agree
+on data/test.csv.
+
+Conventions (identical in both): lags and windows count readings, not
+clock hours; a window ends at the current reading; std uses ddof=1 like
+pandas; a reading whose window contains NaN has no features.
+"""
+
+import hashlib
+import json
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TARGET_COLS = ["Temperature", "pH", "Dissolved_Oxygen", "Turbidity"]
+LAGS = (1, 3, 6, 12, 24)
+WINDOWS = (6, 12, 24)
+CALENDAR = ("hour", "dow", "hour_sin", "hour_cos")
+
+# Readings needed before the first complete feature row
+HISTORY_LEN = max(max(LAGS) + 1, max(WINDOWS))
+
+
+def feature_columns(targets=TARGET_COLS):
+    """Model input columns in the order the models were trained with"""
+    columns = []
+    for col in targets:
+        columns += [f"{col}_lag{lag}h" for lag in LAGS]
+        for win in WINDOWS:
+            columns += [f"{col}_mean{win}h", f"{col}_std{win}h"]
+    return columns + list(CALENDAR)
+
+
+def spec_fingerprint():
+    """
+    Hash of the spec and of this module's code: cached feature matrices
+    (train/feature_cache.py) built with another spec are never reused
+    """
+    spec = {"targets": TARGET_COLS, "lags": LAGS, "windows": WINDOWS, "calendar": CALENDAR}
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode())
+    digest.update(Path(__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def calendar_features(ts):
+    """hour, dow, hour_sin, hour_cos for a Timestamp or a datetime Series"""
+    dt = ts.dt if isinstance(ts, pd.Series) else ts
+    hour, dow = dt.hour, dt.dayofweek
+    return {
+        "hour": hour,
+        "dow": dow,
+        "hour_sin": np.sin(2 * np.pi * hour / 24),
+        "hour_cos": np.cos(2 * np.pi * hour / 24),
+    }
+
+
+def build_features(df, time_col, targets=TARGET_COLS):
+    """
+    Batch implementation: feature columns for every row of df (sorted by time).
+    Rows without enough history keep NaN; callers dropna() as needed.
+    """
+    features = {}
+    for col in targets:
+        series = df[col]
+        for lag in LAGS:
+            features[f"{col}_lag{lag}h"] = series.shift(lag)
+        for win in WINDOWS:
+            rolling = series.rolling(win)
+            features[f"{col}_mean{win}h"] = rolling.mean()
+            features[f"{col}_std{win}h"] = rolling.std()
+    features.update(calendar_features(pd.to_datetime(df[time_col])))
+    return pd.DataFrame(features, index=df.index)[feature_columns(targets)]
+
+
+class StreamingFeatures:
+    """
+    Streaming implementation: feed readings one at a time, get the feature
+    row of the newest one. Memory and work per reading are O(HISTORY_LEN).
+    """
+
+    def __init__(self, targets=TARGET_COLS):
+        self.targets = list(targets)
+        self._history = deque(maxlen=HISTORY_LEN)
+        self.columns = feature_columns(self.targets)
+
+    def __len__(self):
+        return len(self._history)
+
+    def update(self, reading, timestamp):
+        """
+        Add one reading ({target: value}) and return its features as a 1-D
+        float array in self.columns order, or None while history is too short
+        """
+        self._history.append([float(reading[col]) for col in self.targets])
+        if len(self._history) < HISTORY_LEN:
+            return None
+
+        values = np.array(self._history)  # HISTORY_LEN x targets, oldest first
+        row = []
+        for j in range(len(self.targets)):
+            series = values[:, j]
+            row += [series[-1 - lag] for lag in LAGS]
+            for win in WINDOWS:
+                window = series[-win:]
+                row += [window.mean(), window.std(ddof=1)]
+        calendar = calendar_features(pd.Timestamp(timestamp))
+        row += [calendar[name] for name in CALENDAR]
+
+        row = np.array(row, dtype=np.float64)
+        return None if np.isnan(row).any() else row
@@ -3,12 +3,13 @@ import pandas as pd
 import joblib
 from datetime import datetime
 from paho.mqtt import client as mqtt_client
-from prepare_features import build_feature_row
+from prepare_features import build_feature_row, new_history
+from config import MODEL_SET_DIR
 
 BROKER = "broker.hivemq.com"
 TOPIC = "iot/tilapia/data"
 
-MODEL_DIR = "../models/"
+MODEL_DIR = f"{MODEL_SET_DIR}/"
 LOG_FILE = "../dashboard/data_log.csv"
 
 # ------------------ LOAD MODELS ------------------
@@ -27,9 +28,7 @@ scalers_Y = {
 }
 
 # Lịch sử 24h gần nhất
-history = pd.DataFrame(columns=[
-    "Temperature", "pH", "Dissolved_Oxygen", "Turbidity", "timestamp"
-])
+history = new_history()  # last HISTORY_LEN readings (features.py)
 
 
 # ------------------ PHÂN LOẠI RỦI RO ------------------
@@ -1,9 +1,13 @@
 import json
-import pandas as pd
-import joblib
+import os
+import socket
+import threading
+import time
+import numpy as np
 from datetime import datetime, timedelta
 from paho.mqtt import client as mqtt_client
-from prepare_features import build_feature_row
+from prepare_features import feature_row, new_history
+from inference import get_forecaster
 import sys
 from pathlib import Path
 import importlib.util
@@ -18,11 +22,18 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 # Import config and logger
 from config import (
-    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, DATABASE_PATH, 
-    MODEL_PATHS, Thresholds, get_config_summary,
-    EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, ALERT_INTERVAL_MIN
+    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, LIVE_TOPIC, DATABASE_PATH, 
+    MQTT_USERNAME, MQTT_PASSWORD, MQTT_TLS, LIVE_SECRET,
+    MODEL_PATHS, MODEL_SET_DIR, INFERENCE_BACKEND, INFERENCE_THREADS, get_config_summary,
+    EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, ALERT_INTERVAL_MIN,
+    STORAGE_BACKEND, RECENT_WINDOW_DIR, RECENT_WINDOW_SIZE, GATEWAY_ID, HEARTBEAT_INTERVAL_SEC,
+    RETENTION_DAYS, MAINTENANCE_INTERVAL_SEC, MAINTENANCE_DELETE_BATCH, MAINTENANCE_VACUUM_PAGES
 )
+from features import TARGET_COLS
 from logger import get_gateway_logger
+from recent_window import RecentWindowStore
+import live_message
+import risk
 
 # Setup logger
 logger = get_gateway_logger()
@@ -32,93 +43,60 @@ DB_CONFIG_PATH = PROJECT_ROOT / "database" / "db_config.py"
 spec = importlib.util.spec_from_file_location("db_config", DB_CONFIG_PATH)
 db_config = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(db_config)
+sys.modules["db_config"] = db_config  # storage.py shares this instance
 
-insert_sensor_data = db_config.insert_sensor_data
-init_database = db_config.init_database
+STORAGE_PATH = PROJECT_ROOT / "database" / "storage.py"
+spec = importlib.util.spec_from_file_location("storage", STORAGE_PATH)
+storage = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(storage)
+
+backend = storage.get_backend(STORAGE_BACKEND)
+
+# Per-device ring buffers of recent readings (mmap'd, read by dashboards)
+recent_store = RecentWindowStore(RECENT_WINDOW_DIR, RECENT_WINDOW_SIZE)
 
 logger.info("=== Gateway Starting ===")
 logger.info(f"Configuration: {get_config_summary()}")
 
 # ------------------ LOAD MODELS ------------------
-logger.info("Loading ML models...")
-models = {}
-scalers_Y = {}
-
-# Mapping for model and scaler filenames
-MODEL_FILE_MAP = {
-    "temperature": ("model_Temperature_6h.pkl", "scaler_Temperature.pkl", "Temperature"),
-    "ph": ("model_pH_6h.pkl", "scaler_pH.pkl", "pH"),
-    "do": ("model_Dissolved_Oxygen_6h.pkl", "scaler_Dissolved_Oxygen.pkl", "Dissolved_Oxygen"),
-    "turbidity": ("model_Turbidity_6h.pkl", "scaler_Turbidity.pkl", "Turbidity")
-}
-
+logger.info(f"Loading ML models from {MODEL_SET_DIR} (backend: {INFERENCE_BACKEND}, {INFERENCE_THREADS} thread)...")
 try:
-    for param in MODEL_FILE_MAP.keys():
-        model_file, scaler_file, display_name = MODEL_FILE_MAP[param]
-        
-        model_path = PROJECT_ROOT / "models" / model_file
-        scaler_path = PROJECT_ROOT / "models" / scaler_file
-        
-        if model_path.exists():
-            models[display_name] = joblib.load(str(model_path))
-            logger.info(f"✓ Loaded model: {param} -> {display_name}")
-        else:
-            logger.warning(f"✗ Model not found: {model_path}")
-        
-        if scaler_path.exists():
-            scalers_Y[display_name] = joblib.load(str(scaler_path))
-            logger.info(f"✓ Loaded scaler: {param}")
-        else:
-            logger.warning(f"✗ Scaler not found: {scaler_path}")
-    
-    logger.info(f"Models loaded: {len(models)}/4")
+    forecaster = get_forecaster(INFERENCE_BACKEND, MODEL_SET_DIR, threads=INFERENCE_THREADS)
+    logger.info(f"Models loaded: {len(forecaster)} ({len(TARGET_COLS)} targets x horizons {forecaster.horizons}h)")
 except Exception as e:
     logger.error(f"Error loading models: {e}")
     raise
 
 # Lịch sử 24h gần nhất
-history = pd.DataFrame(columns=[
-    "Temperature", "pH", "Dissolved_Oxygen", "Turbidity", "timestamp"
-])
+history = new_history()  # last HISTORY_LEN readings (features.py)
 
 # Email alert tracking
 last_email_sent = None
 
+# Database maintenance tracking
+last_maintenance = time.monotonic()
+
+# Gateway health counters (written to the heartbeat row by a background thread)
+started_at = datetime.now()
+gateway_stats = {"messages": 0, "errors": 0, "last_message_at": None}
+
 
 # ------------------ PHÂN LOẠI RỦI RO ------------------
 def classify_risk(temp, ph, do, turb):
     """
-    Risk classification for tilapia aquaculture using config thresholds.
+    Risk classification for tilapia aquaculture using config thresholds
+    (rules in risk.py, shared with forecasts and backtests).
     
     Danger: Any critical threshold violated
     Safe: All parameters in optimal range
     Warning: Between Safe and Danger
     """
-    # DANGER: Critical thresholds
-    if (do < Thresholds.DO_MIN_DANGER or 
-        ph < Thresholds.PH_MIN_DANGER or ph > Thresholds.PH_MAX_DANGER or 
-        temp < Thresholds.TEMP_MIN_DANGER or temp > Thresholds.TEMP_MAX_DANGER or 
-        turb > Thresholds.TURB_MAX_WARNING):
-        return "Danger"
-    
-    # SAFE: Optimal conditions for tilapia growth
-    if (Thresholds.TEMP_MIN_SAFE <= temp <= Thresholds.TEMP_MAX_SAFE and 
-        Thresholds.PH_MIN_SAFE <= ph <= Thresholds.PH_MAX_SAFE and 
-        do >= Thresholds.DO_MIN_SAFE and 
-        turb <= Thresholds.TURB_MAX_SAFE):
-        return "Safe"
-    
-    # WARNING: Suboptimal but not critical
-    return "Warning"
+    return risk.classify(temp, ph, do, turb)
 
 
 def merge_risks(sensor_risk, pred_risk):
     """Kết hợp cảm biến + dự đoán theo hướng C."""
-    if sensor_risk == "Danger" or pred_risk == "Danger":
-        return "Danger"
-    if sensor_risk == "Warning" or pred_risk == "Warning":
-        return "Warning"
-    return "Safe"
+    return risk.merge(sensor_risk, pred_risk)
 
 
 def send_danger_email(data, sensor_risk, pred_risk, final_risk):
@@ -186,6 +164,83 @@ Email tự động từ IoT Gateway
         return False
 
 
+# ------------------ DATABASE MAINTENANCE ------------------
+def maybe_run_maintenance():
+    """
+    Run one bounded retention/vacuum/checkpoint step between ingest writes.
+    While expired rows remain, a step runs after every message until caught up.
+    """
+    global last_maintenance
+    
+    if time.monotonic() - last_maintenance < MAINTENANCE_INTERVAL_SEC:
+        return
+    
+    try:
+        result = backend.maintenance(
+            days=RETENTION_DAYS,
+            batch_size=MAINTENANCE_DELETE_BATCH,
+            vacuum_pages=MAINTENANCE_VACUUM_PAGES
+        )
+    except Exception as e:
+        logger.error(f"🧹 Maintenance error: {e}")
+        last_maintenance = time.monotonic()
+        return
+    
+    logger.info(
+        f"🧹 Maintenance: deleted={result['deleted']} (blocked {result['delete_blocked_ms']}ms) | "
+        f"freed pages={result['pages_freed']} (blocked {result['vacuum_blocked_ms']}ms) | "
+        f"WAL {result['wal_checkpointed']}/{result['wal_frames']} frames ({result['checkpoint_ms']}ms)"
+    )
+    if not result['pending']:
+        last_maintenance = time.monotonic()
+
+
+# ------------------ HEARTBEAT ------------------
+def write_heartbeat(client):
+    try:
+        backend.heartbeat(
+            GATEWAY_ID, started_at,
+            last_message_at=gateway_stats["last_message_at"],
+            messages=gateway_stats["messages"],
+            errors=gateway_stats["errors"],
+            mqtt_connected=client is not None and client.is_connected(),
+            host=socket.gethostname(),
+            pid=os.getpid()
+        )
+    except Exception as e:
+        logger.error(f"💓 Heartbeat error: {e}")
+
+
+def start_heartbeat(client):
+    """
+    Beat every HEARTBEAT_INTERVAL_SEC from a daemon thread, so dashboards can
+    tell "gateway alive, sensors quiet" from "gateway down"
+    """
+    def loop():
+        write_heartbeat(client)
+        while not stop.wait(HEARTBEAT_INTERVAL_SEC):
+            write_heartbeat(client)
+
+    stop = threading.Event()
+    threading.Thread(target=loop, name="heartbeat", daemon=True).start()
+    return stop
+
+
+# ------------------ LIVE PUSH ------------------
+def publish_live(client, row):
+    """
+    Push the processed reading to dashboards (retained, so a dashboard that
+    starts later still gets the current reading immediately). Timestamped and,
+    with LIVE_SECRET, signed: dashboards drop stale or forged payloads.
+    """
+    if client is None:
+        return
+    try:
+        client.publish(LIVE_TOPIC, live_message.encode(row, LIVE_SECRET), qos=0, retain=True)
+    except Exception as e:
+        logger.error(f"📣 Live publish error: {e}")
+
+
 # ------------------ MQTT HANDLE ------------------
 def on_message(client, userdata, msg):
     global history
@@ -195,7 +250,10 @@ def on_message(client, userdata, msg):
         logger.debug(f"Received MQTT message: {data}")
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON: {e}")
+        gateway_stats["errors"] += 1
         return
+    gateway_stats["messages"] += 1
+    gateway_stats["last_message_at"] = datetime.now()
 
     # Sensor risk – REALTIME
     risk_sensor = classify_risk(
@@ -209,9 +267,9 @@ def on_message(client, userdata, msg):
     demo_mode = data.get("demo_mode", False)
 
     # Build X row for prediction
-    X_scaled, history = build_feature_row(history, data)
+    X_row, history = feature_row(history, data)
 
-    if X_scaled is None:
+    if X_row is None:
         logger.info("⏳ Insufficient history (need 24h) for predictions")
         predictions = {
             "Temperature": None,
@@ -221,13 +279,12 @@ def on_message(client, userdata, msg):
         }
         risk_pred = "Unknown"
         final_risk = risk_sensor  # chỉ đánh giá bằng sensor
+        forecast = None
     else:
-        # Make predictions
-        predictions = {}
-        for col, model in models.items():
-            scaled_pred = model.predict(X_scaled).reshape(-1, 1)
-            real_pred = scalers_Y[col].inverse_transform(scaled_pred)[0][0]
-            predictions[col] = round(float(real_pred), 3)
+        # All targets x all horizons from the one feature row
+        forecast = forecaster.predict(X_row)
+        primary = forecast[0, :, forecaster.primary_index()]
+        predictions = {col: round(float(v), 3) for col, v in zip(TARGET_COLS, primary)}
 
         # Risk from prediction
         risk_pred = classify_risk(
@@ -247,7 +304,7 @@ def on_message(client, userdata, msg):
     # -------- LOG OUT ----------
     logger.info(f"📡 Sensor: T={data['Temperature']}°C pH={data['pH']} DO={data['Dissolved_Oxygen']} Turb={data['Turbidity']} | Risk={risk_sensor}")
     if predictions["Temperature"]:
-        logger.info(f"🤖 Pred(6h): T={predictions['Temperature']} pH={predictions['pH']} DO={predictions['Dissolved_Oxygen']} | Risk={risk_pred}")
+        logger.info(f"🤖 Pred({forecaster.primary}h): T={predictions['Temperature']} pH={predictions['pH']} DO={predictions['Dissolved_Oxygen']} | Risk={risk_pred}")
     logger.info(f"🚨 FINAL: {final_risk}")
     
     # -------- Send Email Alert if Danger ----------
@@ -268,20 +325,50 @@ def on_message(client, userdata, msg):
         "pred_turb": predictions["Turbidity"],
         "sensor_risk": risk_sensor,
         "pred_risk": risk_pred,
-        "status": final_risk
+        "status": final_risk,
+        "device_id": data.get("device_id", db_config.DEFAULT_DEVICE_ID)
     }
 
+    if forecast is not None:
+        current = np.array([[data[col] for col in TARGET_COLS]])
+        eta, eta_param = risk.hours_to_danger(current, forecast, forecaster.horizons)
+        eta_hours = None if np.isnan(eta[0]) else round(float(eta[0]), 2)
+        if eta_hours is not None:
+            logger.info(f"⏱️ Danger in ~{eta_hours}h ({eta_param[0]})")
+
     try:
-        record_id = insert_sensor_data(row)
-        print(f"💾 Saved to database (ID: {record_id})")
+        # Reading + its forecast row (keyed by the reading's id) in one transaction
+        backend.insert_reading(row, None if forecast is None else {
+            "horizons": forecaster.horizons,
+            "forecast": forecast[0],
+            "eta_hours": eta_hours,
+            "eta_param": eta_param[0]
+        })
+        print(f"💾 Saved to {backend.name} database")
     except Exception as e:
         logger.error(f"❌ Database error: {e}")
+        gateway_stats["errors"] += 1
+    
+    try:
+        recent_store.append(row["device_id"], row)
+    except Exception as e:
+        logger.error(f"🧠 Recent window error: {e}")
+    
+    publish_live(client, row)
+    maybe_run_maintenance()
 
 
 # ------------------ MQTT ------------------
 def connect_mqtt():
     logger.info(f"Connecting to MQTT broker: {MQTT_BROKER}:{MQTT_PORT}")
     client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION1)
+    if MQTT_USERNAME:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD or None)
+    if MQTT_TLS:
+        client.tls_set()
+    if live_message.is_public_broker(MQTT_BROKER) and not LIVE_SECRET:
+        logger.warning(f"🔓 {MQTT_BROKER} is public: anyone can publish readings on {MQTT_TOPIC} / {LIVE_TOPIC}. "
+                       "Use a private broker or set LIVE_SECRET (gateway + dashboards)")
     client.connect(MQTT_BROKER, MQTT_PORT)
     logger.info(f"✅ Connected to {MQTT_BROKER}:{MQTT_PORT}")
     return client
@@ -290,14 +377,19 @@ def connect_mqtt():
 def run():
     # Initialize database on startup
     logger.info("🔧 Initializing database...")
-    init_database()
-    logger.info(f"✅ Database ready: {DATABASE_PATH}")
+    backend.init()
+    logger.info(f"✅ Database ready: {DATABASE_PATH} (backend: {backend.name})")
+    if backend.name == "sqlite" and not db_config.is_incremental_vacuum():
+        logger.warning("🧹 auto_vacuum is not INCREMENTAL; free pages will not be reclaimed "
+                       "(run: python database/maintenance.py --convert while the gateway is stopped)")
     
     client = connect_mqtt()
     client.subscribe(MQTT_TOPIC)
     client.on_message = on_message
-    logger.info(f"🚀 Gateway running | Topic: {MQTT_TOPIC}")
-    logger.info("💾 Data will be saved to SQLite database")
+    start_heartbeat(client)
+    logger.info(f"🚀 Gateway running | Topic: {MQTT_TOPIC} | Live: {LIVE_TOPIC}")
+    logger.info(f"💓 Heartbeat every {HEARTBEAT_INTERVAL_SEC}s as '{GATEWAY_ID}'")
+    logger.info(f"💾 Data will be saved to {backend.name} database")
     logger.info("⏳ Waiting for MQTT messages...")
     client.loop_forever()
 
@@ -0,0 +1,123 @@
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import TARGET_COLS
+
+
+def model_horizons(model_dir, suffix):
+    """
+    (primary horizon, horizons with a model file for every target) of a model set;
+    model sets from before multi-horizon training only have "horizon"
+    """
+    config = joblib.load(Path(model_dir) / "model_config.pkl")
+    horizons = [
+        h for h in config.get("horizons", [config["horizon"]])
+        if all((Path(model_dir) / f"model_{col}_{h}h{suffix}").exists() for col in TARGET_COLS)
+    ]
+    if config["horizon"] not in horizons:
+        raise FileNotFoundError(f"Missing {config['horizon']}h *{suffix} models in {model_dir}")
+    return config["horizon"], horizons
+
+
+class Forecaster:
+    """
+    All forecast models of one model set (every target x every horizon trained).
+
+    predict() takes raw feature rows (feature_columns.pkl order), scales them
+    once, evaluates every booster on the same rows and un-scales all targets
+    at once, so the gateway builds features once per reading and gets every
+    horizon back from a single call.
+    """
+
+    name = "xgboost"
+    suffix = ".pkl"
+
+    def __init__(self, model_dir, threads=None):
+        model_dir = Path(model_dir)
+        self.primary, self.horizons = model_horizons(model_dir, self.suffix)
+
+        self.scaler_X = joblib.load(model_dir / "scaler_features.pkl")
+        self.boosters = [
+            [joblib.load(model_dir / f"model_{col}_{h}h.pkl").get_booster() for h in self.horizons]
+            for col in TARGET_COLS
+        ]
+        if threads:
+            for boosters in self.boosters:
+                for booster in boosters:
+                    booster.set_param({"nthread": threads})
+        scalers = [joblib.load(model_dir / f"scaler_{col}.pkl") for col in TARGET_COLS]
+        # MinMaxScaler.inverse_transform: (y - min_) / scale_, per target
+        self._min = np.array([float(s.min_[0]) for s in scalers])[None, :, None]
+        self._scale = np.array([float(s.scale_[0]) for s in scalers])[None, :, None]
+
+    def __len__(self):
+        return len(TARGET_COLS) * len(self.horizons)
+
+    def predict(self, X):
+        """(n, len(TARGET_COLS), len(horizons)) forecasts in real units"""
+        X_scaled = self.scaler_X.transform(np.asarray(X, dtype=np.float64)).astype(np.float32)
+        scaled = np.empty((len(X_scaled), len(TARGET_COLS), len(self.horizons)))
+        for i, boosters in enumerate(self.boosters):
+            for j, booster in enumerate(boosters):
+                scaled[:, i, j] = booster.inplace_predict(X_scaled)
+        return (scaled - self._min) / self._scale
+
+    def primary_index(self):
+        return self.horizons.index(self.primary)
+
+
+class OnnxForecaster(Forecaster):
+    """
+    Same forecasts from the model_{target}_{h}h.onnx graphs of train/onnx_export.py
+    (feature scaling + trees + target un-scaling in one graph), on onnxruntime's
+    CPU provider: needs neither xgboost nor scikit-learn at runtime
+    """
+
+    name = "onnx"
+    suffix = ".onnx"
+
+    def __init__(self, model_dir, threads=1):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX backend requires: pip install onnxruntime")
+        model_dir = Path(model_dir)
+        self.primary, self.horizons = model_horizons(model_dir, self.suffix)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or 1
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.sessions = [
+            [ort.InferenceSession(str(model_dir / f"model_{col}_{h}h.onnx"), options,
+                                  providers=["CPUExecutionProvider"])
+             for h in self.horizons]
+            for col in TARGET_COLS
+        ]
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty((len(X), len(TARGET_COLS), len(self.horizons)))
+        for i, sessions in enumerate(self.sessions):
+            for j, session in enumerate(sessions):
+                out[:, i, j] = session.run(None, {"features": X})[0][:, 0]
+        return out
+
+
+FORECASTERS = {
+    "xgboost": Forecaster,
+    "onnx": OnnxForecaster,
+}
+
+
+def get_forecaster(name="xgboost", model_dir=None, threads=None):
+    """Create a forecaster by name (see FORECASTERS)"""
+    try:
+        forecaster_cls = FORECASTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend: {name} (use one of {list(FORECASTERS)})")
+    return forecaster_cls(model_dir, threads=threads)
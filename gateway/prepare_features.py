@@ -1,16 +1,46 @@
-import pandas as pd
-import numpy as np
+import sys
+from functools import lru_cache
+from pathlib import Path
+
 import joblib
-from datetime import datetime
 
-# Load danh sách feature và scaler_X
-MODEL_DIR = "../models/"
-feature_cols = joblib.load(MODEL_DIR + "feature_columns.pkl")
-scaler_X = joblib.load(MODEL_DIR + "scaler_features.pkl")
+# Feature spec shared with training (features.py at the project root)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import MODEL_SET_DIR
+from features import TARGET_COLS, StreamingFeatures
+
+# Load danh sách feature (cùng bộ model với gateway)
+feature_cols = joblib.load(MODEL_SET_DIR / "feature_columns.pkl")
+
+# Model column order -> position in the streaming feature row (fails fast on unknown features)
+_column_order = [StreamingFeatures().columns.index(col) for col in feature_cols]
+
+
+def new_history():
+    """Empty per-gateway history (last HISTORY_LEN readings)"""
+    return StreamingFeatures(TARGET_COLS)
+
+
+@lru_cache(maxsize=1)
+def _scaler_X():
+    # Loaded on first use: the ONNX backend scales inside the graph and never needs scikit-learn
+    return joblib.load(MODEL_SET_DIR / "scaler_features.pkl")
+
+
+def feature_row(history, new_data):
+    """
+    Unscaled feature row (1, len(feature_cols)) in model column order, for
+    inference.Forecaster / OnnxForecaster; None until there is enough history.
+
+    Returns (row, history).
+    """
+    row = history.update(new_data, new_data["timestamp"])
+    if row is None:
+        return None, history   # cần thêm lịch sử
+    return row[_column_order].reshape(1, -1), history
 
-TARGET_COLS = ["Temperature", "pH", "Dissolved_Oxygen", "Turbidity"]
 
-def build_feature_row(history_df, new_data):
+def build_feature_row(history, new_data):
     """
     new_data = {
         "Temperature": float,
@@ -19,34 +49,12 @@ def build_feature_row(history_df, new_data):
         "Turbidity": float,
         "timestamp": "YYYY-MM-DD HH:MM:SS"
     }
-    """
-
-    df = history_df.copy()
-    df.loc[len(df)] = new_data
-
-    # LAG features
-    for col in TARGET_COLS:
-        for lag in [1, 3, 6, 12, 24]:
-            df[f"{col}_lag{lag}h"] = df[col].shift(lag)
 
-        # Rolling window
-        for win in [6, 12, 24]:
-            df[f"{col}_mean{win}h"] = df[col].rolling(win).mean()
-            df[f"{col}_std{win}h"] = df[col].rolling(win).std()
-
-    ts = pd.to_datetime(new_data["timestamp"])
-    df.loc[len(df)-1, "hour"] = ts.hour
-    df.loc[len(df)-1, "dow"] = ts.dayofweek
-    df.loc[len(df)-1, "hour_sin"] = np.sin(2*np.pi*ts.hour/24)
-    df.loc[len(df)-1, "hour_cos"] = np.cos(2*np.pi*ts.hour/24)
-
-    # Lấy dòng cuối có đầy đủ feature
-    df_feat = df.tail(1).dropna()
-
-    if df_feat.empty:
-        return None, df   # cần thêm lịch sử
-
-    X = df_feat[feature_cols]
-    X_scaled = scaler_X.transform(X)
+    Returns (X_scaled, history); X_scaled is None until there is enough history.
+    """
+    row, history = feature_row(history, new_data)
+    if row is None:
+        return None, history
 
-    return X_scaled, df
+    X_scaled = _scaler_X().transform(row)
+    return X_scaled, history
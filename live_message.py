@@ -0,0 +1,59 @@
+# live_message.py - Timestamped, signed payloads on LIVE_TOPIC
+"""
+The gateway pushes every processed reading to the dashboards on LIVE_TOPIC
+(retained). Anyone who can reach the broker can publish or retain on that
+topic - on a public broker such as broker.hivemq.com, that is everyone - so
+a payload carries:
+
+- published_at: gateway clock (epoch seconds). Dashboards ignore readings
+  older than LIVE_MAX_AGE_SEC, so a retained reading of a stopped gateway or
+  a replayed message is not shown as live.
+- sig: HMAC-SHA256 of the body with LIVE_SECRET. When the dashboard has a
+  secret, unsigned or forged payloads are dropped.
+
+Without LIVE_SECRET only the age check applies (and a forger can set any
+published_at): use a private broker (MQTT_USERNAME / MQTT_PASSWORD, MQTT_TLS)
+or set the same LIVE_SECRET on gateway and dashboards.
+
+    payload = encode(row, secret)                  # gateway
+    message = decode(payload, secret, max_age=30)  # dashboard: (reading, published_at) or None
+"""
+
+import hashlib
+import hmac
+import json
+import time
+
+# Brokers anyone can publish to without an account
+PUBLIC_BROKERS = ("broker.hivemq.com", "test.mosquitto.org", "broker.emqx.io", "mqtt.eclipseprojects.io")
+
+
+def _signature(body, secret):
+    return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+def encode(reading, secret="", now=None):
+    """JSON payload: {"body": JSON of reading + published_at, "sig": hex HMAC or null}"""
+    body = json.dumps({"reading": reading, "published_at": time.time() if now is None else now}, default=str)
+    return json.dumps({"body": body, "sig": _signature(body, secret) if secret else None})
+
+
+def decode(payload, secret="", max_age=30, now=None):
+    """(reading, published_at) of a valid, fresh payload; None when malformed, unsigned / forged or stale"""
+    try:
+        message = json.loads(payload)
+        body = message["body"]
+        if secret and not hmac.compare_digest(str(message.get("sig") or ""), _signature(body, secret)):
+            return None
+        content = json.loads(body)
+        reading, published_at = content["reading"], float(content["published_at"])
+    except (ValueError, TypeError, KeyError, UnicodeDecodeError):
+        return None
+    age = (time.time() if now is None else now) - published_at
+    if not isinstance(reading, dict) or abs(age) > max_age:
+        return None
+    return reading, published_at
+
+
+def is_public_broker(broker):
+    return broker.strip().lower() in PUBLIC_BROKERS
@@ -0,0 +1,213 @@
+# recent_window.py - Shared-memory ring buffer of recent readings per device
+"""
+The gateway appends every processed reading to a fixed-layout ring buffer in
+an mmap'd file (one file per device). Dashboards and CLI tools map the same
+file and read the latest readings without touching SQLite.
+
+Layout (little endian):
+    header  64 bytes: magic, layout version, capacity, record size,
+                      seq (seqlock counter), count (total records written)
+    records capacity x RECORD_DTYPE
+
+Single writer, any number of readers. The writer makes seq odd, writes the
+record, bumps count and makes seq even again; a reader retries whenever seq
+was odd or changed while it copied.
+
+Usage:
+    python recent_window.py                 # list devices
+    python recent_window.py default -n 20   # last 20 readings of a device
+"""
+
+import argparse
+import mmap
+import os
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"IOTRING1"
+LAYOUT_VERSION = 1
+HEADER_SIZE = 64
+DEFAULT_CAPACITY = 512
+
+# magic, version, capacity, record size, seq, count
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("capacity", "<u4"),
+    ("record_size", "<u4"), ("_pad", "<u4"), ("seq", "<u8"), ("count", "<u8"),
+])
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),  # epoch ns
+    ("temp", "<f8"), ("ph", "<f8"), ("do", "<f8"), ("turbidity", "<f8"),
+    ("pred_temp", "<f8"), ("pred_ph", "<f8"), ("pred_do", "<f8"), ("pred_turb", "<f8"),
+    ("sensor_risk", "i1"), ("pred_risk", "i1"), ("status", "i1"), ("_pad", "V5"),
+])
+
+RISK_LEVELS = ["Safe", "Warning", "Danger", "Unknown"]
+RISK_CODES = {name: code for code, name in enumerate(RISK_LEVELS)}
+
+VALUE_FIELDS = ["temp", "ph", "do", "turbidity", "pred_temp", "pred_ph", "pred_do", "pred_turb"]
+RISK_FIELDS = ["sensor_risk", "pred_risk", "status"]
+
+
+def device_path(directory, device_id):
+    """Ring file for a device (device ids are sanitized for the filesystem)"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", str(device_id)) or "default"
+    return Path(directory) / f"{safe}.ring"
+
+
+class RecentWindow:
+    """One device's ring buffer mapped from a file"""
+
+    def __init__(self, path, capacity=None):
+        """Open an existing ring read-only, or for writing (created if needed) when capacity is given"""
+        self.path = Path(path)
+        writable = capacity is not None
+        if writable and not self.path.exists():
+            self._create(capacity)
+
+        self._file = open(self.path, "r+b" if writable else "rb")
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=access)
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._mmap)
+
+        if bytes(self._header["magic"]) != MAGIC or int(self._header["version"]) != LAYOUT_VERSION:
+            self.close()
+            raise ValueError(f"Not a recent-window file (or old layout): {self.path}")
+        if int(self._header["record_size"]) != RECORD_DTYPE.itemsize:
+            self.close()
+            raise ValueError(f"Record layout mismatch in {self.path}")
+
+        self.capacity = int(self._header["capacity"])
+        self._records = np.ndarray(
+            (self.capacity,), dtype=RECORD_DTYPE, buffer=self._mmap, offset=HEADER_SIZE
+        )
+
+    def _create(self, capacity):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = LAYOUT_VERSION
+        header["capacity"] = capacity
+        header["record_size"] = RECORD_DTYPE.itemsize
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+            f.write(b"\0" * (capacity * RECORD_DTYPE.itemsize))
+        # Readers never see a half-initialized file
+        os.replace(tmp, self.path)
+
+    # ------------------ writer ------------------
+    def append(self, row):
+        """Append one reading (dict with sensor_logs column names)"""
+        record = np.zeros((), dtype=RECORD_DTYPE)
+        record["timestamp"] = pd.Timestamp(row["timestamp"]).value
+        for field in VALUE_FIELDS:
+            value = row.get(field)
+            record[field] = np.nan if value is None else value
+        for field in RISK_FIELDS:
+            record[field] = RISK_CODES.get(row.get(field), RISK_CODES["Unknown"])
+
+        header = self._header
+        count = int(header["count"])
+        header["seq"] += 1          # odd: write in progress
+        self._records[count % self.capacity] = record
+        header["count"] = count + 1
+        header["seq"] += 1          # even: consistent
+
+    # ------------------ readers ------------------
+    def view(self):
+        """Zero-copy view of the raw slots (unordered, may change under you)"""
+        return self._records
+
+    def snapshot(self, n=None, retries=100):
+        """Consistent copy of the last n readings, oldest first"""
+        header = self._header
+        for _ in range(retries):
+            seq = int(header["seq"])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            count = int(header["count"])
+            size = min(count, self.capacity, n or self.capacity)
+            end = count % self.capacity
+            start = end - size
+            if start >= 0:
+                data = self._records[start:end].copy()
+            else:
+                data = np.concatenate((self._records[start:], self._records[:end]))
+            if int(header["seq"]) == seq:
+                return data
+        raise TimeoutError(f"Writer kept {self.path} busy for {retries} retries")
+
+    def to_frame(self, n=None):
+        """Last n readings as a DataFrame (same columns as sensor_logs)"""
+        data = self.snapshot(n)
+        df = pd.DataFrame({"timestamp": pd.to_datetime(data["timestamp"])})
+        for field in VALUE_FIELDS:
+            df[field] = data[field]
+        for field in RISK_FIELDS:
+            df[field] = pd.Categorical.from_codes(data[field], RISK_LEVELS)
+        return df
+
+    def close(self):
+        self._header = self._records = None
+        self._mmap.close()
+        self._file.close()
+
+
+class RecentWindowStore:
+    """Gateway side: one ring per device, created on first reading"""
+
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY):
+        self.directory = Path(directory)
+        self.capacity = capacity
+        self._windows = {}
+
+    def append(self, device_id, row):
+        window = self._windows.get(device_id)
+        if window is None:
+            window = RecentWindow(device_path(self.directory, device_id), capacity=self.capacity)
+            self._windows[device_id] = window
+        window.append(row)
+
+    def close(self):
+        for window in self._windows.values():
+            window.close()
+        self._windows.clear()
+
+
+def list_devices(directory):
+    """Device ids that have a ring file"""
+    return sorted(p.stem for p in Path(directory).glob("*.ring"))
+
+
+def open_window(directory, device_id="default"):
+    """Reader side: map a device's ring, None if the gateway has not created it yet"""
+    path = device_path(directory, device_id)
+    if not path.exists():
+        return None
+    return RecentWindow(path)
+
+
+if __name__ == "__main__":
+    from config import RECENT_WINDOW_DIR
+
+    parser = argparse.ArgumentParser(description="Read the gateway's recent-window ring buffers")
+    parser.add_argument("device", nargs="?", help="Device id (omit to list devices)")
+    parser.add_argument("-n", type=int, default=10, help="Readings to show")
+    parser.add_argument("--dir", type=Path, default=RECENT_WINDOW_DIR)
+    args = parser.parse_args()
+
+    if not args.device:
+        devices = list_devices(args.dir)
+        print("\n".join(devices) if devices else f"No ring buffers in {args.dir}")
+    else:
+        window = open_window(args.dir, args.device)
+        if window is None:
+            raise SystemExit(f"No ring buffer for device '{args.device}' in {args.dir}")
+        print(window.to_frame(args.n).to_string(index=False))
+        window.close()
@@ -0,0 +1,114 @@
+# risk.py - Risk rules shared by the gateway, forecasts and backtests
+"""
+Tilapia risk classification on config.Thresholds, vectorized with numpy.
+
+- classify():        Safe / Warning / Danger for scalars or whole arrays
+- merge():           sensor risk + forecast risk (worst wins)
+- hours_to_danger(): time until the first Danger threshold is crossed, on
+                     the piecewise-linear path current reading -> forecasts
+                     at each horizon
+
+Danger: any critical limit violated (danger_limits())
+Safe:   every parameter in its optimal range
+Warning: everything in between
+
+Thresholds are read on every call, so a backtest can change them
+(setattr(Thresholds, ...)) without reloading this module.
+"""
+
+import numpy as np
+
+from config import Thresholds
+
+LEVELS = np.array(["Safe", "Warning", "Danger"])
+PARAMS = ("Temperature", "pH", "Dissolved_Oxygen", "Turbidity")
+
+
+def danger_limits():
+    """(parameter, "min"/"max", limit): Danger when value < min limit or > max limit"""
+    return (
+        ("Temperature", "min", Thresholds.TEMP_MIN_DANGER),
+        ("Temperature", "max", Thresholds.TEMP_MAX_DANGER),
+        ("pH", "min", Thresholds.PH_MIN_DANGER),
+        ("pH", "max", Thresholds.PH_MAX_DANGER),
+        ("Dissolved_Oxygen", "min", Thresholds.DO_MIN_DANGER),
+        ("Turbidity", "max", Thresholds.TURB_MAX_WARNING),
+    )
+
+
+def _violates(kind, values, limit):
+    return values < limit if kind == "min" else values > limit
+
+
+def danger_mask(temp, ph, do, turb):
+    values = dict(zip(PARAMS, np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (temp, ph, do, turb)))))
+    mask = np.zeros(values["pH"].shape, dtype=bool)
+    for param, kind, limit in danger_limits():
+        mask |= _violates(kind, values[param], limit)
+    return mask
+
+
+def safe_mask(temp, ph, do, turb):
+    temp, ph, do, turb = (np.asarray(v, dtype=float) for v in (temp, ph, do, turb))
+    return ((Thresholds.TEMP_MIN_SAFE <= temp) & (temp <= Thresholds.TEMP_MAX_SAFE) &
+            (Thresholds.PH_MIN_SAFE <= ph) & (ph <= Thresholds.PH_MAX_SAFE) &
+            (do >= Thresholds.DO_MIN_SAFE) & (turb <= Thresholds.TURB_MAX_SAFE))
+
+
+def classify(temp, ph, do, turb):
+    """'Safe' / 'Warning' / 'Danger' (str for scalars, array of str for arrays)"""
+    level = np.where(danger_mask(temp, ph, do, turb), 2, np.where(safe_mask(temp, ph, do, turb), 0, 1))
+    labels = LEVELS[level]
+    return str(labels) if labels.ndim == 0 else labels
+
+
+def rank(labels):
+    """'Safe' / 'Warning' / 'Danger' -> 0 / 1 / 2 (anything else, e.g. 'Unknown', -> 0)"""
+    labels = np.asarray(labels, dtype=object)
+    return np.where(labels == "Danger", 2, np.where(labels == "Warning", 1, 0))
+
+
+def merge(sensor_risk, pred_risk):
+    """Worst of the two levels ('Unknown' forecasts count as Safe)"""
+    labels = LEVELS[np.maximum(rank(sensor_risk), rank(pred_risk))]
+    return str(labels) if labels.ndim == 0 else labels
+
+
+def hours_to_danger(current, forecasts, horizons):
+    """
+    Hours until the first Danger limit is crossed, interpolating linearly
+    between the current reading (t = 0) and each forecast horizon
+
+    Args:
+        current: (n, 4) readings in PARAMS order
+        forecasts: (n, 4, len(horizons)) forecasts in PARAMS order
+        horizons: increasing horizons in hours
+
+    Returns:
+        (hours (n,) float, NaN = no crossing within max(horizons);
+         parameter (n,) object, the first one to cross, None when no crossing)
+    """
+    current = np.atleast_2d(np.asarray(current, dtype=float))
+    path = np.concatenate([current[:, :, None], np.asarray(forecasts, dtype=float).reshape(len(current), len(PARAMS), -1)], axis=2)
+    times = np.concatenate([[0.0], np.asarray(horizons, dtype=float)])
+    n = len(current)
+    hours = np.full(n, np.inf)
+    param = np.full(n, None, dtype=object)
+    rows = np.arange(n)
+
+    for name, kind, limit in danger_limits():
+        values = path[:, PARAMS.index(name), :]
+        bad = _violates(kind, values, limit)
+        hit = bad.any(axis=1)
+        first = bad.argmax(axis=1)
+        # Crossing inside the segment [first - 1, first]; already in Danger at t = 0 -> 0
+        prev = np.maximum(first - 1, 0)
+        v0, v1 = values[rows, prev], values[rows, first]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frac = np.where(first > 0, (limit - v0) / (v1 - v0), 0.0)
+        eta = np.where(hit, times[prev] + np.clip(frac, 0, 1) * (times[first] - times[prev]), np.inf)
+        earlier = eta < hours
+        hours = np.where(earlier, eta, hours)
+        param[earlier] = name
+
+    return np.where(np.isfinite(hours), hours, np.nan), param
@@ -0,0 +1,52 @@
+# test_features.py
+"""
+Parity test: batch (training) vs streaming (gateway) features on data/test.csv
+"""
+
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import HISTORY_LEN, StreamingFeatures, build_features, feature_columns
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+TEST_CSV = PROJECT_ROOT / "data" / "test.csv"
+TIME_COL = "DateTime"
+
+
+def test_features():
+    print("=" * 60)
+    print("🧪 Feature parity: batch vs streaming")
+    print("=" * 60)
+
+    df = pd.read_csv(TEST_CSV).sort_values(TIME_COL).reset_index(drop=True)
+    # Same columns, same order as the deployed models
+    assert feature_columns() == list(joblib.load(PROJECT_ROOT / "models" / "feature_columns.pkl"))
+
+    batch = build_features(df, TIME_COL)
+    stream = StreamingFeatures()
+    rows = [stream.update(reading, reading[TIME_COL]) for reading in df.to_dict("records")]
+
+    complete = batch.notna().all(axis=1).to_numpy()
+    streamed = np.array([row is not None for row in rows])
+    # Streaming yields a row exactly where the batch row is complete
+    assert (complete == streamed).all(), np.flatnonzero(complete != streamed)[:10]
+    assert not streamed[:HISTORY_LEN - 1].any()
+    print(f"   ✅ {streamed.sum()} / {len(df)} rows with features on both paths")
+
+    expected = batch[complete].to_numpy()
+    actual = np.vstack([row for row in rows if row is not None])
+    max_diff = np.abs(expected - actual).max()
+    # Only summation order differs (pandas rolling vs numpy over the window)
+    assert np.allclose(expected, actual, rtol=0, atol=1e-9), max_diff
+    print(f"   ✅ Max abs difference: {max_diff:.2e}")
+
+    print("\n" + "=" * 60)
+    print("✅ All tests passed!")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    test_features()
@@ -0,0 +1,67 @@
+# test_recent_window.py
+"""
+Recent-window ring buffer: wrap-around at capacity and snapshot(n) order,
+read back through a separate read-only mapping like the dashboards do
+"""
+
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from recent_window import RecentWindowStore, list_devices, open_window
+
+CAPACITY = 4
+
+
+def reading(i):
+    return {
+        "timestamp": pd.Timestamp("2025-01-01") + pd.Timedelta(minutes=i),
+        "temp": 30.0 + i, "ph": 7.5, "do": None, "turbidity": 15.0,
+        "status": ["Safe", "Warning", "Danger"][i % 3], "sensor_risk": "bogus",
+    }
+
+
+def test_recent_window():
+    print("=" * 60)
+    print("🧪 Recent window: ring wrap-around and snapshots")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RecentWindowStore(tmp, capacity=CAPACITY)
+        for i in range(3):
+            store.append("pond/1", reading(i))
+        assert list_devices(tmp) == ["pond_1"]
+
+        window = open_window(tmp, "pond/1")
+        try:
+            # Not full yet: only the written slots, oldest first
+            assert window.to_frame()["temp"].tolist() == [30.0, 31.0, 32.0]
+
+            for i in range(3, 7):
+                store.append("pond/1", reading(i))
+            # 7 readings in 4 slots: the last 4, oldest first, across the wrap point
+            df = window.to_frame()
+            assert df["temp"].tolist() == [33.0, 34.0, 35.0, 36.0]
+            assert df["timestamp"].is_monotonic_increasing
+            assert df["status"].tolist() == [reading(i)["status"] for i in range(3, 7)]
+            assert (df["sensor_risk"] == "Unknown").all() and df["do"].isna().all()
+            print(f"   ✅ Wrapped ring returns the last {CAPACITY} readings in order")
+
+            assert window.snapshot(2)["temp"].tolist() == [35.0, 36.0]
+            assert len(window.snapshot(10)) == CAPACITY
+            assert np.array_equal(window.snapshot(1)["timestamp"], [reading(6)["timestamp"].value])
+            print("   ✅ snapshot(n) keeps the newest n, oldest first")
+
+            # count a multiple of capacity: the write position is back at slot 0
+            store.append("pond/1", reading(7))
+            assert window.to_frame()["temp"].tolist() == [34.0, 35.0, 36.0, 37.0]
+        finally:
+            window.close()
+            store.close()
+
+        assert open_window(tmp, "unknown") is None
+
+
+if __name__ == "__main__":
+    test_recent_window()
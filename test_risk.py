@@ -0,0 +1,75 @@
+# test_risk.py
+"""
+Risk rules: vectorized classify() vs the scalar rules, and hours_to_danger()
+interpolation between forecast horizons
+"""
+
+import numpy as np
+
+import risk
+from config import Thresholds
+
+
+def scalar_classify(temp, ph, do, turb):
+    """The gateway's original scalar rules"""
+    if (do < Thresholds.DO_MIN_DANGER or
+        ph < Thresholds.PH_MIN_DANGER or ph > Thresholds.PH_MAX_DANGER or
+        temp < Thresholds.TEMP_MIN_DANGER or temp > Thresholds.TEMP_MAX_DANGER or
+        turb > Thresholds.TURB_MAX_WARNING):
+        return "Danger"
+    if (Thresholds.TEMP_MIN_SAFE <= temp <= Thresholds.TEMP_MAX_SAFE and
+        Thresholds.PH_MIN_SAFE <= ph <= Thresholds.PH_MAX_SAFE and
+        do >= Thresholds.DO_MIN_SAFE and
+        turb <= Thresholds.TURB_MAX_SAFE):
+        return "Safe"
+    return "Warning"
+
+
+def test_risk():
+    print("=" * 60)
+    print("🧪 Risk rules: classify / merge / hours_to_danger")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    n = 5000
+    temp = rng.uniform(20, 38, n)
+    ph = rng.uniform(5, 10, n)
+    do = rng.uniform(0, 10, n)
+    turb = rng.uniform(0, 120, n)
+
+    labels = risk.classify(temp, ph, do, turb)
+    expected = [scalar_classify(*values) for values in zip(temp, ph, do, turb)]
+    assert list(labels) == expected
+    assert risk.classify(30, 7.5, 7, 10) == "Safe"
+    print(f"   ✅ classify matches the scalar rules on {n} readings")
+
+    assert risk.merge("Safe", "Unknown") == "Safe"
+    assert risk.merge("Warning", "Danger") == "Danger"
+    assert list(risk.merge(["Safe", "Warning"], ["Warning", "Safe"])) == ["Warning", "Warning"]
+
+    # Backtests change thresholds at runtime
+    original = Thresholds.DO_MIN_DANGER
+    try:
+        Thresholds.DO_MIN_DANGER = 2.5
+        assert risk.classify(30, 7.5, 2.2, 10) == "Danger"
+    finally:
+        Thresholds.DO_MIN_DANGER = original
+    assert risk.classify(30, 7.5, 2.2, 10) == "Warning"
+
+    horizons = [1, 3, 6, 12]
+    safe = [30, 7.5, 7, 10]
+    current = np.array([safe, safe, [30, 7.5, 1.5, 10]])
+    forecasts = np.repeat(np.array(safe, dtype=float)[None, :, None], 3, axis=0).repeat(4, axis=2)
+    # Row 0: DO falls 7 -> 1 between the 3h and 6h forecasts (crosses 2 at 5h)
+    forecasts[0, 2] = [7, 7, 1, 1]
+    # Row 1: stays safe; row 2: already in Danger
+    hours, param = risk.hours_to_danger(current, forecasts, horizons)
+    assert np.isclose(hours[0], 3 + 3 * (7 - Thresholds.DO_MIN_DANGER) / 6)
+    assert param[0] == "Dissolved_Oxygen"
+    assert np.isnan(hours[1]) and param[1] is None
+    assert hours[2] == 0 and param[2] == "Dissolved_Oxygen"
+    print(f"   ✅ hours_to_danger: {np.round(hours, 2).tolist()}")
+
+
+if __name__ == "__main__":
+    test_risk()
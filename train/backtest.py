@@ -0,0 +1,344 @@
+# backtest.py
+"""
+Backtest ngưỡng rủi ro (config.Thresholds) và model trên dữ liệu đã lưu,
+không phải phát lại từng message qua gateway
+
+1. Đọc một khoảng thời gian từ storage dạng cột (backend.range_arrow), theo
+   từng thiết bị, thứ tự thời gian
+2. Tính lại cho cả khoảng, theo batch vector hoá (numpy, risk.py):
+   - sensor_risk từ reading
+   - dự báo: mặc định phân loại lại pred_* đã lưu (nhanh, dùng khi chỉnh
+     ngưỡng); --models DIR: tính lại feature (features.build_features, cùng
+     spec với gateway, theo từng thiết bị) và dự báo mọi horizon, mỗi batch
+     BATCH_ROWS dòng kèm HISTORY_LEN - 1 dòng lịch sử của batch trước
+   - pred_risk, status (risk.merge) và số giờ tới ngưỡng Danger (risk.hours_to_danger)
+3. Báo cáo:
+   - confusion matrix status đã lưu vs status mới (ngưỡng / model thay đổi gì)
+   - confusion matrix pred_risk(t) vs sensor_risk thực tế tại t + horizon chính
+   - cảnh báo: số đợt Danger và số email (giới hạn ALERT_INTERVAL_MIN như gateway)
+   - lead time: cảnh báo (có dự báo vượt ngưỡng) sớm bao lâu trước mỗi đợt
+     Danger của cảm biến, tối đa bằng horizon dài nhất
+4. --write: UPDATE hàng loạt theo id các dòng có pred_* / sensor_risk /
+   pred_risk / status thay đổi (db_config.RESCORE_COLUMNS)
+
+Usage:
+    python backtest.py --start "2025-01-01" --end "2025-12-31 23:59:59"
+    python backtest.py --threshold DO_MIN_DANGER=2.5 --threshold TEMP_MAX_DANGER=36
+    python backtest.py --models ../models /tmp/mh --device pond-1     # so sánh 2 bộ model
+    python backtest.py --models ../models --write --json backtest.json
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "gateway"))
+import risk
+from config import ALERT_INTERVAL_MIN, STORAGE_BACKEND, Thresholds
+from features import HISTORY_LEN, build_features
+
+spec = importlib.util.spec_from_file_location("db_config", PROJECT_ROOT / "database" / "db_config.py")
+db_config = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_config)
+sys.modules["db_config"] = db_config  # storage.py shares this instance
+
+spec = importlib.util.spec_from_file_location("storage", PROJECT_ROOT / "database" / "storage.py")
+storage = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(storage)
+
+# sensor_logs columns, in risk.PARAMS order
+SENSOR_TO_TARGET = {"temp": "Temperature", "ph": "pH", "do": "Dissolved_Oxygen", "turbidity": "Turbidity"}
+PRED_COLUMNS = ("pred_temp", "pred_ph", "pred_do", "pred_turb")
+STORED_HORIZON = 6             # pred_* are the gateway's primary-horizon forecasts
+BATCH_ROWS = 100_000
+MATCH_TOLERANCE_MIN = 30       # observed reading must be this close to t + horizon
+RISK_LABELS = ["Safe", "Warning", "Danger", "Unknown"]
+
+
+# ========= 1) DỮ LIỆU =========
+def load_range(backend, start_time=None, end_time=None, device_id=None):
+    """Arrow range -> DataFrame (labels as plain strings, per device in time order)"""
+    df = backend.range_arrow(start_time, end_time, device_id).to_pandas()
+    for col in ("sensor_risk", "pred_risk", "status", "device_id"):
+        df[col] = df[col].astype(object)
+    return df
+
+
+def apply_thresholds(overrides):
+    """--threshold NAME=VALUE -> Thresholds attributes (risk.py reads them on every call)"""
+    for item in overrides:
+        name, _, value = item.partition("=")
+        if not hasattr(Thresholds, name):
+            raise SystemExit(f"❌ Không có ngưỡng: {name}")
+        setattr(Thresholds, name, float(value))
+
+
+# ========= 2) TÍNH LẠI =========
+def forecast_device(df, forecaster, feature_cols, batch_rows=BATCH_ROWS):
+    """(n, 4, len(horizons)) forecasts for one device's readings, NaN without enough history"""
+    frame = df.rename(columns=SENSOR_TO_TARGET)
+    n = len(frame)
+    forecast = np.full((n, len(SENSOR_TO_TARGET), len(forecaster.horizons)), np.nan)
+    for start in range(0, n, batch_rows):
+        stop = min(n, start + batch_rows)
+        lo = max(0, start - (HISTORY_LEN - 1))  # history carried over from the previous batch
+        features = build_features(frame.iloc[lo:stop], "timestamp")[feature_cols].iloc[start - lo:]
+        complete = features.notna().all(axis=1).to_numpy()
+        if complete.any():
+            forecast[start:stop][complete] = forecaster.predict(features.to_numpy()[complete])
+    return forecast
+
+
+def rescore(df, forecaster=None, feature_cols=None, batch_rows=BATCH_ROWS):
+    """
+    Re-score one device's readings (time order)
+
+    Returns:
+        dict of arrays: pred (n, 4), sensor_risk, pred_risk, status,
+        eta_hours (NaN = no Danger crossing forecast), horizons
+    """
+    current = df[list(SENSOR_TO_TARGET)].to_numpy(np.float64)
+    if forecaster is None:
+        horizons, primary = [STORED_HORIZON], 0
+        forecast = df[list(PRED_COLUMNS)].to_numpy(np.float64)[:, :, None]
+    else:
+        horizons, primary = forecaster.horizons, forecaster.primary_index()
+        forecast = forecast_device(df, forecaster, feature_cols, batch_rows)
+
+    pred = forecast[:, :, primary]
+    has_pred = ~np.isnan(pred).any(axis=1)
+    sensor_risk = risk.classify(*current.T)
+    pred_risk = np.where(has_pred, risk.classify(*pred.T), "Unknown")
+    eta, _ = risk.hours_to_danger(current, forecast, horizons)
+    return {
+        "pred": pred,
+        "sensor_risk": sensor_risk,
+        "pred_risk": pred_risk,
+        "status": risk.merge(sensor_risk, pred_risk),
+        "eta_hours": np.where(has_pred, eta, np.nan),
+        "horizons": horizons,
+        "primary": horizons[primary],
+    }
+
+
+# ========= 3) ĐÁNH GIÁ =========
+def observed_at(ts, labels, offset_hours, tolerance_min=MATCH_TOLERANCE_MIN):
+    """labels of the reading nearest to ts + offset (None when none within tolerance); ts: int64 ns, sorted"""
+    target = ts + int(offset_hours * 3600e9)
+    right = np.clip(np.searchsorted(ts, target), 0, len(ts) - 1)
+    left = np.clip(right - 1, 0, len(ts) - 1)
+    nearest = np.where(np.abs(ts[left] - target) <= np.abs(ts[right] - target), left, right)
+    ok = np.abs(ts[nearest] - target) <= tolerance_min * 60e9
+    return np.where(ok, labels[nearest], None)
+
+
+def alert_counts(ts, status, interval_min=ALERT_INTERVAL_MIN):
+    """(Danger episodes, emails the gateway would send: one per ALERT_INTERVAL_MIN while in Danger)"""
+    danger = status == "Danger"
+    episodes = int((danger & ~np.r_[False, danger[:-1]]).sum())
+    emails, last = 0, None
+    for t in ts[danger]:
+        if last is None or t - last >= interval_min * 60e9:
+            emails, last = emails + 1, t
+    return episodes, emails
+
+
+def lead_times(ts, sensor_risk, eta_hours, max_hours):
+    """
+    Hours of warning before each sensor Danger episode: length of the run of
+    readings with a forecast Danger crossing right before the onset (0 = missed)
+    """
+    danger = sensor_risk == "Danger"
+    onset = np.flatnonzero(danger & ~np.r_[False, danger[:-1]])
+    onset = onset[onset > 0]
+    warned = ~np.isnan(eta_hours) & ~danger
+    idx = np.arange(len(ts))
+    last_quiet = np.maximum.accumulate(np.where(~warned, idx, -1))
+    run_start = last_quiet[onset - 1] + 1
+    lead = np.where(warned[onset - 1], (ts[onset] - ts[np.minimum(run_start, onset)]) / 3600e9, 0.0)
+    return np.minimum(lead, max_hours)
+
+
+def confusion(actual, predicted, actual_name, predicted_name):
+    table = pd.crosstab(pd.Series(actual, name=actual_name), pd.Series(predicted, name=predicted_name))
+    labels = [label for label in RISK_LABELS if label in table.index or label in table.columns]
+    return table.reindex(index=labels, columns=labels, fill_value=0)
+
+
+def class_scores(table, label="Danger"):
+    """(precision, recall) of one class from a confusion table (rows = actual), None when undefined"""
+    tp = table.at[label, label] if label in table.index and label in table.columns else 0
+    predicted = table[label].sum() if label in table.columns else 0
+    actual = table.loc[label].sum() if label in table.index else 0
+    return (round(tp / predicted, 4) if predicted else None), (round(tp / actual, 4) if actual else None)
+
+
+def backtest(df, forecaster=None, feature_cols=None, batch_rows=BATCH_ROWS):
+    """Re-score every device of df and evaluate; returns (scored DataFrame, report dict)"""
+    start = time.perf_counter()
+    parts, leads = [], []
+    alerts = {"stored_episodes": 0, "stored_emails": 0, "episodes": 0, "emails": 0}
+    for device_id, group in df.groupby("device_id", sort=False):
+        result = rescore(group, forecaster, feature_cols, batch_rows)
+        ts = group["timestamp"].to_numpy("datetime64[ns]").astype(np.int64)
+        part = pd.DataFrame({
+            "id": group["id"].to_numpy(),
+            "device_id": device_id,
+            "timestamp": group["timestamp"].to_numpy(),
+            **{col: result["pred"][:, i] for i, col in enumerate(PRED_COLUMNS)},
+            "sensor_risk": result["sensor_risk"],
+            "pred_risk": result["pred_risk"],
+            "status": result["status"],
+            "eta_hours": result["eta_hours"],
+            "observed": observed_at(ts, result["sensor_risk"], result["primary"]),
+            "stored_status": group["status"].to_numpy(),
+        })
+        parts.append(part)
+        for prefix, status in (("stored_", group["status"].to_numpy()), ("", result["status"])):
+            episodes, emails = alert_counts(ts, status)
+            alerts[f"{prefix}episodes"] += episodes
+            alerts[f"{prefix}emails"] += emails
+        leads.append(lead_times(ts, result["sensor_risk"], result["eta_hours"], max(result["horizons"])))
+    scored = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    rescore_s = time.perf_counter() - start
+
+    if scored.empty:
+        return scored, {"rows": 0}
+    status_table = confusion(scored["stored_status"], scored["status"], "stored", "backtest")
+    matched = scored["observed"].notna() & (scored["pred_risk"] != "Unknown")
+    forecast_table = confusion(scored.loc[matched, "observed"], scored.loc[matched, "pred_risk"],
+                               f"actual(t+{result['primary']}h)", "pred_risk(t)")
+    precision, recall = class_scores(forecast_table)
+    lead = np.concatenate(leads)
+    warned = lead[lead > 0]
+    report = {
+        "rows": len(scored),
+        "devices": int(scored["device_id"].nunique()),
+        "horizons": result["horizons"],
+        "rescore_seconds": round(rescore_s, 3),
+        "status_changed": int((scored["stored_status"] != scored["status"]).sum()),
+        "status_confusion": status_table.to_dict(orient="index"),
+        "forecast_confusion": forecast_table.to_dict(orient="index"),
+        "forecast_danger": {"precision": precision, "recall": recall,
+                            "rows": int(matched.sum())},
+        "alerts": alerts,
+        "lead_time": {
+            "episodes": len(lead),
+            "warned": len(warned),
+            "median_hours": round(float(np.median(warned)), 2) if len(warned) else None,
+            "mean_hours": round(float(np.mean(warned)), 2) if len(warned) else None,
+            "p90_hours": round(float(np.percentile(warned, 90)), 2) if len(warned) else None,
+        },
+    }
+    return scored, report
+
+
+# ========= 4) GHI LẠI =========
+def changed_scores(df, scored):
+    """Tuples (*RESCORE_COLUMNS, id) of rows whose re-scored columns differ from the stored ones"""
+    stored = df.set_index("id").loc[scored["id"].to_numpy()]
+    new_pred = scored[list(PRED_COLUMNS)].round(3).to_numpy()
+    old_pred = stored[list(PRED_COLUMNS)].to_numpy(np.float64)
+    pred_changed = ~(np.isclose(new_pred, old_pred, atol=5e-4) | (np.isnan(new_pred) & np.isnan(old_pred))).all(axis=1)
+    label_changed = np.zeros(len(scored), dtype=bool)
+    for col in ("sensor_risk", "pred_risk", "status"):
+        label_changed |= stored[col].to_numpy() != scored[col].to_numpy()
+
+    rows = scored.loc[pred_changed | label_changed]
+    preds = rows[list(PRED_COLUMNS)].round(3).astype(object).where(rows[list(PRED_COLUMNS)].notna(), None)
+    return list(zip(*(preds[col] for col in PRED_COLUMNS),
+                    rows["sensor_risk"], rows["pred_risk"], rows["status"], rows["id"].astype(int).tolist()))
+
+
+# ========= IN KẾT QUẢ =========
+def print_report(name, report, load_s):
+    print(f"\n=== BACKTEST: {name} ({report['rows']:,} dòng, {report['devices']} thiết bị, "
+          f"horizon {report['horizons']}h) ===")
+    print(f"⏱️ Đọc {load_s:.2f}s | tính lại + đánh giá {report['rescore_seconds']:.2f}s")
+    print(f"\nStatus đã lưu (hàng) vs status mới (cột): {report['status_changed']:,} dòng thay đổi")
+    print(pd.DataFrame(report["status_confusion"]).T.to_string())
+    fd = report["forecast_danger"]
+    print(f"\nDự báo pred_risk(t) (cột) vs cảm biến thực tế tại t + horizon (hàng), {fd['rows']:,} dòng khớp:")
+    print(pd.DataFrame(report["forecast_confusion"]).T.to_string())
+    print(f"   Danger: precision = {fd['precision']} | recall = {fd['recall']}")
+    a = report["alerts"]
+    print(f"\n🚨 Đợt Danger: {a['stored_episodes']} → {a['episodes']} | "
+          f"email (mỗi {ALERT_INTERVAL_MIN} phút): {a['stored_emails']} → {a['emails']}")
+    lt = report["lead_time"]
+    if lt["warned"]:
+        print(f"⏱️ Lead time: {lt['warned']}/{lt['episodes']} đợt Danger của cảm biến được báo trước | "
+              f"median {lt['median_hours']}h, mean {lt['mean_hours']}h, p90 {lt['p90_hours']}h")
+    else:
+        print(f"⏱️ Lead time: 0/{lt['episodes']} đợt Danger được báo trước")
+
+
+def main(args):
+    apply_thresholds(args.threshold)
+    if args.write and len(args.models or []) > 1:
+        raise SystemExit("❌ --write chỉ dùng với một bộ model")
+    if args.backend == "duckdb":
+        backend = storage.get_backend("duckdb", path=args.db)
+    else:
+        if args.db:
+            db_config.DB_PATH = args.db
+        backend = storage.get_backend(args.backend)
+
+    start = time.perf_counter()
+    df = load_range(backend, args.start, args.end, args.device)
+    load_s = time.perf_counter() - start
+    if df.empty:
+        raise SystemExit("❌ Không có dữ liệu trong khoảng thời gian này")
+
+    runs = {}
+    for model_dir in args.models or [None]:
+        if model_dir is None:
+            name, forecaster, feature_cols = "pred_* đã lưu", None, None
+        else:
+            from inference import get_forecaster
+            name = str(model_dir)
+            forecaster = get_forecaster(args.inference_backend, model_dir, threads=args.threads)
+            feature_cols = list(joblib.load(Path(model_dir) / "feature_columns.pkl"))
+        scored, report = backtest(df, forecaster, feature_cols, args.batch_rows)
+        report["load_seconds"] = round(load_s, 3)
+        print_report(name, report, load_s)
+        runs[name] = report
+
+        if args.write:
+            start = time.perf_counter()
+            updated = backend.update_scores(changed_scores(df, scored))
+            report["written_rows"] = updated
+            print(f"💾 Đã ghi lại {updated:,} dòng thay đổi ({time.perf_counter() - start:.2f}s)")
+
+    if args.json:
+        thresholds = {k: v for k, v in vars(Thresholds).items() if k.isupper()}
+        Path(args.json).write_text(json.dumps({"thresholds": thresholds, "runs": runs}, indent=2,
+                                              ensure_ascii=False, default=str))
+        print(f"\n→ {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized backtest of risk thresholds and models over stored readings")
+    parser.add_argument("--start", help="Start time (inclusive), e.g. '2025-01-01'")
+    parser.add_argument("--end", help="End time (inclusive), e.g. '2025-12-31 23:59:59'")
+    parser.add_argument("--device", help="Only this device (default: every device)")
+    parser.add_argument("--backend", default=STORAGE_BACKEND, choices=list(storage.BACKENDS))
+    parser.add_argument("--db", type=Path, help="Database file (default: database/iot_data.db / iot_data.duckdb)")
+    parser.add_argument("--models", type=Path, nargs="+",
+                        help="Recompute features + forecasts with these model sets (default: re-classify stored pred_*)")
+    parser.add_argument("--inference-backend", default="xgboost", choices=["xgboost", "onnx"])
+    parser.add_argument("--threads", type=int, help="Threads per booster / onnxruntime session")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--threshold", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a config.Thresholds value, e.g. DO_MIN_DANGER=2.5 (repeatable)")
+    parser.add_argument("--write", action="store_true", help="Write changed pred_* / risk columns back (bulk UPDATE)")
+    parser.add_argument("--json", type=Path, help="Also write the report as JSON")
+    main(parser.parse_args())
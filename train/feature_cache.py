@@ -0,0 +1,156 @@
+# feature_cache.py
+"""
+Parquet cache for training data
+
+Two layers, both content-addressed so a stale entry can never be picked up:
+
+- source-<source hash>.parquet
+      typed copy of a workbook sheet / CSV (parsed once; later runs skip
+      pd.read_excel entirely)
+- features-<source hash>-<spec hash>.parquet
+      feature matrix built from that source; the spec hash covers
+      features.py (lags, windows, calendar, code) plus whatever the caller
+      adds (horizon, labels)
+
+The source hash is SHA-256 of the file bytes + sheet name, so editing the
+workbook (not just touching it) invalidates both layers.
+
+Usage:
+    python feature_cache.py --list
+    python feature_cache.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CACHE_DIR = Path(__file__).resolve().parent / "feature_cache"
+META_KEY = b"feature_cache"
+
+
+def source_hash(path, sheet=None):
+    """SHA-256 (16 hex chars) of the file content + sheet name"""
+    digest = hashlib.sha256(str(sheet).encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def spec_hash(spec):
+    """Hash of a JSON-serializable spec (dict / list / str)"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _read(path):
+    return pq.read_table(path).to_pandas()
+
+
+def _write(path, df, meta):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        META_KEY: json.dumps({**meta, "created": time.strftime("%Y-%m-%d %H:%M:%S")}).encode(),
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    pq.write_table(table, tmp)
+    # Concurrent trials never see a half-written file
+    os.replace(tmp, path)
+
+
+def read_source(path, sheet=None):
+    """Parse a workbook sheet (first sheet by default) or a CSV the slow way"""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xls"):
+        return pd.read_excel(path, sheet_name=sheet if sheet is not None else 0)
+    return pd.read_csv(path)
+
+
+def source_frame(path, sheet=None, cache_dir=CACHE_DIR):
+    """
+    Typed DataFrame of a workbook sheet or CSV, from the Parquet cache when
+    the file content is unchanged
+
+    Returns:
+        (DataFrame, source hash)
+    """
+    key = source_hash(path, sheet)
+    cached = Path(cache_dir) / f"source-{key}.parquet"
+    if cached.exists():
+        return _read(cached), key
+
+    df = read_source(path, sheet)
+    _write(cached, df, {"source": str(path), "sheet": sheet, "source_hash": key})
+    return df, key
+
+
+def feature_frame(path, build, spec, sheet=None, cache_dir=CACHE_DIR):
+    """
+    build(source DataFrame) -> feature DataFrame, cached per (source, spec)
+
+    Args:
+        path, sheet: Source workbook / CSV
+        build: Feature builder, only called on a cache miss
+        spec: Everything build() depends on besides the data (feature spec
+              fingerprint, horizon, ...), JSON-serializable
+
+    Returns:
+        (DataFrame, cache info dict with keys hit / path / load_seconds)
+    """
+    start = time.perf_counter()
+    src_key = source_hash(path, sheet)
+    key = spec_hash(spec)
+    cached = Path(cache_dir) / f"features-{src_key}-{key}.parquet"
+    hit = cached.exists()
+    if hit:
+        df = _read(cached)
+    else:
+        source, _ = source_frame(path, sheet, cache_dir)
+        df = build(source)
+        _write(cached, df, {"source": str(path), "sheet": sheet, "source_hash": src_key,
+                            "spec_hash": key, "spec": spec})
+    return df, {"hit": hit, "path": str(cached), "load_seconds": round(time.perf_counter() - start, 3)}
+
+
+def list_entries(cache_dir=CACHE_DIR):
+    """(file name, size KB, metadata dict) of every cache file"""
+    entries = []
+    for path in sorted(Path(cache_dir).glob("*.parquet")):
+        meta = pq.read_schema(path).metadata or {}
+        info = json.loads(meta.get(META_KEY, b"{}"))
+        entries.append((path.name, path.stat().st_size / 1024, info))
+    return entries
+
+
+def clear(cache_dir=CACHE_DIR):
+    """Delete every cache file, return the count"""
+    paths = list(Path(cache_dir).glob("*.parquet"))
+    for path in paths:
+        path.unlink()
+    return len(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training feature cache (Parquet)")
+    parser.add_argument("--dir", type=Path, default=CACHE_DIR)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", action="store_true", help="Show cached sources / feature matrices")
+    group.add_argument("--clear", action="store_true", help="Delete the cache")
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"🧹 Removed {clear(args.dir)} cache file(s) from {args.dir}")
+    else:
+        entries = list_entries(args.dir)
+        if not entries:
+            print(f"Cache is empty: {args.dir}")
+        for name, size_kb, info in entries:
+            print(f"{name:<60} {size_kb:>8.0f} KB  {info.get('created', '')}  {info.get('source', '')} [{info.get('sheet')}]")
@@ -0,0 +1,232 @@
+# onnx_export.py
+"""
+Export một bộ model (models/ hoặc output của trainIoT.py) sang ONNX, kiểm tra
+parity và benchmark với XGBoost gốc trên data/test.csv
+
+Mỗi model_{target}_{h}h.pkl thành một graph model_{target}_{h}h.onnx:
+
+    features (raw, thứ tự feature_columns.pkl, float64)
+      -> MinMax scaler_features (Mul + Add, float64 như sklearn)
+      -> Cast float32 -> TreeEnsembleRegressor (onnxmltools)
+      -> Cast float64 -> inverse MinMax scaler_{target} ((y - min_) / scale_)
+      -> forecast (đơn vị thật)
+
+Gateway chọn backend bằng INFERENCE_BACKEND=onnx (onnxruntime CPU, số thread
+mỗi session = INFERENCE_THREADS), khi đó không cần xgboost/scikit-learn lúc chạy.
+Cần: pip install onnx onnxmltools onnxruntime
+
+Usage:
+    python onnx_export.py                            # export ../models, kiểm tra parity
+    python onnx_export.py --models /tmp/mh --bench   # + latency/bộ nhớ: xgboost vs onnx
+    python onnx_export.py --bench --threads 2
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "gateway"))
+from features import TARGET_COLS, build_features
+from inference import get_forecaster, model_horizons
+
+MODEL_DIR = PROJECT_ROOT / "models"
+TEST_CSV = PROJECT_ROOT / "data" / "test.csv"
+TIME_COL = "DateTime"
+
+ONNX_OPSET = 17
+PARITY_TOL = 1e-4          # max |onnx - xgboost| in real units
+BENCH_ROWS = 500           # single-row predictions timed per backend
+
+
+def forecaster_graph(model, scaler_X, scaler_y, feature_cols, name):
+    """One ONNX graph: raw features -> scaled -> trees -> forecast in real units"""
+    try:
+        from onnx import TensorProto, helper, numpy_helper
+        from onnxmltools import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+    except ImportError:
+        raise ImportError("ONNX export requires: pip install onnx onnxmltools")
+
+    n_features = len(feature_cols)
+    trees = convert_xgboost(model, initial_types=[("scaled", FloatTensorType([None, n_features]))])
+    tree_output = trees.graph.output[0].name
+
+    def const(values, const_name):
+        return numpy_helper.from_array(np.asarray(values, dtype=np.float64).reshape(-1), const_name)
+
+    nodes = [
+        helper.make_node("Mul", ["features", "x_scale"], ["x_mul"]),
+        helper.make_node("Add", ["x_mul", "x_min"], ["x_scaled"]),
+        helper.make_node("Cast", ["x_scaled"], ["scaled"], to=TensorProto.FLOAT),
+        *trees.graph.node,
+        helper.make_node("Cast", [tree_output], ["y_scaled"], to=TensorProto.DOUBLE),
+        helper.make_node("Sub", ["y_scaled", "y_min"], ["y_shift"]),
+        helper.make_node("Div", ["y_shift", "y_scale"], ["forecast"]),
+    ]
+    graph = helper.make_graph(
+        nodes, name,
+        inputs=[helper.make_tensor_value_info("features", TensorProto.DOUBLE, [None, n_features])],
+        outputs=[helper.make_tensor_value_info("forecast", TensorProto.DOUBLE, [None, 1])],
+        initializer=[
+            *trees.graph.initializer,
+            const(scaler_X.scale_, "x_scale"), const(scaler_X.min_, "x_min"),
+            const(scaler_y.min_, "y_min"), const(scaler_y.scale_, "y_scale"),
+        ],
+    )
+    onnx_model = helper.make_model(
+        graph,
+        opset_imports=[helper.make_opsetid("", ONNX_OPSET),
+                       *(op for op in trees.opset_import if op.domain == "ai.onnx.ml")],
+        producer_name="iot-ai-gateway",
+    )
+    onnx_model.ir_version = trees.ir_version
+    helper.set_model_props(onnx_model, {"feature_columns": json.dumps(list(feature_cols))})
+    return onnx_model
+
+
+def export_model_set(model_dir=MODEL_DIR):
+    """Write model_{target}_{h}h.onnx next to every model_{target}_{h}h.pkl, return the paths"""
+    import onnx
+
+    model_dir = Path(model_dir)
+    _, horizons = model_horizons(model_dir, ".pkl")
+    feature_cols = joblib.load(model_dir / "feature_columns.pkl")
+    scaler_X = joblib.load(model_dir / "scaler_features.pkl")
+
+    paths = []
+    for col in TARGET_COLS:
+        scaler_y = joblib.load(model_dir / f"scaler_{col}.pkl")
+        for h in horizons:
+            key = f"{col}_{h}h"
+            graph = forecaster_graph(joblib.load(model_dir / f"model_{key}.pkl"), scaler_X, scaler_y, feature_cols, key)
+            onnx.checker.check_model(graph)
+            path = model_dir / f"model_{key}.onnx"
+            onnx.save(graph, str(path))
+            paths.append(path)
+    return paths
+
+
+def parity_rows(model_dir=MODEL_DIR, csv=TEST_CSV):
+    """Complete raw feature rows of data/test.csv in the model set's column order"""
+    df = pd.read_csv(csv).sort_values(TIME_COL).reset_index(drop=True)
+    feature_cols = joblib.load(Path(model_dir) / "feature_columns.pkl")
+    batch = build_features(df, TIME_COL)[feature_cols]
+    return batch[batch.notna().all(axis=1)].to_numpy(dtype=np.float64)
+
+
+def check_parity(model_dir=MODEL_DIR, X=None):
+    """Max |onnx - xgboost| per model on data/test.csv; raises when above PARITY_TOL"""
+    X = parity_rows(model_dir) if X is None else X
+    native = get_forecaster("xgboost", model_dir)
+    onnx_rt = get_forecaster("onnx", model_dir)
+    diff = np.abs(native.predict(X) - onnx_rt.predict(X)).max(axis=0)
+
+    result = {f"{col}_{h}h": float(diff[i, j])
+              for i, col in enumerate(TARGET_COLS) for j, h in enumerate(native.horizons)}
+    worst = max(result, key=result.get)
+    if result[worst] > PARITY_TOL:
+        raise AssertionError(f"ONNX parity failed: {worst} differs by {result[worst]:.2e} (> {PARITY_TOL:.0e})")
+    return result
+
+
+def _status_mb(field):
+    """VmRSS / VmHWM (peak) of this process from /proc, in MB"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith(f"{field}:"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def bench_worker(backend, model_dir, threads, rows_path):
+    """Runs in a fresh process so memory numbers only include one backend"""
+    X = np.load(rows_path)
+    rss_before = _status_mb("VmRSS")
+    start = time.perf_counter()
+    forecaster = get_forecaster(backend, model_dir, threads=threads)
+    load_s = time.perf_counter() - start
+    rss_loaded = _status_mb("VmRSS")
+
+    single = X[:BENCH_ROWS]
+    forecaster.predict(single[:1])  # warm-up
+    times = []
+    for row in single:
+        start = time.perf_counter()
+        forecaster.predict(row[None, :])
+        times.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    forecaster.predict(X)
+    batch_s = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "models": len(forecaster),
+        "load_s": round(load_s, 3),
+        "row_p50_ms": round(float(np.percentile(times, 50)), 3),
+        "row_p95_ms": round(float(np.percentile(times, 95)), 3),
+        "batch_rows_per_s": round(len(X) / batch_s),
+        "model_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(_status_mb("VmHWM"), 1),
+    }
+
+
+def benchmark(model_dir=MODEL_DIR, threads=1, X=None):
+    """Latency / memory of each backend on data/test.csv, one subprocess per backend"""
+    X = parity_rows(model_dir) if X is None else X
+    with tempfile.TemporaryDirectory() as tmp:
+        rows_path = Path(tmp) / "rows.npy"
+        np.save(rows_path, X)
+        results = []
+        for backend in ("xgboost", "onnx"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--models", str(model_dir), "--threads", str(threads),
+                 "--bench-worker", backend, "--rows", str(rows_path)],
+                capture_output=True, text=True, check=True
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def print_benchmark(results, n_rows, threads):
+    print(f"\n=== BENCHMARK ({n_rows} dòng data/test.csv, {threads} thread) ===")
+    print(f"{'backend':10} {'models':>6} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'rows/s':>8} {'model MB':>9} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['backend']:10} {r['models']:>6} {r['load_s']:>7.3f} {r['row_p50_ms']:>7.3f} {r['row_p95_ms']:>7.3f} "
+              f"{r['batch_rows_per_s']:>8} {r['model_mb']:>9.1f} {r['peak_rss_mb']:>8.1f}")
+    print("   (p50/p95: 1 reading, mọi target x horizon; model MB: RSS tăng khi nạp backend + model)")
+
+
+def main(args):
+    if args.bench_worker:
+        print(json.dumps(bench_worker(args.bench_worker, args.models, args.threads, args.rows)))
+        return
+
+    print(f"Export ONNX: {args.models}")
+    paths = export_model_set(args.models)
+    print(f"   ✓ {len(paths)} graph ({', '.join(p.name for p in paths[:2])}, ...)")
+
+    X = parity_rows(args.models)
+    diffs = check_parity(args.models, X)
+    print(f"   ✅ Parity với XGBoost trên {len(X)} dòng: max |Δ| = {max(diffs.values()):.2e} (ngưỡng {PARITY_TOL:.0e})")
+
+    if args.bench:
+        print_benchmark(benchmark(args.models, args.threads, X), len(X), args.threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a model set to ONNX, check parity and benchmark vs XGBoost")
+    parser.add_argument("--models", type=Path, default=MODEL_DIR, help="Model set folder (model_*.pkl + scalers)")
+    parser.add_argument("--bench", action="store_true", help="Latency / memory benchmark: xgboost vs onnx")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per booster / onnxruntime session")
+    parser.add_argument("--bench-worker", choices=["xgboost", "onnx"], help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=Path, help=argparse.SUPPRESS)
+    main(parser.parse_args())
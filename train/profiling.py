@@ -0,0 +1,241 @@
+# profiling.py
+"""
+Per-phase profile of a training run: wall time, CPU and peak memory
+
+trainIoT.py --profile wraps each phase of main() in profiling.phase():
+load (đọc workbook / Parquet cache) > features, prepare (MinMax scaling +
+nhãn), fit (fold fits + final fits trong process pool), evaluate, save, plot.
+Phase lồng nhau có tên "load/features". Mỗi phase ghi:
+
+- wall_s, cpu_s:  CPU user+system của process chính và mọi worker
+- cores:          cpu_s / wall_s (số core dùng trung bình)
+- cpu_pct:        cores / số CPU
+- peak_rss_mb:    RSS lớn nhất (process chính + workers), lấy mẫu mỗi SAMPLE_INTERVAL
+- rss_delta_mb:   RSS process chính sau - trước phase
+
+Báo cáo (training_profile.json) được so với baseline lưu sẵn; phase chậm
+hơn TIME_TOLERANCE hoặc tốn RAM hơn MEMORY_TOLERANCE (và vượt ngưỡng tuyệt
+đối, tránh nhiễu ở phase ngắn) là regression -> exit code 1, như test fail.
+Cần: pip install psutil
+
+Usage:
+    python trainIoT.py --no-plot --profile                   # -> training_profile.json, so với baseline nếu có
+    python trainIoT.py --no-plot --profile --save-baseline   # lưu làm baseline
+    python profiling.py ../models/training_profile.json      # so lại một báo cáo bất kỳ
+"""
+
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_FILE = "training_profile.json"
+BASELINE_FILE = Path(__file__).resolve().parent / "profile_baseline.json"
+SAMPLE_INTERVAL = 0.05       # seconds between RSS samples
+TIME_TOLERANCE = 0.25        # +25% wall time ...
+MIN_SECONDS = 0.5            # ... and at least +0.5s
+MEMORY_TOLERANCE = 0.20      # +20% peak RSS ...
+MIN_MB = 25                  # ... and at least +25 MB
+
+_active = None
+
+
+@contextmanager
+def phase(name):
+    """Profile a block under the active profiler (no-op when not profiling)"""
+    if _active is None:
+        yield
+        return
+    with _active.phase(name):
+        yield
+
+
+class PhaseProfiler:
+    """Records wall / CPU / peak RSS per phase, including child processes"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        try:
+            import psutil
+        except ImportError:
+            raise ImportError("Profiling requires: pip install psutil")
+        self._psutil = psutil
+        self._proc = psutil.Process()
+        self.interval = interval
+        self.cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        self.phases = []
+        self._open = []            # stack of (record, start wall, start cpu)
+        self._started = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def __enter__(self):
+        global _active
+        _active = self
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        self._stop.set()
+        self._thread.join()
+        self.wall_s = time.perf_counter() - self._start
+        _active = None
+
+    def _children(self):
+        try:
+            return self._proc.children(recursive=True)
+        except self._psutil.Error:
+            return []
+
+    def _rss_mb(self):
+        """RSS of this process + live workers"""
+        total = self._proc.memory_info().rss
+        for child in self._children():
+            try:
+                total += child.memory_info().rss
+            except self._psutil.Error:
+                pass
+        return total / 2**20
+
+    def _cpu_s(self):
+        """CPU seconds of this process, reaped children and live children"""
+        t = self._proc.cpu_times()
+        total = t.user + t.system + t.children_user + t.children_system
+        for child in self._children():
+            try:
+                c = child.cpu_times()
+                total += c.user + c.system
+            except self._psutil.Error:
+                pass
+        return total
+
+    def _sample(self):
+        rss = self._rss_mb()
+        with self._lock:
+            for record, _, _ in self._open:
+                record["peak_rss_mb"] = max(record["peak_rss_mb"], rss)
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @contextmanager
+    def phase(self, name):
+        parent = self._open[-1][0]["name"] if self._open else None
+        record = {
+            "name": f"{parent}/{name}" if parent else name,
+            "_order": self._started,
+            "peak_rss_mb": 0.0,
+            "rss_start_mb": self._proc.memory_info().rss / 2**20,
+        }
+        self._started += 1
+        with self._lock:
+            self._open.append((record, time.perf_counter(), self._cpu_s()))
+        self._sample()
+        try:
+            yield record
+        finally:
+            self._sample()
+            with self._lock:
+                _, start_wall, start_cpu = self._open.pop()
+            wall = time.perf_counter() - start_wall
+            cpu = self._cpu_s() - start_cpu
+            record.update({
+                "wall_s": round(wall, 3),
+                "cpu_s": round(cpu, 3),
+                "cores": round(cpu / wall, 2) if wall > 0 else 0.0,
+                "cpu_pct": round(100 * cpu / wall / self.cpus, 1) if wall > 0 else 0.0,
+                "peak_rss_mb": round(record["peak_rss_mb"], 1),
+                "rss_delta_mb": round(self._proc.memory_info().rss / 2**20 - record.pop("rss_start_mb"), 1),
+            })
+            self.phases.append(record)
+
+    def report(self, context, **sections):
+        """
+        Machine-readable profile: phases in start order, run context (what
+        must match for a fair comparison) and any extra sections
+        """
+        order = [{k: v for k, v in p.items() if k != "_order"} for p in sorted(self.phases, key=lambda p: p["_order"])]
+        return {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "host": {"machine": platform.machine(), "python": platform.python_version(), "cpus": self.cpus},
+            "context": context,
+            "total": {"wall_s": round(self.wall_s, 3), "peak_rss_mb": max((p["peak_rss_mb"] for p in order), default=0.0)},
+            "phases": order,
+            **sections,
+        }
+
+
+def compare(current, baseline, time_tol=TIME_TOLERANCE, mem_tol=MEMORY_TOLERANCE):
+    """
+    Rows (phase, metric, baseline, current, change ratio, regressed) for every
+    phase in both reports, plus the run total
+    """
+    base = {p["name"]: p for p in baseline["phases"]}
+    base["total"] = {"name": "total", **baseline["total"]}
+    rows = []
+    for p in [*current["phases"], {"name": "total", **current["total"]}]:
+        if p["name"] not in base:
+            continue
+        b = base[p["name"]]
+        for metric, tol, floor in (("wall_s", time_tol, MIN_SECONDS), ("peak_rss_mb", mem_tol, MIN_MB)):
+            old, new = b[metric], p[metric]
+            change = (new - old) / old if old else 0.0
+            rows.append((p["name"], metric, old, new, change, change > tol and new - old > floor))
+    return rows
+
+
+def check(current, baseline_path=BASELINE_FILE, time_tol=TIME_TOLERANCE, mem_tol=MEMORY_TOLERANCE):
+    """Print the comparison with the stored baseline; True when nothing regressed (or no baseline)"""
+    baseline_path = Path(baseline_path)
+    if not baseline_path.exists():
+        print(f"ℹ️ Chưa có baseline ({baseline_path.name}), chạy lại với --save-baseline để lưu")
+        return True
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("context") != current.get("context") or baseline.get("host") != current.get("host"):
+        print("⚠️ Baseline khác cấu hình / máy (context, host): so sánh chỉ mang tính tham khảo")
+
+    rows = compare(current, baseline, time_tol, mem_tol)
+    print(f"\n=== PROFILE vs BASELINE ({baseline['created']}) ===")
+    print(f"{'phase':24} {'metric':12} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, metric, old, new, change, regressed in rows:
+        print(f"{name:24} {metric:12} {old:>10.2f} {new:>10.2f} {change:>+7.0%} {'❌' if regressed else ''}")
+    regressions = [r for r in rows if r[-1]]
+    if regressions:
+        print(f"❌ {len(regressions)} regression (ngưỡng: thời gian +{time_tol:.0%}, RAM +{mem_tol:.0%})")
+        return False
+    print("✅ Không có regression")
+    return True
+
+
+def print_profile(profile):
+    print(f"\n=== PROFILE ({profile['host']['cpus']} CPU) ===")
+    print(f"{'phase':24} {'wall s':>8} {'cpu s':>8} {'cores':>6} {'cpu %':>6} {'peak MB':>8} {'ΔRSS MB':>8}")
+    for p in profile["phases"]:
+        print(f"{p['name']:24} {p['wall_s']:>8.2f} {p['cpu_s']:>8.2f} {p['cores']:>6.2f} {p['cpu_pct']:>6.1f} "
+              f"{p['peak_rss_mb']:>8.1f} {p['rss_delta_mb']:>8.1f}")
+    print(f"{'total':24} {profile['total']['wall_s']:>8.2f} {'':>8} {'':>6} {'':>6} {profile['total']['peak_rss_mb']:>8.1f}")
+
+
+def main(args):
+    current = json.loads(Path(args.report).read_text())
+    print_profile(current)
+    if not check(current, args.baseline, args.time_tol, args.mem_tol):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a training profile with the stored baseline")
+    parser.add_argument("report", type=Path, help=f"Profile JSON ({PROFILE_FILE} from trainIoT.py --profile)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--time-tol", type=float, default=TIME_TOLERANCE, help="Allowed wall-time increase (0.25 = +25%%)")
+    parser.add_argument("--mem-tol", type=float, default=MEMORY_TOLERANCE, help="Allowed peak-RSS increase")
+    main(parser.parse_args())
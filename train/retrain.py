@@ -0,0 +1,346 @@
+# retrain.py
+"""
+Huấn luyện tiếp 4 mô hình 6h từ dữ liệu thật trong sensor_logs
+
+1. Đọc trung bình theo giờ của từng thiết bị, từng cửa sổ thời gian
+   (db_config.iter_hourly_means), không nạp cả bảng; giờ bị thiếu để NaN
+   nên lag/rolling không nối qua khoảng trống
+2. Feature + nhãn như trainIoT.py, scale bằng scaler_* đang triển khai
+   (boosting tiếp cần cùng thang đo với model cũ)
+3. Chia theo thời gian: train | val (early stopping) | holdout (gần nhất)
+4. Mỗi target: boosting tiếp từ booster hiện tại (xgb_model=...), số cây
+   thêm lấy từ early stopping trên val, rồi fit lại trên train + val
+5. So MAE trên holdout với model hiện tại: chỉ target nào tốt hơn ít nhất
+   MIN_IMPROVEMENT mới được publish. Mỗi lần publish là một version trong
+   models/versions/<version>/ (đủ bộ model + report), models/model_version.json
+   ghi version đang chạy; --rollback để quay lại.
+
+Gateway đọc models/ lúc khởi động: restart gateway sau khi publish.
+
+Usage:
+    python retrain.py                              # mọi thiết bị, holdout 7 ngày
+    python retrain.py --device pond-1 --holdout-hours 72 --dry-run
+    python retrain.py --list
+    python retrain.py --rollback 20261019-101500
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+
+import trainIoT
+from trainIoT import EARLY_STOPPING_ROUNDS, HORIZON_H, TARGETS_ORIG, TIME_COL_ORIG
+from features import HISTORY_LEN
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location("db_config", PROJECT_ROOT / "database" / "db_config.py")
+db_config = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db_config)
+
+MODEL_DIR = PROJECT_ROOT / "models"
+VERSIONS_DIR = "versions"
+VERSION_FILE = "model_version.json"
+RUN_LOG = "retrain_log.jsonl"
+# sensor_logs column -> training column
+SENSOR_TO_TARGET = {"temp": "Temperature", "ph": "pH", "do": "Dissolved_Oxygen", "turbidity": "Turbidity"}
+
+HOLDOUT_HOURS = 24 * 7
+VAL_HOURS = 24 * 7
+MAX_EXTRA_ROUNDS = 300
+MIN_IMPROVEMENT = 0.01  # holdout MAE phải giảm ít nhất 1%
+MIN_TRAIN_ROWS = 48
+MIN_HOLDOUT_ROWS = 24
+# Giờ liên tục (đủ 4 thông số) cho dòng feature đầu tiên: lag/rolling + nhãn HORIZON_H
+MIN_FEATURE_HOURS = HISTORY_LEN + HORIZON_H
+
+
+def model_file(col):
+    """Only the primary-horizon (HORIZON_H) models are continued"""
+    return f"model_{trainIoT.model_key(col)}.pkl"
+
+
+# ========= 1) DỮ LIỆU TỪ SENSOR_LOGS =========
+def load_hourly_history(device_id=None, chunk_hours=24 * 7):
+    """Hourly means of one device as a gap-aware (every hour present) training frame"""
+    chunks = list(db_config.iter_hourly_means(device_id, chunk_hours=chunk_hours))
+    if not chunks:
+        return pd.DataFrame(columns=[TIME_COL_ORIG, *TARGETS_ORIG])
+    df = pd.concat(chunks, ignore_index=True).rename(columns={"bucket": TIME_COL_ORIG, **SENSOR_TO_TARGET})
+    df[TIME_COL_ORIG] = pd.to_datetime(df[TIME_COL_ORIG])
+    # Giờ không có dữ liệu -> NaN, create_features() bỏ các cửa sổ chạm vào đó
+    df = df.set_index(TIME_COL_ORIG)[TARGETS_ORIG].asfreq("h")
+    return df.reset_index()
+
+
+def longest_complete_run(hourly):
+    """Longest stretch of consecutive hours with every target present"""
+    complete = hourly[TARGETS_ORIG].notna().all(axis=1)
+    runs = complete.groupby((~complete).cumsum()).sum()
+    return int(runs.max()) if len(runs) else 0
+
+
+def build_training_frame(device_ids, chunk_hours=24 * 7):
+    """
+    Features + labels per device (series are not mixed), stacked in time order
+
+    Returns:
+        (frame, {device_id: (hours with data, longest run of complete hours)})
+    """
+    frames, hours = [], {}
+    for device_id in device_ids:
+        hourly = load_hourly_history(device_id, chunk_hours)
+        feat = trainIoT.create_features(hourly, TIME_COL_ORIG, TARGETS_ORIG, (HORIZON_H,))
+        hours[device_id] = (int(hourly[TARGETS_ORIG[0]].notna().sum()), longest_complete_run(hourly))
+        print(f"   {device_id:20} {hours[device_id][0]:>6,} giờ → {len(feat):>6,} dòng feature")
+        frames.append(feat.assign(device_id=device_id))
+    if not frames:
+        return pd.DataFrame(), hours
+    frame = pd.concat(frames, ignore_index=True).sort_values(TIME_COL_ORIG, kind="stable").reset_index(drop=True)
+    return frame, hours
+
+
+def time_split(df_feat, holdout_hours=HOLDOUT_HOURS, val_hours=VAL_HOURS):
+    """Boolean masks train / val / holdout by feature time (holdout = most recent)"""
+    # Nhãn của dòng t là giá trị lúc t + HORIZON_H: chừa khoảng đó để val không nhìn thấy holdout
+    ts = df_feat[TIME_COL_ORIG]
+    holdout_start = ts.max() - pd.Timedelta(hours=holdout_hours - 1)
+    val_start = holdout_start - pd.Timedelta(hours=val_hours + HORIZON_H)
+    train = (ts < val_start - pd.Timedelta(hours=HORIZON_H)).to_numpy()
+    val = ((ts >= val_start) & (ts < holdout_start - pd.Timedelta(hours=HORIZON_H))).to_numpy()
+    holdout = (ts >= holdout_start).to_numpy()
+    return train, val, holdout
+
+
+# ========= 2) BOOSTING TIẾP =========
+def load_current(model_dir):
+    """Deployed models, target scalers, scaler_X and feature columns"""
+    model_dir = Path(model_dir)
+    models = {col: joblib.load(model_dir / model_file(col)) for col in TARGETS_ORIG}
+    scalers_Y = {col: joblib.load(model_dir / f"scaler_{col.replace(' ', '_')}.pkl") for col in TARGETS_ORIG}
+    return models, scalers_Y, joblib.load(model_dir / "scaler_features.pkl"), joblib.load(model_dir / "feature_columns.pkl")
+
+
+def continue_boosting(current, X, y, train, val, max_rounds=MAX_EXTRA_ROUNDS, threads=None):
+    """
+    Extra trees on top of current's booster: the count comes from early
+    stopping on val, then the continuation is refit on train + val
+
+    Returns:
+        (new model, extra rounds)
+    """
+    base_rounds = current.get_booster().num_boosted_rounds()
+    params = {**current.get_params(), "n_estimators": max_rounds, "n_jobs": threads}
+    probe = XGBRegressor(**{**params, "early_stopping_rounds": EARLY_STOPPING_ROUNDS})
+    probe.fit(X[train], y[train], eval_set=[(X[val], y[val])], xgb_model=current.get_booster(), verbose=False)
+    # best_iteration đếm cả các cây cũ
+    extra = max(1, probe.best_iteration + 1 - base_rounds)
+
+    fit_rows = train | val
+    model = XGBRegressor(**{**params, "n_estimators": extra})
+    model.fit(X[fit_rows], y[fit_rows], xgb_model=current.get_booster(), verbose=False)
+    return model, extra
+
+
+def retrain(df_feat, model_dir, holdout_hours=HOLDOUT_HOURS, val_hours=VAL_HOURS,
+            max_rounds=MAX_EXTRA_ROUNDS, min_improvement=MIN_IMPROVEMENT, threads=None):
+    """
+    Returns:
+        candidates {target: new model for targets that beat the current one},
+        report {target: holdout MAE current / new, trees, published}
+    """
+    models, scalers_Y, scaler_X, feature_cols = load_current(model_dir)
+    train, val, holdout = time_split(df_feat, holdout_hours, val_hours)
+    print(f"   → train {train.sum():,} | val {val.sum():,} | holdout {holdout.sum():,} dòng")
+    if train.sum() < MIN_TRAIN_ROWS or val.sum() == 0 or holdout.sum() < MIN_HOLDOUT_ROWS:
+        raise SystemExit(f"❌ Chưa đủ lịch sử (cần >= {MIN_TRAIN_ROWS} dòng train, val, >= {MIN_HOLDOUT_ROWS} dòng holdout)")
+
+    X = scaler_X.transform(df_feat[feature_cols].values)
+    candidates, report = {}, {}
+    for col in TARGETS_ORIG:
+        start = time.perf_counter()
+        y_real = df_feat[trainIoT.label_column(col)].to_numpy()
+        y = scalers_Y[col].transform(y_real.reshape(-1, 1)).ravel()
+
+        def holdout_mae(model):
+            pred = scalers_Y[col].inverse_transform(model.predict(X[holdout]).reshape(-1, 1)).ravel()
+            return float(np.mean(np.abs(pred - y_real[holdout])))
+
+        model, extra = continue_boosting(models[col], X, y, train, val, max_rounds, threads)
+        current_mae, new_mae = holdout_mae(models[col]), holdout_mae(model)
+        published = new_mae < current_mae * (1 - min_improvement)
+        if published:
+            candidates[col] = model
+        report[col] = {
+            "holdout_mae_current": current_mae,
+            "holdout_mae_new": new_mae,
+            "trees_current": models[col].get_booster().num_boosted_rounds(),
+            "trees_added": extra,
+            "published": published,
+            "fit_seconds": round(time.perf_counter() - start, 3),
+        }
+        mark = "✅" if published else "·"
+        print(f"   {mark} {col:18} MAE holdout {current_mae:.4f} → {new_mae:.4f} (+{extra} cây)")
+    report["_run"] = {
+        "rows": {"train": int(train.sum()), "val": int(val.sum()), "holdout": int(holdout.sum())},
+        "holdout_start": str(df_feat[TIME_COL_ORIG][holdout].min()),
+        "holdout_end": str(df_feat[TIME_COL_ORIG][holdout].max()),
+        "min_improvement": min_improvement,
+    }
+    return candidates, report
+
+
+# ========= 3) VERSION / PUBLISH =========
+def _copy_atomic(src, dst):
+    tmp = dst.with_suffix(f".{os.getpid()}.tmp")
+    shutil.copyfile(src, tmp)
+    # Gateway khởi động đúng lúc này vẫn đọc được file cũ hoặc mới, không bao giờ file dở
+    os.replace(tmp, dst)
+
+
+def live_version(model_dir):
+    path = Path(model_dir) / VERSION_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _archive_live(model_dir, version_dir):
+    """Copy the full deployed set (models + scalers + feature columns) into version_dir"""
+    version_dir.mkdir(parents=True, exist_ok=True)
+    for path in Path(model_dir).glob("*.pkl"):
+        shutil.copyfile(path, version_dir / path.name)
+
+
+def publish(candidates, report, model_dir, version=None):
+    """
+    Store the new set as models/versions/<version>/ and make it live;
+    the first publish also archives the original set as versions/baseline
+    """
+    model_dir = Path(model_dir)
+    versions = model_dir / VERSIONS_DIR
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    previous = live_version(model_dir)
+    if previous is None and not (versions / "baseline").exists():
+        _archive_live(model_dir, versions / "baseline")
+
+    version_dir = versions / version
+    _archive_live(model_dir, version_dir)
+    for col, model in candidates.items():
+        joblib.dump(model, version_dir / model_file(col))
+    (version_dir / "report.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    for col in candidates:
+        _copy_atomic(version_dir / model_file(col), model_dir / model_file(col))
+    _set_live(model_dir, version, previous["version"] if previous else "baseline", list(candidates))
+    _refresh_onnx(model_dir)
+    return version_dir
+
+
+def _refresh_onnx(model_dir):
+    """Re-export model_*.onnx when the live set has them, so INFERENCE_BACKEND=onnx never serves stale graphs"""
+    if any(Path(model_dir).glob("model_*.onnx")):
+        from onnx_export import export_model_set
+        export_model_set(model_dir)
+
+
+def _set_live(model_dir, version, parent, targets):
+    (Path(model_dir) / VERSION_FILE).write_text(json.dumps({
+        "version": version,
+        "parent": parent,
+        "updated_targets": targets,
+        "published_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }, indent=2))
+
+
+def rollback(model_dir, version):
+    """Make a stored version live again (every model file of it)"""
+    model_dir = Path(model_dir)
+    version_dir = model_dir / VERSIONS_DIR / version
+    if not version_dir.is_dir():
+        raise SystemExit(f"❌ Không có version: {version}")
+    previous = live_version(model_dir)
+    for col in TARGETS_ORIG:
+        _copy_atomic(version_dir / model_file(col), model_dir / model_file(col))
+    _set_live(model_dir, version, previous["version"] if previous else "baseline", list(TARGETS_ORIG))
+    _refresh_onnx(model_dir)
+
+
+def list_versions(model_dir):
+    live = (live_version(model_dir) or {"version": "baseline"})["version"]
+    for version_dir in sorted((Path(model_dir) / VERSIONS_DIR).glob("*/")):
+        report_path = version_dir / "report.json"
+        summary = ""
+        if report_path.exists():
+            report = json.loads(report_path.read_text())
+            summary = ", ".join(f"{col} {r['holdout_mae_current']:.3f}→{r['holdout_mae_new']:.3f}"
+                                for col, r in report.items() if col != "_run" and r["published"])
+        print(f"{'▶' if version_dir.name == live else ' '} {version_dir.name:<20} {summary}")
+
+
+def log_run(model_dir, report, version):
+    with open(Path(model_dir) / RUN_LOG, "a") as f:
+        f.write(json.dumps({"at": time.strftime("%Y-%m-%d %H:%M:%S"), "version": version, "report": report}) + "\n")
+
+
+def main(args):
+    if args.db:
+        db_config.DB_PATH = args.db
+    if args.list:
+        list_versions(args.models)
+        return
+    if args.rollback:
+        rollback(args.models, args.rollback)
+        print(f"✅ Đã quay lại version {args.rollback} (restart gateway để nạp)")
+        return
+
+    device_ids = args.device or db_config.list_devices()
+    print(f"Đang đọc lịch sử theo giờ từ {db_config.DB_PATH} ({len(device_ids)} thiết bị)...")
+    df_feat, hours = build_training_frame(device_ids, args.chunk_hours)
+    if df_feat.empty:
+        if not any(total for total, _ in hours.values()):
+            raise SystemExit("❌ sensor_logs chưa có dữ liệu")
+        longest = max(run for _, run in hours.values())
+        raise SystemExit(f"❌ Chưa đủ giờ liên tục để tạo feature: đoạn dài nhất {longest} giờ đủ 4 thông số, "
+                         f"cần >= {MIN_FEATURE_HOURS} giờ liên tục (lag/rolling {HISTORY_LEN}h + nhãn {HORIZON_H}h)")
+
+    print(f"\nBoosting tiếp từ {args.models} ...")
+    candidates, report = retrain(df_feat, args.models, args.holdout_hours, args.val_hours,
+                                 args.max_rounds, args.min_improvement, args.threads)
+    report["_run"]["devices"] = device_ids
+
+    version = None
+    if candidates and not args.dry_run:
+        version_dir = publish(candidates, report, args.models)
+        version = version_dir.name
+        print(f"\n✅ Đã publish version {version} ({', '.join(candidates)}) → restart gateway để nạp")
+    elif candidates:
+        print(f"\n(dry run) Sẽ publish: {', '.join(candidates)}")
+    else:
+        print("\n· Không model nào tốt hơn model hiện tại, giữ nguyên")
+    if not args.dry_run:
+        log_run(args.models, report, version)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continue boosting the deployed 6h models on sensor_logs history")
+    parser.add_argument("--db", type=Path, help="SQLite file (default: database/iot_data.db)")
+    parser.add_argument("--models", type=Path, default=MODEL_DIR)
+    parser.add_argument("--device", nargs="+", help="Device ids (default: every device in sensor_logs)")
+    parser.add_argument("--holdout-hours", type=int, default=HOLDOUT_HOURS, help="Most recent hours used only to accept / reject")
+    parser.add_argument("--val-hours", type=int, default=VAL_HOURS, help="Hours before the holdout used for early stopping")
+    parser.add_argument("--max-rounds", type=int, default=MAX_EXTRA_ROUNDS, help="Upper bound on trees added per model")
+    parser.add_argument("--min-improvement", type=float, default=MIN_IMPROVEMENT, help="Relative holdout MAE gain needed to publish")
+    parser.add_argument("--chunk-hours", type=int, default=24 * 7, help="Hours read from sensor_logs per query")
+    parser.add_argument("--threads", type=int, help="XGBoost threads (default: all cores)")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate only, publish nothing")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--list", action="store_true", help="Show stored versions (▶ = live)")
+    group.add_argument("--rollback", metavar="VERSION", help="Make a stored version live again")
+    main(parser.parse_args())
@@ -0,0 +1,242 @@
+# slim.py
+"""
+Biến thể gọn của 4 mô hình 6h: bớt feature + bớt cây, theo ngân sách CPU
+
+1. Fit model đủ feature trên phần train của fold cuối (như trainIoT.py
+   đánh giá), xếp hạng feature của từng target theo gain của XGBoost
+2. Fit lại với top-k feature (k trong FEATURE_COUNTS); các cột bị bỏ được
+   đặt NaN lúc train nên cây không bao giờ split trên chúng, nhưng model
+   vẫn nhận nguyên hàng feature -> gateway không phải đổi gì
+3. Mỗi (k, số cây T trong TREE_COUNTS): dự báo bằng iteration_range=(0, T)
+   trên fold cuối -> MAE từng target, accuracy phân loại rủi ro, và thời gian
+   predict 1 dòng (4 model, 1 thread) trên booster đã cắt còn T cây
+4. Bảng Pareto (độ trễ thấp hơn / accuracy cao hơn / MAE thấp hơn), export
+   biến thể được chọn thành bộ model triển khai được (MODEL_SET_DIR)
+
+Usage:
+    python slim.py                                  # chỉ in bảng
+    python slim.py --max-latency-ms 1.0             # chọn + export vào ../models/slim
+    python slim.py --export 12:100 --out ../models/slim
+    # gateway: MODEL_SET_DIR=models/slim trong .env
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+from xgboost import XGBRegressor
+
+import trainIoT
+from trainIoT import DATA_DIR, EXCEL_FILE, N_SPLITS, TARGETS_ORIG, XGB_PARAMS, DO_COL, PH_COL, TEMP_COL
+
+FEATURE_COUNTS = (None, 40, 24, 12, 6)  # None = đủ feature
+TREE_COUNTS = (10, 25, 50, 100, 250, 500, 1000)
+LATENCY_CALLS = 200
+SLIM_DIR = Path(__file__).resolve().parent.parent / "models" / "slim"
+VARIANT_FILE = "slim_variant.json"
+REPORT_FILE = "slim_report.json"
+
+
+def mask_features(X, keep):
+    """Columns outside keep -> NaN: no split can use them, the row width stays the same"""
+    X = X.copy()
+    X[:, np.setdiff1d(np.arange(X.shape[1]), keep)] = np.nan
+    return X
+
+
+def fit_variant(target, keep, rows, params, threads):
+    X, y = trainIoT.worker_data["X"], trainIoT.worker_data["Y"][target]
+    model = XGBRegressor(**params, n_jobs=threads)
+    model.fit(mask_features(X[rows], keep), y[rows])
+    return target, len(keep), model
+
+
+def gain_ranking(model, n_features):
+    """Feature indices by total gain, best first (unused features last)"""
+    scores = model.get_booster().get_score(importance_type="total_gain")
+    gain = np.array([scores.get(f"f{i}", 0.0) for i in range(n_features)])
+    return np.argsort(-gain, kind="stable")
+
+
+def slice_model(model, trees):
+    """XGBRegressor holding only the first `trees` trees (what the gateway would load)"""
+    sliced = XGBRegressor(n_jobs=1)
+    sliced.load_model(bytearray(model.get_booster()[:trees].save_raw("json")))
+    return sliced
+
+
+def row_latency_ms(models, row, rounds=5):
+    """
+    Time to predict one row with every model (single-threaded): lowest
+    median over a few rounds, so a busy moment on the box does not decide
+    """
+    for model in models:
+        model.predict(row)
+    medians = []
+    for _ in range(rounds):
+        timings = []
+        for _ in range(LATENCY_CALLS // rounds):
+            start = time.perf_counter()
+            for model in models:
+                model.predict(row)
+            timings.append((time.perf_counter() - start) * 1000)
+        medians.append(np.median(timings))
+    return float(min(medians))
+
+
+def risk_labels(pred):
+    return [trainIoT.get_risk(t, p, d) for t, p, d in zip(pred[TEMP_COL], pred[PH_COL], pred[DO_COL])]
+
+
+def evaluate(X_scaled, Y_scaled, scalers_Y, n_splits=N_SPLITS, feature_counts=FEATURE_COUNTS,
+             tree_counts=TREE_COUNTS, workers=None, threads=None):
+    """
+    Returns:
+        ranks {target: feature indices by gain}, rows (one dict per (k, trees) variant)
+    """
+    n_features = X_scaled.shape[1]
+    tr, te = list(TimeSeriesSplit(n_splits=n_splits).split(X_scaled))[-1]
+    counts = [k or n_features for k in feature_counts]
+    workers, threads = trainIoT.thread_budget(len(TARGETS_ORIG) * len(counts), workers, threads)
+    params = {**XGB_PARAMS, "n_estimators": max(tree_counts)}
+    all_features = np.arange(n_features)
+
+    models = {}
+    with ProcessPoolExecutor(workers, initializer=trainIoT.init_worker, initargs=(X_scaled, Y_scaled)) as pool:
+        # Xếp hạng từ model đủ feature, rồi mới fit các model bớt feature
+        for target, k, model in pool.map(fit_variant, TARGETS_ORIG, [all_features] * 4, [tr] * 4,
+                                         [params] * 4, [threads] * 4):
+            models[target, k] = model
+        ranks = {col: gain_ranking(models[col, n_features], n_features) for col in TARGETS_ORIG}
+        jobs = [(col, ranks[col][:k]) for k in counts if k != n_features for col in TARGETS_ORIG]
+        for target, k, model in pool.map(fit_variant, *zip(*jobs), [tr] * len(jobs),
+                                         [params] * len(jobs), [threads] * len(jobs)):
+            models[target, k] = model
+
+    def real(col, values):
+        return scalers_Y[col].inverse_transform(np.asarray(values).reshape(-1, 1)).ravel()
+
+    X_test = X_scaled[te]
+    y_true = {col: real(col, Y_scaled[col][te]) for col in TARGETS_ORIG}
+    true_risk = np.array(risk_labels(y_true))
+    rows = []
+    for k in counts:
+        for trees in tree_counts:
+            pred = {col: real(col, models[col, k].predict(X_test, iteration_range=(0, trees))) for col in TARGETS_ORIG}
+            sliced = [slice_model(models[col, k], trees) for col in TARGETS_ORIG]
+            rows.append({
+                "features": k,
+                "trees": trees,
+                "mae": {col: float(np.mean(np.abs(pred[col] - y_true[col]))) for col in TARGETS_ORIG},
+                "risk_accuracy": float(np.mean(np.array(risk_labels(pred)) == true_risk)),
+                "latency_ms": row_latency_ms(sliced, X_test[:1]),
+            })
+    baseline = next(r for r in rows if r["features"] == n_features and r["trees"] == max(tree_counts))
+    for row in rows:
+        # MAE so với cấu hình hiện tại (đủ feature, đủ cây), trung bình 4 target
+        row["mae_ratio"] = float(np.mean([row["mae"][col] / baseline["mae"][col] for col in TARGETS_ORIG]))
+    mark_pareto(rows)
+    return ranks, rows
+
+
+def mark_pareto(rows):
+    """pareto=True when no other variant is at least as fast, accurate and precise (and better in one)"""
+    def key(r):
+        return (r["latency_ms"], -r["risk_accuracy"], r["mae_ratio"])
+
+    for row in rows:
+        row["pareto"] = not any(
+            all(a <= b for a, b in zip(key(other), key(row))) and key(other) != key(row) for other in rows
+        )
+
+
+def print_table(rows):
+    print(f"\n{'':2}{'feat':>5} {'cây':>5} {'ms/dòng':>8} {'acc':>6} {'MAE/gốc':>8}  " +
+          " ".join(f"{col[:10]:>10}" for col in TARGETS_ORIG))
+    for row in sorted(rows, key=lambda r: r["latency_ms"]):
+        print(f"{'P ' if row['pareto'] else '  '}{row['features']:>5} {row['trees']:>5} {row['latency_ms']:>8.3f} "
+              f"{row['risk_accuracy']:>6.3f} {row['mae_ratio']:>8.3f}  " +
+              " ".join(f"{row['mae'][col]:>10.4f}" for col in TARGETS_ORIG))
+    print("(P = mặt Pareto; MAE/gốc = MAE chia cho biến thể đủ feature + đủ cây)")
+
+
+def choose(rows, max_latency_ms):
+    """Best risk accuracy (then lowest MAE ratio) among Pareto variants within the budget"""
+    fits = [r for r in rows if r["pareto"] and r["latency_ms"] <= max_latency_ms]
+    return max(fits, key=lambda r: (r["risk_accuracy"], -r["mae_ratio"])) if fits else None
+
+
+def export(out_dir, df_feat, ranks, features, trees, row=None, workers=None, threads=None):
+    """
+    Fit the variant on all rows and save a full model set (same files as
+    trainIoT.py, so the gateway loads it unchanged) + slim_variant.json
+    """
+    feature_cols, X_scaled, scaler_X, Y_scaled, scalers_Y = trainIoT.prepare_data(df_feat)
+    keep = {col: np.sort(ranks[col][:features]) for col in TARGETS_ORIG}
+    params = {**XGB_PARAMS, "n_estimators": trees}
+    rows = np.arange(len(X_scaled))
+    workers, threads = trainIoT.thread_budget(len(TARGETS_ORIG), workers, threads)
+    with ProcessPoolExecutor(workers, initializer=trainIoT.init_worker, initargs=(X_scaled, Y_scaled)) as pool:
+        models = {target: model for target, _, model in pool.map(
+            fit_variant, TARGETS_ORIG, [keep[col] for col in TARGETS_ORIG], [rows] * 4, [params] * 4, [threads] * 4
+        )}
+
+    trainIoT.save_artifacts(out_dir, {trainIoT.model_key(col): m for col, m in models.items()}, scaler_X, scalers_Y, feature_cols)
+    (Path(out_dir) / VARIANT_FILE).write_text(json.dumps({
+        "features": features,
+        "trees": trees,
+        "kept_features": {col: [feature_cols[i] for i in keep[col]] for col in TARGETS_ORIG},
+        "evaluation": row,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }, indent=2, ensure_ascii=False))
+
+
+def main(args):
+    print("Đang tải dữ liệu hourly...")
+    df_feat, _ = trainIoT.load_training_frame(args.excel)
+    _, X_scaled, _, Y_scaled, scalers_Y = trainIoT.prepare_data(df_feat)
+    n_features = X_scaled.shape[1]
+    print(f"→ {len(df_feat):,} dòng, {n_features} feature; đánh giá trên fold cuối ({args.splits} fold)")
+
+    start = time.perf_counter()
+    ranks, rows = evaluate(X_scaled, Y_scaled, scalers_Y, args.splits, workers=args.workers, threads=args.threads)
+    print(f"   → {len(rows)} biến thể sau {time.perf_counter() - start:.1f}s")
+    print_table(rows)
+    Path(args.report).write_text(json.dumps({
+        "rows": rows,
+        "ranking": {col: [int(i) for i in ranks[col]] for col in TARGETS_ORIG},
+    }, indent=2))
+
+    if args.export:
+        features, trees = (int(v) for v in args.export.split(":"))
+        row = next((r for r in rows if r["features"] == features and r["trees"] == trees), None)
+    elif args.max_latency_ms is not None:
+        row = choose(rows, args.max_latency_ms)
+        if row is None:
+            print(f"\n❌ Không biến thể Pareto nào dưới {args.max_latency_ms} ms/dòng")
+            return
+        features, trees = row["features"], row["trees"]
+    else:
+        return
+
+    print(f"\nExport {features} feature x {trees} cây → {args.out} ...")
+    export(args.out, df_feat, ranks, min(features, n_features), trees, row, args.workers, args.threads)
+    print(f"✅ Đã export; dùng: MODEL_SET_DIR={args.out} (restart gateway)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slim forecast model variants (feature pruning + tree truncation)")
+    parser.add_argument("--excel", type=Path, default=DATA_DIR / EXCEL_FILE)
+    parser.add_argument("--splits", type=int, default=N_SPLITS)
+    parser.add_argument("--workers", type=int, help="Processes (default: min(fits, CPUs))")
+    parser.add_argument("--threads", type=int, help="XGBoost threads per fit (default: CPUs // workers)")
+    parser.add_argument("--report", type=Path, default=Path(REPORT_FILE), help="Full table + feature ranking (JSON)")
+    parser.add_argument("--out", type=Path, default=SLIM_DIR, help="Model set folder for the exported variant")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--max-latency-ms", type=float, help="Export the best Pareto variant within this per-row budget")
+    group.add_argument("--export", metavar="FEATURES:TREES", help="Export this variant, e.g. 12:100")
+    main(parser.parse_args())
@@ -1,4 +1,34 @@
 # trainIoT.py
+"""
+Huấn luyện các mô hình dự báo (Temperature, pH, DO, Turbidity) cho từng
+horizon trong HORIZONS (1h/3h/6h/12h) từ cùng một ma trận feature
+
+Mỗi (target, horizon, fold) của TimeSeriesSplit là một task chạy song song
+trong process pool. Early stopping dùng đoạn cuối (EARLY_STOPPING_FRACTION)
+của tập train của fold, tập validation chỉ dùng để tính metrics nên MAE/R²
+các fold là out-of-sample; khi các fold của một model xong thì model cuối
+được fit trên toàn bộ dữ liệu với số cây lấy từ fold cuối. Mỗi task dùng `threads` luồng XGBoost, workers x
+threads <= số core nên không bị oversubscribe. Mọi horizon của một target
+dùng chung scaler_{target}.pkl (fit trên nhãn HORIZON_H), file model là
+model_{target}_{h}h.pkl.
+
+Usage:
+    python trainIoT.py
+    python trainIoT.py --workers 4 --threads 2 --out ../models
+    python trainIoT.py --horizons 6                  # chỉ model 6h như trước
+    python trainIoT.py --onnx                        # + model_*.onnx cho INFERENCE_BACKEND=onnx
+    python trainIoT.py --no-plot --profile           # thời gian/CPU/RAM từng phase, so với baseline (profiling.py)
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 
 import pandas as pd
 import numpy as np
@@ -7,13 +37,17 @@ from sklearn.model_selection import TimeSeriesSplit
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error, accuracy_score, f1_score
 from xgboost import XGBRegressor
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.patches import Patch
-import warnings
 warnings.filterwarnings('ignore')
 
+# Feature spec shared with the gateway (features.py at the project root)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from features import build_features, feature_columns, spec_fingerprint
+import feature_cache
+import profiling
+from profiling import phase
+
 # ========= CẤU HÌNH =========
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 EXCEL_FILE = "Monteria_Aquaculture_Data.xlsx"
 HOURLY_SHEET = "Hourly Data"
 DAILY_SHEET = "Daily Averages"
@@ -26,94 +60,268 @@ DO_COL = "Dissolved_Oxygen"
 TURB_COL = "Turbidity"
 
 TARGETS_ORIG = [TEMP_COL, PH_COL, DO_COL, TURB_COL]
+# HORIZON_H: horizon chính (pred_* trong sensor_logs, phân loại rủi ro, scaler)
 HORIZON_H = 6
+HORIZONS = (1, 3, 6, 12)
+
+N_SPLITS = 5
+# Dừng khi MAE/RMSE trên tập early stopping không cải thiện sau N cây
+EARLY_STOPPING_ROUNDS = 50
+# Tập early stopping: phần cuối (theo thời gian) của tập train mỗi fold,
+# tách khỏi tập validation dùng để báo cáo metrics
+EARLY_STOPPING_FRACTION = 0.15
+
+XGB_PARAMS = dict(
+    n_estimators=1000,
+    max_depth=5,
+    learning_rate=0.03,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    reg_lambda=2.0,
+    random_state=42,
+    tree_method="hist",
+)
+
+METRICS_FILE = "training_metrics.json"
+
 
 # ========= 1) ĐỌC DỮ LIỆU HOURLY (DÙNG ĐỂ TRAIN) =========
-print("Đang tải dữ liệu hourly (dùng để huấn luyện)...")
-df_hourly = pd.read_excel(EXCEL_FILE, sheet_name=HOURLY_SHEET)
+def load_hourly(excel_path):
+    return clean_hourly(pd.read_excel(excel_path, sheet_name=HOURLY_SHEET))
+
 
-# Chỉ lấy các cột cần thiết + bỏ dòng thiếu
-df_hourly = df_hourly[[TIME_COL_ORIG, TEMP_COL, PH_COL, DO_COL, TURB_COL]].dropna()
-df_hourly[TIME_COL_ORIG] = pd.to_datetime(df_hourly[TIME_COL_ORIG])
-df_hourly = df_hourly.sort_values(TIME_COL_ORIG).reset_index(drop=True)
+def clean_hourly(df_hourly):
+    # Chỉ lấy các cột cần thiết + bỏ dòng thiếu
+    df_hourly = df_hourly[[TIME_COL_ORIG, TEMP_COL, PH_COL, DO_COL, TURB_COL]].dropna()
+    df_hourly[TIME_COL_ORIG] = pd.to_datetime(df_hourly[TIME_COL_ORIG])
+    return df_hourly.sort_values(TIME_COL_ORIG).reset_index(drop=True)
 
-print(f"→ Đã tải {len(df_hourly):,} dòng hourly từ {df_hourly[TIME_COL_ORIG].min().date()} đến {df_hourly[TIME_COL_ORIG].max().date()}")
 
 # ========= 2) FEATURE ENGINEERING =========
-def create_features(df, time_col, targets, horizon=6):
-    data = df.copy()
-    step = horizon
-    
+def label_column(col, horizon=HORIZON_H):
+    return f"{col}_future{horizon}h"
+
+
+def model_key(col, horizon=HORIZON_H):
+    """Model name, also its file name: model_{key}.pkl"""
+    return f"{col.replace(' ', '_')}_{horizon}h"
+
+
+def create_features(df, time_col, targets, horizons=HORIZONS):
+    """Shared features (features.build_features) + one label column per (target, horizon)"""
+    data = pd.concat([df, build_features(df, time_col, targets)], axis=1)
     for col in targets:
-        data[f"{col}_future"] = data[col].shift(-step)
-        for lag in [1, 3, 6, 12, 24]:
-            data[f"{col}_lag{lag}h"] = data[col].shift(lag)
-        for win in [6, 12, 24]:
-            data[f"{col}_mean{win}h"] = data[col].rolling(win).mean()
-            data[f"{col}_std{win}h"]  = data[col].rolling(win).std()
-    
-    data["hour"] = data[time_col].dt.hour
-    data["dow"]  = data[time_col].dt.dayofweek
-    data["hour_sin"] = np.sin(2 * np.pi * data["hour"] / 24)
-    data["hour_cos"] = np.cos(2 * np.pi * data["hour"] / 24)
-    
+        for horizon in horizons:
+            data[label_column(col, horizon)] = data[col].shift(-horizon)
+
     return data.dropna().reset_index(drop=True)
 
-df_feat = create_features(df_hourly, TIME_COL_ORIG, TARGETS_ORIG, HORIZON_H)
+
+def training_spec():
+    """Everything the training frame depends on besides the data (feature cache key)"""
+    return {
+        "features": spec_fingerprint(),
+        "targets": TARGETS_ORIG,
+        "horizons": HORIZONS,
+        "code": feature_cache.spec_hash(inspect.getsource(clean_hourly) + inspect.getsource(create_features)),
+    }
+
+
+def load_training_frame(excel_path, use_cache=True):
+    """
+    Hourly sheet -> features + labels, from the Parquet cache when the
+    workbook and the feature spec are unchanged
+
+    Returns:
+        (df_feat, cache info dict or None when the cache is off)
+    """
+    def build(df):
+        with phase("features"):
+            return create_features(clean_hourly(df), TIME_COL_ORIG, TARGETS_ORIG, HORIZONS)
+
+    if not use_cache:
+        return build(pd.read_excel(excel_path, sheet_name=HOURLY_SHEET)), None
+    return feature_cache.feature_frame(excel_path, build, training_spec(), sheet=HOURLY_SHEET)
+
 
 # ========= 3) CHUẨN BỊ DỮ LIỆU =========
-feature_cols = [c for c in df_feat.columns if c not in [TIME_COL_ORIG] + TARGETS_ORIG + [f"{c}_future" for c in TARGETS_ORIG]]
-X = df_feat[feature_cols].values
-
-scaler_X = MinMaxScaler()
-X_scaled = scaler_X.fit_transform(X)
-
-scalers_Y = {col: MinMaxScaler() for col in TARGETS_ORIG}
-Y_scaled = {}
-for col in TARGETS_ORIG:
-    y = df_feat[f"{col}_future"].values.reshape(-1, 1)
-    Y_scaled[col] = scalers_Y[col].fit_transform(y).ravel()
-
-# ========= 4) HUẤN LUYỆN =========
-tscv = TimeSeriesSplit(n_splits=5)
-models = {}
-
-print("\nBắt đầu huấn luyện 4 mô hình (Temperature, pH, DO, Turbidity)...")
-for col in TARGETS_ORIG:
-    print(f"   → Đang train {col}...")
-    model = XGBRegressor(
-        n_estimators=1000,
-        max_depth=5,
-        learning_rate=0.03,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        reg_lambda=2.0,
-        random_state=42,
-        tree_method="hist",
-        n_jobs=-1
-    )
-    y = Y_scaled[col]
-    for tr, te in tscv.split(X_scaled):
-        model.fit(X_scaled[tr], y[tr])
-    model.fit(X_scaled, y)  # Final fit
-    models[col] = model
-
-# ========= 5) ĐÁNH GIÁ TRÊN FOLD CUỐI =========
-_, last_te = list(tscv.split(X_scaled))[-1]
-X_test = X_scaled[last_te]
-time_test = df_feat[TIME_COL_ORIG].iloc[last_te].values
-
-y_true = {col: scalers_Y[col].inverse_transform(Y_scaled[col][last_te].reshape(-1,1)).ravel() for col in TARGETS_ORIG}
-y_pred = {col: scalers_Y[col].inverse_transform(models[col].predict(X_test).reshape(-1,1)).ravel() for col in TARGETS_ORIG}
-
-# In kết quả regression
-print("\n=== KẾT QUẢ DỰ BÁO 6 GIỜ TỚI ===")
-for col in TARGETS_ORIG:
-    r2 = r2_score(y_true[col], y_pred[col])
-    mae = mean_absolute_error(y_true[col], y_pred[col])
-    print(f"{col:20} → R² = {r2:.4f} | MAE = {mae:.3f}")
-
-# ========= 6) PHÂN LOẠI RỦI RO (theo tiêu chuẩn nuôi cá rô phi) =========
+def prepare_data(df_feat):
+    """-> feature_cols, X_scaled, scaler_X, Y_scaled {target: HORIZON_H labels}, scalers_Y"""
+    feature_cols = feature_columns(TARGETS_ORIG)
+    X = df_feat[feature_cols].values
+
+    scaler_X = MinMaxScaler()
+    X_scaled = scaler_X.fit_transform(X)
+
+    scalers_Y = {col: MinMaxScaler() for col in TARGETS_ORIG}
+    Y_scaled = {}
+    for col in TARGETS_ORIG:
+        y = df_feat[label_column(col)].values.reshape(-1, 1)
+        Y_scaled[col] = scalers_Y[col].fit_transform(y).ravel()
+
+    return feature_cols, X_scaled, scaler_X, Y_scaled, scalers_Y
+
+
+def horizon_targets(df_feat, scalers_Y, horizons=HORIZONS):
+    """{model_key: scaled labels} for every (target, horizon), with the shared target scalers"""
+    return {
+        model_key(col, horizon): scalers_Y[col].transform(df_feat[[label_column(col, horizon)]].values).ravel()
+        for col in TARGETS_ORIG for horizon in horizons
+    }
+
+
+def key_target(key):
+    """'Dissolved_Oxygen_6h' -> 'Dissolved_Oxygen'"""
+    return key.rsplit("_", 1)[0]
+
+
+# ========= 4) HUẤN LUYỆN SONG SONG =========
+# Dữ liệu được gửi cho mỗi worker một lần (initializer), không phải mỗi task
+worker_data = {}
+
+
+def init_worker(X, Y):
+    worker_data["X"] = X
+    worker_data["Y"] = Y
+
+
+def params_for(params, target):
+    """
+    params: one XGBoost config for all targets, or {target: config} like
+    tune.py's best_params.json (targets missing from it keep XGB_PARAMS)
+    """
+    if set(params) & set(TARGETS_ORIG):
+        return {**XGB_PARAMS, **params.get(target, {})}
+    return params
+
+
+def early_stopping_split(train_idx, fraction=EARLY_STOPPING_FRACTION):
+    """(fit rows, early-stopping rows): the last `fraction` of train_idx, kept in time order"""
+    n_stop = max(1, int(len(train_idx) * fraction))
+    return train_idx[:-n_stop], train_idx[-n_stop:]
+
+
+def fit_fold(target, fold, train_idx, val_idx, params, threads):
+    """
+    Một fold: early stopping trên đoạn cuối của train_idx, trả về best
+    iteration + dự báo val (scaled); val không tham gia fit nên metrics là out-of-sample
+    """
+    X, y = worker_data["X"], worker_data["Y"][target]
+    fit_idx, stop_idx = early_stopping_split(train_idx)
+    model = XGBRegressor(**params, n_jobs=threads, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    start = time.perf_counter()
+    model.fit(X[fit_idx], y[fit_idx], eval_set=[(X[stop_idx], y[stop_idx])], verbose=False)
+    return {
+        "target": target,
+        "fold": fold,
+        "best_iteration": int(model.best_iteration),
+        "fit_seconds": time.perf_counter() - start,
+        "y_pred": model.predict(X[val_idx], iteration_range=(0, model.best_iteration + 1)),
+        "model": model,
+    }
+
+
+def fit_final(target, n_estimators, params, threads):
+    """Model triển khai: toàn bộ dữ liệu, số cây từ early stopping"""
+    X, y = worker_data["X"], worker_data["Y"][target]
+    model = XGBRegressor(**{**params, "n_estimators": n_estimators}, n_jobs=threads)
+    start = time.perf_counter()
+    model.fit(X, y)
+    return {"target": target, "model": model, "fit_seconds": time.perf_counter() - start}
+
+
+def thread_budget(n_tasks, workers=None, threads=None):
+    """(workers, threads per task) with workers * threads <= CPU count"""
+    cpus = os.cpu_count() or 1
+    workers = workers or max(1, min(n_tasks, cpus))
+    threads = threads or max(1, cpus // workers)
+    return workers, threads
+
+
+def _regression_metrics(y_true, y_pred):
+    return {
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        "r2": float(r2_score(y_true, y_pred)),
+    }
+
+
+def train_models(X_scaled, Y_scaled, scalers_Y, params=XGB_PARAMS, n_splits=N_SPLITS,
+                 workers=None, threads=None):
+    """
+    Chạy mọi (model, fold) song song, rồi fit model cuối của từng model
+    ngay khi các fold của nó xong
+
+    Args:
+        Y_scaled: {model key: scaled labels}, e.g. horizon_targets();
+                  scalers_Y / params are looked up by key_target(key)
+
+    Returns:
+        models {key: XGBRegressor}, fold_models {key: model of the last fold},
+        report dict (per-fold metrics in original units, timings)
+    """
+    keys = list(Y_scaled)
+    splits = list(TimeSeriesSplit(n_splits=n_splits).split(X_scaled))
+    workers, threads = thread_budget(len(keys) * n_splits, workers, threads)
+    print(f"   → {workers} worker(s) x {threads} thread(s), {len(keys) * n_splits} fold tasks")
+
+    def real(key, values):
+        return scalers_Y[key_target(key)].inverse_transform(np.asarray(values).reshape(-1, 1)).ravel()
+
+    folds = {key: {} for key in keys}
+    fold_models, models, report = {}, {}, {key: {"folds": []} for key in keys}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(X_scaled, Y_scaled)) as pool:
+        pending = [
+            pool.submit(fit_fold, key, fold, tr, te, params_for(params, key_target(key)), threads)
+            for key in keys for fold, (tr, te) in enumerate(splits)
+        ]
+        while pending:
+            done = next(as_completed(pending))
+            pending.remove(done)
+            result = done.result()
+            col = result["target"]
+
+            if "fold" not in result:
+                models[col] = result["model"]
+                report[col]["final_fit_seconds"] = round(result["fit_seconds"], 3)
+                print(f"   ✓ {col}: final model ({report[col]['n_estimators']} trees)")
+                continue
+
+            fold = result["fold"]
+            tr, te = splits[fold]
+            folds[col][fold] = result
+            report[col]["folds"].append({
+                "fold": fold,
+                "train_rows": len(tr),
+                "early_stopping_rows": len(early_stopping_split(tr)[1]),
+                "val_rows": len(te),
+                "best_iteration": result["best_iteration"],
+                "fit_seconds": round(result["fit_seconds"], 3),
+                **_regression_metrics(real(col, Y_scaled[col][te]), real(col, result["y_pred"])),
+            })
+
+            if len(folds[col]) == n_splits:
+                # Fold cuối có tập train gần với toàn bộ dữ liệu nhất
+                last = folds[col][n_splits - 1]
+                fold_models[col] = last["model"]
+                report[col]["n_estimators"] = last["best_iteration"] + 1
+                report[col]["folds"].sort(key=lambda f: f["fold"])
+                pending.append(pool.submit(fit_final, col, report[col]["n_estimators"], params_for(params, key_target(col)), threads))
+
+    report["_run"] = {
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "workers": workers,
+        "threads_per_task": threads,
+        "n_splits": n_splits,
+        "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+        "early_stopping_fraction": EARLY_STOPPING_FRACTION,
+        "params": params,
+    }
+    return models, fold_models, report
+
+
+# ========= 5) PHÂN LOẠI RỦI RO (theo tiêu chuẩn nuôi cá rô phi) =========
 def get_risk(temp, ph, do, turb=None):
     if do < 2.0 or temp < 24 or temp > 35 or ph < 6.0 or ph > 9.0:
         return "Danger"
@@ -122,44 +330,188 @@ def get_risk(temp, ph, do, turb=None):
     else:
         return "Warning"
 
-true_risk = [get_risk(y_true[TEMP_COL][i], y_true[PH_COL][i], y_true[DO_COL][i]) for i in range(len(last_te))]
-pred_risk = [get_risk(y_pred[TEMP_COL][i], y_pred[PH_COL][i], y_pred[DO_COL][i]) for i in range(len(last_te))]
-
-acc = accuracy_score(true_risk, pred_risk)
-f1 = f1_score(true_risk, pred_risk, average='macro')
-print(f"\nPHÂN LOẠI RỦI RO (6h tới): Accuracy = {acc:.4f} ({acc*100:.1f}%) | Macro-F1 = {f1:.4f}")
-
-# ========= 7) LƯU TẤT CẢ ĐỂ TRIỂN KHAI IoT =========
-joblib.dump(scaler_X, "scaler_features.pkl")
-for col in TARGETS_ORIG:
-    joblib.dump(models[col], f"model_{col.replace(' ', '_')}_6h.pkl")
-    joblib.dump(scalers_Y[col], f"scaler_{col.replace(' ', '_')}.pkl")
-joblib.dump(feature_cols, "feature_columns.pkl")
-joblib.dump({
-    "time_col": TIME_COL_ORIG,
-    "targets": TARGETS_ORIG,
-    "horizon": HORIZON_H
-}, "model_config.pkl")
-
-print("\nHOÀN TẤT 100%!")
-print("Đã xuất:")
-print("   • 4 file model (*.pkl)")
-print("   • 5 file scaler")
-print("   • feature_columns.pkl + model_config.pkl")
-print("   → Sẵn sàng tích hợp vào ESP32, Raspberry Pi, hoặc Flask API")
-
-
-
-plt.figure(figsize=(12,5))
-plt.subplot(1,2,1)
-cm = pd.crosstab(true_risk, pred_risk, rownames=['Thực tế'], colnames=['Dự báo'])
-sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-plt.title('Confusion Matrix - Risk Classification')
-
-plt.subplot(1,2,2)
-plt.plot(time_test[-168:], y_true[TEMP_COL][-168:], label="Thực tế Nhiệt độ", alpha=0.8)
-plt.plot(time_test[-168:], y_pred[TEMP_COL][-168:], '--', label="Dự báo Nhiệt độ")
-plt.legend(); plt.title("7 ngày cuối - Nhiệt độ")
-plt.tight_layout()
-plt.savefig("results_demo.png", dpi=300, bbox_inches='tight')
-# plt.show()
+
+# ========= 6) LƯU TẤT CẢ ĐỂ TRIỂN KHAI IoT =========
+def save_artifacts(out_dir, models, scaler_X, scalers_Y, feature_cols, horizons=(HORIZON_H,)):
+    """models: {model_key(target, horizon): model}"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(scaler_X, out_dir / "scaler_features.pkl")
+    for key, model in models.items():
+        joblib.dump(model, out_dir / f"model_{key}.pkl")
+    for col in TARGETS_ORIG:
+        joblib.dump(scalers_Y[col], out_dir / f"scaler_{col.replace(' ', '_')}.pkl")
+    joblib.dump(feature_cols, out_dir / "feature_columns.pkl")
+    joblib.dump({
+        "time_col": TIME_COL_ORIG,
+        "targets": TARGETS_ORIG,
+        "horizon": HORIZON_H,
+        "horizons": list(horizons)
+    }, out_dir / "model_config.pkl")
+
+
+def plot_results(path, true_risk, pred_risk, time_test, y_true, y_pred):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12,5))
+    plt.subplot(1,2,1)
+    cm = pd.crosstab(true_risk, pred_risk, rownames=['Thực tế'], colnames=['Dự báo'])
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
+    plt.title('Confusion Matrix - Risk Classification')
+
+    plt.subplot(1,2,2)
+    plt.plot(time_test[-168:], y_true[TEMP_COL][-168:], label="Thực tế Nhiệt độ", alpha=0.8)
+    plt.plot(time_test[-168:], y_pred[TEMP_COL][-168:], '--', label="Dự báo Nhiệt độ")
+    plt.legend(); plt.title("7 ngày cuối - Nhiệt độ")
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches='tight')
+
+
+def run(args):
+    """The whole training run; returns (report, feature cache info)"""
+    print("Đang tải dữ liệu hourly (dùng để huấn luyện)...")
+    with phase("load"):
+        df_feat, cache = load_training_frame(args.excel, use_cache=not args.no_cache)
+    if cache:
+        print(f"→ Feature cache {'hit' if cache['hit'] else 'miss (đã tạo)'}: {Path(cache['path']).name} ({cache['load_seconds']:.2f}s)")
+    print(f"→ {len(df_feat):,} dòng feature từ {df_feat[TIME_COL_ORIG].min().date()} đến {df_feat[TIME_COL_ORIG].max().date()}")
+    horizons = sorted(set(args.horizons) | {HORIZON_H})
+    with phase("prepare"):
+        feature_cols, X_scaled, scaler_X, Y_scaled, scalers_Y = prepare_data(df_feat)
+        Y_models = horizon_targets(df_feat, scalers_Y, horizons)
+    print(f"\nBắt đầu huấn luyện {len(Y_models)} mô hình (Temperature, pH, DO, Turbidity x {horizons}h)...")
+    params = XGB_PARAMS
+    if args.params:
+        # e.g. best_params.json from tune.py: {target: {...}}
+        params = json.loads(Path(args.params).read_text())
+        print(f"→ Tham số từ {args.params}")
+    with phase("fit"):
+        models, fold_models, report = train_models(
+            X_scaled, Y_models, scalers_Y, params=params, n_splits=args.splits, workers=args.workers, threads=args.threads
+        )
+    print(f"   → Xong sau {report['_run']['wall_seconds']:.1f}s")
+
+    # ========= ĐÁNH GIÁ TRÊN FOLD CUỐI =========
+    with phase("evaluate"):
+        # Dùng model của fold cuối (chưa thấy dữ liệu này), không phải model cuối đã fit trên cả fold đó
+        _, last_te = list(TimeSeriesSplit(n_splits=args.splits).split(X_scaled))[-1]
+        X_test = X_scaled[last_te]
+        time_test = df_feat[TIME_COL_ORIG].iloc[last_te].values
+
+        def real(key, values):
+            return scalers_Y[key_target(key)].inverse_transform(values.reshape(-1,1)).ravel()
+
+        # In kết quả regression
+        print("\n=== KẾT QUẢ DỰ BÁO (fold cuối) ===")
+        for key in Y_models:
+            truth, pred = real(key, Y_models[key][last_te]), real(key, fold_models[key].predict(X_test))
+            maes = [f["mae"] for f in report[key]["folds"]]
+            print(f"{key:22} → R² = {r2_score(truth, pred):.4f} | MAE = {mean_absolute_error(truth, pred):.3f} | "
+                  f"MAE các fold = {np.mean(maes):.3f} ± {np.std(maes):.3f} | {report[key]['n_estimators']} cây")
+
+        # Rủi ro theo horizon chính
+        y_true = {col: real(model_key(col), Y_models[model_key(col)][last_te]) for col in TARGETS_ORIG}
+        y_pred = {col: real(model_key(col), fold_models[model_key(col)].predict(X_test)) for col in TARGETS_ORIG}
+
+        true_risk = [get_risk(y_true[TEMP_COL][i], y_true[PH_COL][i], y_true[DO_COL][i]) for i in range(len(last_te))]
+        pred_risk = [get_risk(y_pred[TEMP_COL][i], y_pred[PH_COL][i], y_pred[DO_COL][i]) for i in range(len(last_te))]
+
+        acc = accuracy_score(true_risk, pred_risk)
+        f1 = f1_score(true_risk, pred_risk, average='macro')
+        print(f"\nPHÂN LOẠI RỦI RO ({HORIZON_H}h tới): Accuracy = {acc:.4f} ({acc*100:.1f}%) | Macro-F1 = {f1:.4f}")
+        report["_run"]["risk"] = {"accuracy": float(acc), "macro_f1": float(f1)}
+
+    with phase("save"):
+        save_artifacts(args.out, models, scaler_X, scalers_Y, feature_cols, horizons)
+        metrics_path = Path(args.out) / METRICS_FILE
+        metrics_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.onnx:
+        with phase("onnx"):
+            from onnx_export import PARITY_TOL, check_parity, export_model_set
+            onnx_paths = export_model_set(args.out)
+            diffs = check_parity(args.out)
+
+    print("\nHOÀN TẤT 100%!")
+    print("Đã xuất:")
+    print(f"   • {len(models)} file model (*.pkl, {len(horizons)} horizon)")
+    print("   • 5 file scaler")
+    print("   • feature_columns.pkl + model_config.pkl")
+    print(f"   • {METRICS_FILE} (metrics từng fold, thời gian train)")
+    if args.onnx:
+        print(f"   • {len(onnx_paths)} file ONNX (scaler đã nằm trong graph, max |Δ| so với XGBoost = "
+              f"{max(diffs.values()):.1e} ≤ {PARITY_TOL:.0e})")
+    print("   → Sẵn sàng tích hợp vào ESP32, Raspberry Pi, hoặc Flask API")
+
+    if not args.no_plot:
+        with phase("plot"):
+            plot_results(Path(args.out) / "results_demo.png", true_risk, pred_risk, time_test, y_true, y_pred)
+    return report, cache
+
+
+def fit_breakdown(report):
+    """Fold fits vs final fits, summed over models (worker seconds, overlap in the pool)"""
+    keys = [key for key in report if key != "_run"]
+    return {
+        "models": len(keys),
+        "fold_fits": sum(len(report[key]["folds"]) for key in keys),
+        "fold_fit_s": round(sum(f["fit_seconds"] for key in keys for f in report[key]["folds"]), 3),
+        "final_fit_s": round(sum(report[key].get("final_fit_seconds", 0) for key in keys), 3),
+        "workers": report["_run"]["workers"],
+        "threads_per_task": report["_run"]["threads_per_task"],
+    }
+
+
+def main(args):
+    if not args.profile:
+        run(args)
+        return
+
+    with profiling.PhaseProfiler() as profiler:
+        report, cache = run(args)
+    profile = profiler.report(
+        # Everything that changes the cost of a run: compared with the baseline's
+        context={
+            "excel": Path(args.excel).name,
+            "feature_cache": None if cache is None else ("hit" if cache["hit"] else "miss"),
+            "splits": args.splits,
+            "horizons": sorted(set(args.horizons) | {HORIZON_H}),
+            "workers": report["_run"]["workers"],
+            "threads_per_task": report["_run"]["threads_per_task"],
+            "params": args.params.name if args.params else None,
+            "onnx": args.onnx,
+            "plot": not args.no_plot,
+        },
+        fit_breakdown=fit_breakdown(report),
+    )
+    profile_path = Path(args.out) / profiling.PROFILE_FILE
+    profile_path.write_text(json.dumps(profile, indent=2, ensure_ascii=False))
+    profiling.print_profile(profile)
+    print(f"   → {profile_path}")
+
+    if args.save_baseline:
+        profiling.BASELINE_FILE.write_text(json.dumps(profile, indent=2, ensure_ascii=False))
+        print(f"✅ Đã lưu baseline: {profiling.BASELINE_FILE}")
+    elif not profiling.check(profile):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the multi-horizon forecast models (parallel, early-stopped)")
+    parser.add_argument("--excel", type=Path, default=DATA_DIR / EXCEL_FILE)
+    parser.add_argument("--out", type=Path, default=Path("."), help="Output folder for models / scalers")
+    parser.add_argument("--splits", type=int, default=N_SPLITS)
+    parser.add_argument("--workers", type=int, help="Processes (default: min(tasks, CPUs))")
+    parser.add_argument("--threads", type=int, help="XGBoost threads per task (default: CPUs // workers)")
+    parser.add_argument("--no-plot", action="store_true", help="Skip results_demo.png")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse the workbook, skip the feature cache")
+    parser.add_argument("--horizons", type=int, nargs="+", choices=HORIZONS, default=list(HORIZONS),
+                        help=f"Forecast horizons in hours ({HORIZON_H}h is always trained)")
+    parser.add_argument("--params", type=Path, help="Per-target XGBoost params JSON (tune.py best_params.json)")
+    parser.add_argument("--onnx", action="store_true", help="Also export model_*.onnx (onnx_export.py) and check parity")
+    parser.add_argument("--profile", action="store_true",
+                        help="Per-phase wall/CPU/peak RSS -> training_profile.json, compared with profile_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="With --profile: store this run as the baseline")
+    main(parser.parse_args())
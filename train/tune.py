@@ -0,0 +1,327 @@
+# tune.py
+"""
+Tìm siêu tham số XGBoost cho 4 mô hình dự báo 6h
+
+Mỗi trial = (target, một cấu hình n_estimators / max_depth / learning_rate /
+subsample / colsample_bytree) được đánh giá lần lượt qua các fold của
+TimeSeriesSplit (early stopping trên đoạn cuối tập train của từng fold,
+MAE chỉ tính trên tập validation), các trial chạy song song
+trong process pool (cùng dữ liệu, cùng worker initializer với trainIoT.py).
+
+- Pruning: sau mỗi fold (từ fold PRUNE_FROM_FOLD), trial dừng sớm nếu MAE
+  trung bình tới fold đó tệ hơn median của các trial trước ở cùng fold
+  (median pruning, khi target đã có >= MIN_TRIALS_BEFORE_PRUNING trial xong)
+- Lưu trial: mỗi trial xong/bị prune được ghi ngay một dòng vào TRIALS_FILE
+  (JSONL), khóa = hash(target, params, folds, dữ liệu + feature spec). Chạy
+  lại thì tiếp tục từ chỗ dừng, cấu hình đã có không bao giờ fit lại.
+- Báo cáo: MAE (đơn vị gốc) và độ trễ predict 1 dòng (1 thread, như gateway)
+  của model fold cuối; mặt Pareto MAE / độ trễ; best_params.json dùng được
+  với `trainIoT.py --params`.
+
+Usage:
+    python tune.py --trials 30
+    python tune.py --trials 60 --workers 4         # chỉ chạy 30 trial còn thiếu
+    python tune.py --report --max-latency-ms 0.5   # không fit, chọn theo ngân sách CPU
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+from xgboost import XGBRegressor
+
+import feature_cache
+import trainIoT
+from trainIoT import EARLY_STOPPING_FRACTION, EARLY_STOPPING_ROUNDS, HOURLY_SHEET, N_SPLITS, TARGETS_ORIG, XGB_PARAMS
+
+# Lưới rời rạc: cấu hình lặp lại nhận ra được (và bỏ qua) qua khóa trial
+SEARCH_SPACE = {
+    "n_estimators": [300, 1000, 2000],  # trần; early stopping chọn số cây thật
+    "max_depth": [3, 4, 5, 6, 8],
+    "learning_rate": [0.01, 0.03, 0.05, 0.1, 0.2],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+}
+
+TRIALS_FILE = "tune_trials.jsonl"
+BEST_PARAMS_FILE = "best_params.json"
+MIN_TRIALS_BEFORE_PRUNING = 5
+PRUNE_FROM_FOLD = 1
+LATENCY_CALLS = 200
+
+
+def dataset_key(excel_path):
+    """
+    Workbook content + training feature spec + early-stopping split: trials on
+    other data (or scored with another protocol) are not reused
+    """
+    spec = {**trainIoT.training_spec(), "early_stopping_fraction": EARLY_STOPPING_FRACTION}
+    return f"{feature_cache.source_hash(excel_path, HOURLY_SHEET)}-{feature_cache.spec_hash(spec)}"
+
+
+def trial_key(target, params, n_splits, dataset):
+    spec = {"target": target, "params": params, "n_splits": n_splits,
+            "early_stopping_rounds": EARLY_STOPPING_ROUNDS, "dataset": dataset}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def candidates(seed=42):
+    """Every grid config, current XGB_PARAMS first, the rest in a seeded random order"""
+    names = list(SEARCH_SPACE)
+    grid = [dict(zip(names, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    random.Random(seed).shuffle(grid)
+    baseline = {name: XGB_PARAMS[name] for name in names}
+    return [baseline] + [config for config in grid if config != baseline]
+
+
+# ========= TRIAL STORE (JSONL, append-only) =========
+def load_trials(path, dataset=None):
+    """Trials from the store (only those of `dataset` when given)"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    trials = []
+    for line in path.read_text().splitlines():
+        # Dòng cuối có thể bị cắt nếu tiến trình bị kill giữa lúc ghi
+        try:
+            trial = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if dataset is None or trial["dataset"] == dataset:
+            trials.append(trial)
+    return trials
+
+
+def append_trial(path, trial):
+    with open(path, "a") as f:
+        f.write(json.dumps(trial) + "\n")
+
+
+# ========= PRUNING =========
+def prune_thresholds(trials, target, n_splits):
+    """
+    Median of the running mean MAE at each fold over the target's earlier
+    trials (complete or pruned after that fold); None = never prune there
+    """
+    done = [t for t in trials if t["target"] == target]
+    if sum(t["state"] == "complete" for t in done) < MIN_TRIALS_BEFORE_PRUNING:
+        return [None] * n_splits
+    thresholds = []
+    for fold in range(n_splits):
+        running = [float(np.mean(t["fold_mae"][:fold + 1])) for t in done if len(t["fold_mae"]) > fold]
+        thresholds.append(statistics.median(running) if fold >= PRUNE_FROM_FOLD and running else None)
+    return thresholds
+
+
+# ========= WORKER =========
+def run_trial(target, params, n_splits, thresholds, y_range, threads):
+    """
+    Fit the folds in order, stop early when the running mean MAE is above the
+    fold threshold; time single-row predict on the last fold's model
+    """
+    X, y = trainIoT.worker_data["X"], trainIoT.worker_data["Y"][target]
+    fold_mae, best_iterations, early_stopping_rows = [], [], []
+    start = time.perf_counter()
+    for fold, (tr, te) in enumerate(TimeSeriesSplit(n_splits=n_splits).split(X)):
+        # Số cây chọn trên đoạn cuối của tr, te chỉ dùng để chấm MAE
+        fit_idx, stop_idx = trainIoT.early_stopping_split(tr)
+        model = XGBRegressor(**params, n_jobs=threads, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X[fit_idx], y[fit_idx], eval_set=[(X[stop_idx], y[stop_idx])], verbose=False)
+        y_pred = model.predict(X[te], iteration_range=(0, model.best_iteration + 1))
+        fold_mae.append(float(np.mean(np.abs(y_pred - y[te])) * y_range))
+        best_iterations.append(int(model.best_iteration))
+        early_stopping_rows.append(len(stop_idx))
+        if thresholds[fold] is not None and np.mean(fold_mae) > thresholds[fold] and fold < n_splits - 1:
+            return {"state": "pruned", "fold_mae": fold_mae, "best_iterations": best_iterations,
+                    "early_stopping_rows": early_stopping_rows, "fit_seconds": time.perf_counter() - start}
+    fit_seconds = time.perf_counter() - start
+
+    # Gateway: 1 dòng / message, 1 thread
+    model.set_params(n_jobs=1)
+    row = X[te[:1]]
+    iteration_range = (0, model.best_iteration + 1)
+    for _ in range(10):
+        model.predict(row, iteration_range=iteration_range)
+    timings = []
+    for _ in range(LATENCY_CALLS):
+        t0 = time.perf_counter()
+        model.predict(row, iteration_range=iteration_range)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        "state": "complete",
+        "fold_mae": fold_mae,
+        "best_iterations": best_iterations,
+        "early_stopping_rows": early_stopping_rows,
+        "fit_seconds": fit_seconds,
+        "latency_ms": {"p50": float(np.percentile(timings, 50)), "p95": float(np.percentile(timings, 95))},
+    }
+
+
+# ========= SEARCH =========
+def search(X_scaled, Y_scaled, scalers_Y, dataset, trials_path, n_trials, n_splits=N_SPLITS,
+           targets=TARGETS_ORIG, seed=42, workers=None, threads=None):
+    """
+    Run until every target has n_trials trials (complete + pruned) in the
+    store for this dataset. Returns the number of trials run now.
+    """
+    trials = load_trials(trials_path, dataset)
+    seen = {t["key"] for t in trials}
+    queue = {}
+    for target in targets:
+        have = sum(t["target"] == target and t["n_splits"] == n_splits for t in trials)
+        todo = []
+        for config in candidates(seed):
+            if len(todo) >= n_trials - have:
+                break
+            params = {**XGB_PARAMS, **config}
+            key = trial_key(target, params, n_splits, dataset)
+            if key not in seen:
+                todo.append((key, params))
+        queue[target] = todo
+        print(f"   {target:20} {have} trial đã có, {len(todo)} trial mới")
+
+    total = sum(len(todo) for todo in queue.values())
+    if not total:
+        return 0
+    # Xen kẽ các target để ngưỡng pruning của target nào cũng sớm có
+    order = [(target, *item) for batch in itertools.zip_longest(*queue.values())
+             for target, item in zip(queue, batch) if item is not None]
+    workers, threads = trainIoT.thread_budget(total, workers, threads)
+    print(f"   → {workers} worker(s) x {threads} thread(s), {total} trial")
+
+    y_range = {col: float(1 / scalers_Y[col].scale_[0]) for col in targets}
+    ran = 0
+    with ProcessPoolExecutor(workers, initializer=trainIoT.init_worker, initargs=(X_scaled, Y_scaled)) as pool:
+        pending = {}
+
+        def submit():
+            target, key, params = order.pop(0)
+            relevant = [t for t in trials if t["n_splits"] == n_splits]
+            future = pool.submit(run_trial, target, params, n_splits,
+                                 prune_thresholds(relevant, target, n_splits), y_range[target], threads)
+            pending[future] = (target, key, params)
+
+        try:
+            while order and len(pending) < workers:
+                submit()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target, key, params = pending.pop(future)
+                    result = future.result()
+                    trial = {
+                        "key": key, "dataset": dataset, "target": target, "n_splits": n_splits,
+                        "params": params, **result,
+                        "mae": float(np.mean(result["fold_mae"])),
+                        "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                    append_trial(trials_path, trial)
+                    trials.append(trial)
+                    ran += 1
+                    mark = "✓" if trial["state"] == "complete" else "✂"
+                    latency = f" | {trial['latency_ms']['p50']:.3f} ms" if "latency_ms" in trial else ""
+                    print(f"   {mark} [{ran}/{total}] {target:18} MAE {trial['mae']:.4f} "
+                          f"({len(trial['fold_mae'])}/{n_splits} fold){latency} {describe(params)}")
+                    if order:
+                        submit()
+        except KeyboardInterrupt:
+            # Trial đã xong nằm sẵn trong store; lần chạy sau tiếp tục
+            pool.shutdown(wait=False, cancel_futures=True)
+            print(f"\n⚠️ Dừng: {ran} trial đã lưu vào {trials_path}")
+            raise
+    return ran
+
+
+# ========= REPORT =========
+def describe(params):
+    return " ".join(f"{name}={params[name]}" for name in SEARCH_SPACE)
+
+
+def pareto_front(trials):
+    """Complete trials no other trial beats on both MAE and p50 latency"""
+    front = []
+    for t in sorted(trials, key=lambda t: (t["mae"], t["latency_ms"]["p50"])):
+        if not front or t["latency_ms"]["p50"] < front[-1]["latency_ms"]["p50"]:
+            front.append(t)
+    return front
+
+
+def best_trials(trials, n_splits, max_latency_ms=None):
+    """{target: lowest-MAE complete trial within the latency budget}"""
+    best = {}
+    for t in trials:
+        if t["state"] != "complete" or t["n_splits"] != n_splits:
+            continue
+        if max_latency_ms is not None and t["latency_ms"]["p50"] > max_latency_ms:
+            continue
+        if t["target"] not in best or t["mae"] < best[t["target"]]["mae"]:
+            best[t["target"]] = t
+    return best
+
+
+def report(trials, n_splits, max_latency_ms=None, top=5):
+    baseline = {name: XGB_PARAMS[name] for name in SEARCH_SPACE}
+    best = best_trials(trials, n_splits, max_latency_ms)
+    for target in TARGETS_ORIG:
+        mine = [t for t in trials if t["target"] == target and t["n_splits"] == n_splits]
+        complete = [t for t in mine if t["state"] == "complete"]
+        if not complete:
+            continue
+        print(f"\n=== {target}: {len(complete)} xong, {len(mine) - len(complete)} bị prune ===")
+        print(f"   {'MAE':>8} {'± std':>7} {'cây':>5} {'p50 ms':>7} {'p95 ms':>7}  params")
+        front = {t["key"] for t in pareto_front(complete)}
+        rows = sorted(complete, key=lambda t: t["mae"])[:top]
+        rows += [t for t in pareto_front(complete) if t not in rows]
+        for t in rows:
+            tags = ("P" if t["key"] in front else " ") + ("B" if {n: t["params"][n] for n in SEARCH_SPACE} == baseline else " ")
+            print(f"{tags} {t['mae']:8.4f} {np.std(t['fold_mae']):7.4f} {t['best_iterations'][-1] + 1:5d} "
+                  f"{t['latency_ms']['p50']:7.3f} {t['latency_ms']['p95']:7.3f}  {describe(t['params'])}")
+        if target in best:
+            print(f"   → Chọn: MAE {best[target]['mae']:.4f}, {best[target]['latency_ms']['p50']:.3f} ms")
+        else:
+            print(f"   → Không trial nào đạt ngân sách {max_latency_ms} ms")
+    print("\n(P = mặt Pareto MAE / độ trễ, B = cấu hình hiện tại XGB_PARAMS)")
+    return best
+
+
+def main(args):
+    dataset = dataset_key(args.excel)
+    if not args.report:
+        print("Đang tải dữ liệu hourly (dùng để tìm tham số)...")
+        df_feat, _ = trainIoT.load_training_frame(args.excel)
+        _, X_scaled, _, Y_scaled, scalers_Y = trainIoT.prepare_data(df_feat)
+        print(f"→ {len(df_feat):,} dòng feature, {args.splits} fold, store {args.store}")
+        start = time.perf_counter()
+        ran = search(X_scaled, Y_scaled, scalers_Y, dataset, args.store, args.trials, args.splits,
+                     targets=args.targets, seed=args.seed, workers=args.workers, threads=args.threads)
+        print(f"   → {ran} trial mới sau {time.perf_counter() - start:.1f}s")
+
+    best = report(load_trials(args.store, dataset), args.splits, args.max_latency_ms, args.top)
+    if best:
+        args.best.write_text(json.dumps({target: t["params"] for target, t in best.items()}, indent=2))
+        print(f"\n✅ {args.best} ({len(best)} target) → python trainIoT.py --params {args.best}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter search for the 6h forecast models")
+    parser.add_argument("--excel", type=Path, default=trainIoT.DATA_DIR / trainIoT.EXCEL_FILE)
+    parser.add_argument("--trials", type=int, default=30, help="Trials per target (including earlier runs)")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS_ORIG, default=TARGETS_ORIG)
+    parser.add_argument("--splits", type=int, default=N_SPLITS)
+    parser.add_argument("--seed", type=int, default=42, help="Order in which grid configs are tried")
+    parser.add_argument("--workers", type=int, help="Processes (default: min(trials, CPUs))")
+    parser.add_argument("--threads", type=int, help="XGBoost threads per trial (default: CPUs // workers)")
+    parser.add_argument("--store", type=Path, default=Path(TRIALS_FILE), help="Trial store (JSONL)")
+    parser.add_argument("--best", type=Path, default=Path(BEST_PARAMS_FILE), help="Output params for trainIoT.py --params")
+    parser.add_argument("--max-latency-ms", type=float, help="Only pick trials whose p50 single-row latency fits")
+    parser.add_argument("--top", type=int, default=5, help="Rows per target in the report")
+    parser.add_argument("--report", action="store_true", help="Only report from the store, fit nothing")
+    main(parser.parse_args())